@@ -0,0 +1,63 @@
+# Production-конфігурація gunicorn для ai_api: gunicorn -c gunicorn.conf.py src.api:app
+#
+# preload_app: модель завантажується один раз у master-процесі до fork, воркери отримують
+# сторінки з вагами copy-on-write. Torch intra-op потоки діляться між воркерами, щоб
+# workers * torch_threads не перевищувало кількість ядер.
+import gc
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8080")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# gthread: конкурентні запити одного воркера потрапляють в один мікробатч (src/batching.py)
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+preload_app = True
+
+# Torch-потоків на воркер; за замовчуванням ядра рівномірно діляться між воркерами
+torch_threads = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(1, (os.cpu_count() or 1) // workers)
+
+# Плавний перезапуск воркерів: після max_requests (+jitter, щоб не всі одночасно) воркер
+# дообслуговує поточні запити протягом graceful_timeout і замінюється новим.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "20000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "2000"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+keepalive = 5
+
+# Воркер після fork стежить за model_latest.pth: /reload потрапляє лише в один воркер,
+# решта підхоплюють нову модель протягом цього інтервалу
+os.environ.setdefault("MODEL_WATCH_INTERVAL", "10")
+# Master завантажує модель з тією ж кількістю потоків, що й воркери
+os.environ.setdefault("TORCH_NUM_THREADS", str(torch_threads))
+
+
+def on_starting(server):
+    # Файли метрик (src/metrics.py) попереднього запуску: лічильники починаються з нуля.
+    # Викликається вже після preload, тому файл самого master-процесу зберігається
+    from src.metrics import clear
+    clear()
+
+
+def child_exit(server, worker):
+    # Метрики завершеного воркера зливаються в archive.db: лічильники не скидаються,
+    # а METRICS_DIR не росте з кожним перезапуском воркера (max_requests)
+    from src.metrics import archive
+    try:
+        archive(worker.pid)
+    except Exception:
+        server.log.exception(f"Failed to archive metrics of worker {worker.pid}")
+
+
+def when_ready(server):
+    # Об'єкти, створені під час preload (модель, модулі), переносяться в permanent generation GC,
+    # щоб збірка сміття у воркерах не торкалась їх і не копіювала сторінки.
+    gc.freeze()
+    server.log.info(f"workers={workers} threads={threads} torch_threads={torch_threads}")
+
+
+def post_fork(server, worker):
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    from src.model import start_model_watcher
+    start_model_watcher()
@@ -2,31 +2,83 @@ import torch
 import os
 import logging
 import json
-from time import time
-from flask import Flask, jsonify, request
-from src.model import predict_image_bytes, load_model, MODEL_PATH
+from time import time, perf_counter
+from flask import Flask, jsonify, request, Response, stream_with_context, g, send_file
+from src.model import (predict_image_bytes, predict_many_bytes, predict_arrays, load_model,
+                       reload_model_async, is_model_loaded, get_model_state, on_swap, list_versions,
+                       normalize_version, version_exists, UnknownModelVersion, MODEL_PATH)
+from src.batching import MicroBatcher, QueueFullError, BATCH_MAX_SIZE
+from src.uploads import collect_batch_files, read_upload, UploadError
+from src.logging_setup import setup_logging, AccessLogSampler
+from src.cache import PredictionCache
+from src.jobs import JobQueue, JobQueueFull, FINAL_STATUSES
+from src.metrics import REQUEST_SECONDS, render as render_metrics
+from src import profiling
 import threading
+import hmac
+import math
 
 DEPLOY_COLOR = os.getenv("DEPLOY_COLOR", "unknown")
+# /admin/* доступні лише якщо задано: запит має містити заголовок X-Admin-Token з цим значенням
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 METADATA_PATH = "/models/training_metadata.json"
 
 
-#Логування
+#Логування: запис у файл і консоль робить фоновий потік (src/logging_setup.py)
 #docker exec -it ai-deploy-project-ai_api-1 tail -f logs/api.log
 os.makedirs("/logs", exist_ok=True)
-logging.basicConfig(filename="/logs/api.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-console.setFormatter(formatter)
-logging.getLogger("").addHandler(console)
+log_handler = setup_logging("/logs/api.log")
+access_sampler = AccessLogSampler()
 
 app = Flask(__name__)
 start_time = time()
 
-# model_loaded flag (reflects if model is loaded in memory)
-model_loaded = load_model()
+try:
+    load_model()
+except Exception:
+    logging.exception("Initial model load failed")
+
+# Спільний батчер для /predict: конкурентні запити об'єднуються в один forward pass.
+# Для кожної версії моделі з реєстру — окремий батчер, щоб батч завжди йшов через одну модель.
+batcher = MicroBatcher(predict_arrays, name="predict-batcher")
+_version_batchers = {}
+_version_batchers_lock = threading.Lock()
+# Кеш результатів за хешем зображення + версією моделі; очищується на /reload
+prediction_cache = PredictionCache()
+on_swap(lambda handle: prediction_cache.clear())
+
+def get_batcher(version):
+    if version is None:
+        return batcher
+    with _version_batchers_lock:
+        b = _version_batchers.get(version)
+        if b is None:
+            b = MicroBatcher(lambda arrays: predict_arrays(arrays, version), name=f"batcher-{version}")
+            _version_batchers[version] = b
+        return b
+
+def requested_version():
+    """Версія моделі із заголовка X-Model-Version або параметра ?version= (None = активна)."""
+    version = normalize_version(request.headers.get("X-Model-Version") or request.args.get("version"))
+    if version is not None and not version_exists(version):
+        raise UnknownModelVersion(f"Model version not found: {version}")
+    return version
+
+def run_prediction_job(payload, timings):
+    """Обробник асинхронної задачі: одне зображення (через батчер) або пакет."""
+    version, single, items = payload
+    if single:
+        result = predict_image_bytes(items[0][1], batcher=get_batcher(version), cache=prediction_cache,
+                                     version=version, timings=timings)
+        if "error" in result:
+            raise ValueError(result["error"])
+        return result
+
+    preds = predict_many_bytes([data for _, data in items], chunk_size=BATCH_MAX_SIZE,
+                               cache=prediction_cache, version=version, timings=timings)
+    return [{"index": i, "filename": name, **pred} for i, ((name, _), pred) in enumerate(zip(items, preds))]
+
+jobs = JobQueue(run_prediction_job)
 
 def get_model_version():
     try:
@@ -41,7 +93,23 @@ def get_model_version():
 
 @app.before_request
 def log_request_info():
-    logging.info(f"Incoming request: {request.method} {request.path} from {request.remote_addr}")
+    g.request_started = perf_counter()
+    # g.log_sampled також вирішує, чи логувати деталі /predict для цього запиту
+    g.log_sampled, skipped = access_sampler.sample(request.path)
+    if g.log_sampled:
+        if skipped:
+            logging.info("Incoming request: %s %s from %s (%d similar skipped)",
+                         request.method, request.path, request.remote_addr, skipped)
+        else:
+            logging.info("Incoming request: %s %s from %s", request.method, request.path, request.remote_addr)
+
+@app.after_request
+def observe_request(response):
+    # для потокових відповідей (/jobs/<id>/stream) — час до заголовків
+    started = g.get("request_started")
+    if started is not None:
+        REQUEST_SECONDS.labels(request.endpoint or "none", response.status_code).observe(perf_counter() - started)
+    return response
 
 @app.route("/", methods=["GET"])
 def home():
@@ -64,16 +132,19 @@ def health():
     """
     uptime = int(time() - start_time)
     version = get_model_version()
+    model_loaded = is_model_loaded()
     status = {"status": "ok" if model_loaded else "degraded",
                "uptime_seconds": uptime,
                "model_loaded": bool(model_loaded),
                "deploy_color": DEPLOY_COLOR,
-               "model_version": version}
+               "model_version": version,
+               "model": get_model_state(),
+               "prediction_cache": prediction_cache.stats(),
+               "jobs": jobs.stats()}
     return jsonify(status), (200 if model_loaded else 500)
 
 @app.route("/predict", methods=["POST"])
 def predict_route():
-    global model_loaded
     if "file" not in request.files:
         return jsonify({"error": "No input provide"}), 400
 
@@ -82,32 +153,226 @@ def predict_route():
         return jsonify({"error": "No selected file"}), 400
     
     try:
-        #Запис логів
-        logging.info(f"Received file: {file.filename}, size: {len(file.read())} bytes")
-        file.seek(0)
+        version = requested_version()
 
-        #Робота ШІ
-        img_bytes = file.read()
-        result = predict_image_bytes(img_bytes)
+        # Одне читання файлу без копіювання; img_bytes валідний лише всередині with
+        with read_upload(file) as img_bytes:
+            if g.log_sampled:
+                logging.info("Received file: %s, size: %d bytes", file.filename, len(img_bytes))
+
+            #Робота ШІ
+            session = profiling.active
+            if session is not None:
+                # профільований запит: усі етапи в потоці профайлера, без батчера і кешу
+                result = session.run(lambda: predict_image_bytes(img_bytes, version=version))
+            else:
+                result = predict_image_bytes(img_bytes, batcher=get_batcher(version), cache=prediction_cache,
+                                             version=version)
         if "error" in result:
             return jsonify(result), 400
-        logging.info(f"Prediction result: {result}")
-        return jsonify(result)
+        if g.log_sampled:
+            logging.info("Prediction result: %s", result)
+        return jsonify(result), 200, {"X-Model-Version": version or "latest"}
+    except UnknownModelVersion as e:
+        return jsonify({"error": str(e)}), 404
+    except QueueFullError as e:
+        logging.warning(str(e))
+        return jsonify({"error": "Server busy, try again later"}), 503
     except Exception as e:
         logging.exception("Error during prediction")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch_route():
+    """
+    Багато зображень за один запит: декілька частин "files" та/або zip/tar архів.
+    Повертає результати в тому ж порядку; помилка одного файлу не зупиняє інші.
+    """
+    try:
+        version = requested_version()
+        items = collect_batch_files(request.files)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    except UnknownModelVersion as e:
+        return jsonify({"error": str(e)}), 404
+
+    try:
+        names = [name for name, _ in items]
+        session = profiling.active
+        if session is not None:
+            preds = session.run(lambda: predict_many_bytes([data for _, data in items], chunk_size=BATCH_MAX_SIZE,
+                                                           version=version))
+        else:
+            preds = predict_many_bytes([data for _, data in items], chunk_size=BATCH_MAX_SIZE,
+                                       cache=prediction_cache, version=version)
+        if preds and all("error" in p for p in preds) and preds[0]["error"].startswith("No model"):
+            return jsonify(preds[0]), 400
+
+        results = []
+        for i, (name, pred) in enumerate(zip(names, preds)):
+            results.append({"index": i, "filename": name, **pred})
+        failed = sum(1 for r in results if "error" in r)
+        logging.info("Batch prediction: %d images, %d failed", len(results), failed)
+        return jsonify({"count": len(results), "failed": failed, "results": results}), 200, \
+            {"X-Model-Version": version or "latest"}
+    except UnknownModelVersion as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logging.exception("Error during batch prediction")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@app.route("/predict/async", methods=["POST"])
+def predict_async_route():
+    """
+    Ставить задачу в чергу і одразу повертає її id (202). Одне зображення — поле "file",
+    пакет — як у /predict/batch. Результат: GET /jobs/<id> або GET /jobs/<id>/stream.
+    """
+    try:
+        version = requested_version()
+        single = "file" in request.files and len(request.files) == 1 \
+            and len(request.files.getlist("file")) == 1
+        items = collect_batch_files(request.files)
+        job = jobs.submit((version, single, items),
+                          meta={"images": len(items), "model_version": version or "latest"})
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    except UnknownModelVersion as e:
+        return jsonify({"error": str(e)}), 404
+    except JobQueueFull as e:
+        logging.warning(str(e))
+        return jsonify({"error": "Job queue is full, try again later"}), 429, {"Retry-After": "1"}
+
+    if g.log_sampled:
+        logging.info("Async job %s queued: %d images", job["id"], len(items))
+    return jsonify({"job_id": job["id"], "status": job["status"],
+                    "poll": f"/jobs/{job['id']}", "stream": f"/jobs/{job['id']}/stream"}), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_route(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/stream", methods=["GET"])
+def job_stream_route(job_id):
+    """NDJSON-потік: рядок зі статусом при кожній зміні, останній рядок — фінальний результат."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    # некоректний рядок (і NaN) — 400; значення обмежується 1..3600 с
+    timeout = request.args.get("timeout", type=float) if "timeout" in request.args else 300.0
+    if timeout is None or math.isnan(timeout):
+        return jsonify({"error": "timeout must be a number of seconds"}), 400
+    timeout = max(1.0, min(timeout, 3600.0))
+
+    def generate(job):
+        deadline = time() + timeout
+        last_status = None
+        while True:
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield json.dumps(job) + "\n"
+            if job["status"] in FINAL_STATUSES or time() >= deadline:
+                return
+            job = jobs.wait(job_id, timeout=min(5.0, max(0.0, deadline - time()))) or job
+
+    return Response(stream_with_context(generate(job)), mimetype="application/x-ndjson")
+
+@app.route("/batch_stats", methods=["GET"])
+def batch_stats():
+    """Статистика мікробатчингу: глибина черги, розміри батчів, час очікування."""
+    stats = batcher.stats()
+    with _version_batchers_lock:
+        versions = dict(_version_batchers)
+    if versions:
+        stats["versions"] = {v: b.stats() for v, b in versions.items()}
+    return jsonify(stats)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    """Метрики у форматі Prometheus, сумарно по всіх воркерах gunicorn (src/metrics.py)."""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+def admin_denied():
+    # без ADMIN_TOKEN адмін-маршрути вимкнені — виглядають як неіснуючі
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Admin token required"}), 403
+    return None
+
+@app.route("/admin/profile", methods=["POST"])
+def start_profile_route():
+    """
+    Профілювання наступних ?requests= (50) запитів /predict і /predict/batch або ?seconds= (30),
+    що настане раніше; ?shapes=1 — записувати форми тензорів. Результат — Chrome trace.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        session = profiling.start(max_requests=request.args.get("requests", 50, type=int),
+                                  seconds=request.args.get("seconds", 30.0, type=float),
+                                  record_shapes=request.args.get("shapes") in ("1", "true"))
+    except profiling.ProfilingBusy as e:
+        return jsonify({"error": str(e), "profile": profiling.status()}), 409
+    logging.info("Profiling session %s started", session.id)
+    return jsonify(session.info()), 202
+
+@app.route("/admin/profile", methods=["GET"])
+def profile_status_route():
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify(profiling.status())
+
+@app.route("/admin/profile/stop", methods=["POST"])
+def stop_profile_route():
+    denied = admin_denied()
+    if denied:
+        return denied
+    session = profiling.stop()
+    if session is None:
+        return jsonify({"error": "No profiling session is running in this worker"}), 404
+    return jsonify(session.info())
+
+@app.route("/admin/profile/<trace_id>/trace", methods=["GET"])
+def profile_trace_route(trace_id):
+    """Chrome trace сесії (відкрити в chrome://tracing або ui.perfetto.dev)."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    path = profiling.trace_path(trace_id)
+    if path is None:
+        return jsonify({"error": "Trace not found"}), 404
+    return send_file(path, mimetype="application/json", as_attachment=True,
+                     download_name=os.path.basename(path))
+
+@app.route("/models", methods=["GET"])
+def models_route():
+    """Версії з реєстру, доступні для маршрутизації через X-Model-Version / ?version=."""
+    return jsonify({"versions": list_versions(), "model": get_model_state()})
+
 @app.route("/reload", methods=["POST"])
 def reload_route():
-    global model_loaded
+    """
+    Перезавантаження моделі у фоні: нова модель завантажується, прогрівається та перевіряється,
+    і лише потім атомарно замінює поточну. ?wait=1 — чекати завершення (стара поведінка).
+    """
     try:
-        ok = load_model(force_reload=True)
-        model_loaded = bool(ok)
-        logging.info(f"/reload called - model_loaded={model_loaded}")
-        return jsonify({"reloaded": model_loaded})
+        if request.args.get("wait") in ("1", "true"):
+            ok = load_model(force_reload=True)
+            logging.info(f"/reload called - model_loaded={ok}")
+            return jsonify({"reloaded": bool(ok), "model": get_model_state()})
+
+        started = reload_model_async()
+        logging.info(f"/reload called - background reload started={started}")
+        return jsonify({"reloading": True, "started": started, "model": get_model_state()}), 202
     except Exception as e:
         logging.exception("Error loading model")
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e), "model": get_model_state()}), 500
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080)
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8080")), threaded=True)
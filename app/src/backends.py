@@ -0,0 +1,212 @@
+"""
+Inference backends for CPU serving.
+
+    eager         plain fp32 nn.Module (default)
+    torchscript   traced + frozen TorchScript graph
+    dynamic_int8  int8 dynamic quantization of Linear layers, traced + frozen
+    static_int8   int8 static quantization of the whole ResNet (fbgemm/x86), calibrated, traced + frozen
+
+INFERENCE_CHANNELS_LAST=1 additionally switches weights and inputs to channels_last.
+Exported graphs are cached next to the weights as <name>.<backend>[.cl].ts and tagged with the
+fingerprint of the .pth they were built from, so a restart loads them instead of re-tracing.
+
+Accuracy/latency check against the CIFAR-10 test split:
+    python -m src.backends --model /models/model_latest.pth --limit 2000
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import torch
+import torch.nn as nn
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+INFERENCE_CHANNELS_LAST = os.getenv("INFERENCE_CHANNELS_LAST", "0") == "1"
+BACKENDS = ("eager", "torchscript", "dynamic_int8", "static_int8")
+
+DATA_ROOT = os.getenv("DATA_ROOT", "/data")
+CALIBRATION_BATCHES = int(os.getenv("QUANT_CALIBRATION_BATCHES", "8"))
+CALIBRATION_BATCH_SIZE = 32
+
+
+def export_path(path, backend, channels_last=False):
+    base = path[:-4] if path.endswith(".pth") else path
+    return f"{base}.{backend}{'.cl' if channels_last else ''}.ts"
+
+
+def _load_cached(cache_path, fingerprint):
+    if not os.path.exists(cache_path):
+        return None
+    extra = {"source_version": ""}
+    try:
+        module = torch.jit.load(cache_path, map_location="cpu", _extra_files=extra)
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable export {cache_path}: {e}")
+        return None
+    source = extra["source_version"]
+    if isinstance(source, bytes):
+        source = source.decode()
+    if source != fingerprint:
+        return None
+    return module
+
+
+def _save_cached(module, cache_path, fingerprint):
+    tmp = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        torch.jit.save(module, tmp, _extra_files={"source_version": fingerprint})
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        # /models може бути read-only — тоді просто не кешуємо
+        logging.warning(f"Could not cache export {cache_path}: {e}")
+
+
+def _trace(model, channels_last):
+    example = torch.zeros((1, 3, 224, 224))
+    if channels_last:
+        example = example.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    return torch.jit.freeze(traced.eval())
+
+
+def calibration_batches(n_batches=CALIBRATION_BATCHES, batch_size=CALIBRATION_BATCH_SIZE):
+    """
+    Batches for static quantization calibration: CIFAR-10 train images from DATA_ROOT if they
+    are already on disk, otherwise random noise (works, but costs accuracy).
+    """
+    try:
+        from torchvision import datasets
+        from src.model import transform
+        ds = datasets.CIFAR10(root=DATA_ROOT, train=True, download=False, transform=transform)
+        g = torch.Generator().manual_seed(0)
+        idx = torch.randperm(len(ds), generator=g)[:n_batches * batch_size].tolist()
+        for start in range(0, len(idx), batch_size):
+            yield torch.stack([ds[i][0] for i in idx[start:start + batch_size]])
+        return
+    except Exception as e:
+        logging.warning(f"CIFAR-10 not found under {DATA_ROOT} ({e}); calibrating on random data")
+    for _ in range(n_batches):
+        yield torch.randn(batch_size, 3, 224, 224)
+
+
+def _static_int8(model, num_classes):
+    from torchvision.models.quantization import resnet18 as quantizable_resnet18
+    engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "fbgemm"
+    torch.backends.quantized.engine = engine
+
+    qmodel = quantizable_resnet18(weights=None, quantize=False, num_classes=num_classes)
+    qmodel.load_state_dict(model.state_dict())
+    qmodel.eval()
+    qmodel.fuse_model()
+    qmodel.qconfig = torch.ao.quantization.get_default_qconfig(engine)
+    torch.ao.quantization.prepare(qmodel, inplace=True)
+    with torch.no_grad():
+        for batch in calibration_batches():
+            qmodel(batch)
+    torch.ao.quantization.convert(qmodel, inplace=True)
+    return qmodel
+
+
+def prepare_model(model, path, fingerprint, backend=INFERENCE_BACKEND,
+                  channels_last=INFERENCE_CHANNELS_LAST, device=torch.device("cpu")):
+    """
+    Turn a loaded fp32 eval-mode model into the runnable for `backend`. Non-eager backends
+    are loaded from the export cache when it matches `fingerprint`, otherwise built and cached.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND={backend}, expected one of {BACKENDS}")
+    if backend != "eager" and device.type != "cpu":
+        logging.warning(f"Backend {backend} is CPU-only, using eager on {device}")
+        backend = "eager"
+
+    if backend.endswith("int8"):
+        # квантовані ядра fbgemm працюють з NCHW, channels_last тут нічого не дає
+        channels_last = False
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if backend == "eager":
+        return model
+
+    cache_path = export_path(path, backend, channels_last)
+    module = _load_cached(cache_path, fingerprint)
+    if module is not None:
+        logging.info(f"Loaded {backend} export from {cache_path}")
+        return module
+
+    started = time.perf_counter()
+    if backend == "dynamic_int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    elif backend == "static_int8":
+        model = _static_int8(model, model.fc.out_features)
+    module = _trace(model, channels_last)
+    _save_cached(module, cache_path, fingerprint)
+    logging.info(f"Built {backend} export in {time.perf_counter() - started:.1f}s -> {cache_path}")
+    return module
+
+
+def evaluate(model_path, backends=BACKENDS, limit=2000, batch_size=64, channels_last=False):
+    """
+    Accuracy on the CIFAR-10 test split, agreement with eager fp32 and mean batch latency
+    for each backend. Returns a list of dicts.
+    """
+    from torchvision import datasets
+    from torch.utils.data import DataLoader, Subset
+    from src.model import _build_model, _file_version, transform, CLASS_NAMES
+
+    ds = datasets.CIFAR10(root=DATA_ROOT, train=False, download=True, transform=transform)
+    if limit:
+        ds = Subset(ds, range(min(limit, len(ds))))
+    loader = DataLoader(ds, batch_size=batch_size, shuffle=False)
+    fingerprint = _file_version(model_path)
+
+    def build(backend):
+        m = _build_model(num_classes=len(CLASS_NAMES)).cpu()
+        m.load_state_dict(torch.load(model_path, map_location="cpu"))
+        m.eval()
+        return prepare_model(m, model_path, fingerprint, backend=backend,
+                             channels_last=channels_last)
+
+    reference = None
+    report = []
+    for backend in backends:
+        runner = build(backend)
+        preds, labels, seconds = [], [], 0.0
+        with torch.no_grad():
+            for x, y in loader:
+                if channels_last and not backend.endswith("int8"):
+                    x = x.contiguous(memory_format=torch.channels_last)
+                started = time.perf_counter()
+                out = runner(x)
+                seconds += time.perf_counter() - started
+                preds.append(out.argmax(1))
+                labels.append(y)
+        preds = torch.cat(preds)
+        labels = torch.cat(labels)
+        if reference is None:
+            reference = preds
+        report.append({
+            "backend": backend,
+            "channels_last": channels_last,
+            "images": len(labels),
+            "accuracy": round((preds == labels).float().mean().item(), 4),
+            "agreement_with_first": round((preds == reference).float().mean().item(), 4),
+            "ms_per_batch": round(1000 * seconds / len(loader), 2),
+            "images_per_sec": round(len(labels) / seconds, 1),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare inference backends on CIFAR-10 test split")
+    parser.add_argument("--model", default="/models/model_latest.pth")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--channels-last", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    results = evaluate(args.model, backends=args.backends.split(","), limit=args.limit,
+                       batch_size=args.batch_size, channels_last=args.channels_last)
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "1024"))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent request handlers and runs them through
+    `run_batch(items) -> results` together. A batch is flushed when it reaches
+    `max_batch_size` items or when the oldest item has waited `max_wait_ms`.
+    """
+
+    def __init__(self, run_batch, max_batch_size=BATCH_MAX_SIZE,
+                 max_wait_ms=BATCH_MAX_WAIT_MS, max_queue=BATCH_MAX_QUEUE, name="batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        self.name = name
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+        # статистика
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._rejected = 0
+        self._errors = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = {}
+        self._recent_waits = deque(maxlen=1024)
+        self._recent_runs = deque(maxlen=256)
+
+    def _ensure_worker(self):
+        # Worker thread is started lazily and restarted after fork (gunicorn preload),
+        # because threads do not survive into child processes.
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                self._queue = deque()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit_async(self, item):
+        """Enqueue one item, returns a Future with its individual result."""
+        self._ensure_worker()
+        fut = Future()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                with self._stats_lock:
+                    self._rejected += 1
+                raise QueueFullError(f"{self.name} queue is full ({self.max_queue})")
+            self._queue.append((item, fut, time.perf_counter()))
+            depth = len(self._queue)
+            self._cond.notify()
+        with self._stats_lock:
+            self._requests += 1
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+        return fut
+
+    def submit(self, item, timeout=None):
+        """Enqueue one item and block until its result is ready."""
+        return self.submit_async(item).result(timeout=timeout)
+
+    def _collect(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [b[0] for b in batch]
+            try:
+                results = self.run_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(items)} items")
+                for (_, fut, _), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                with self._stats_lock:
+                    self._errors += 1
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            finished = time.perf_counter()
+
+            with self._stats_lock:
+                self._batches += 1
+                size = len(batch)
+                self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+                for _, _, enqueued in batch:
+                    self._recent_waits.append(started - enqueued)
+                self._recent_runs.append((size, finished - started))
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self):
+        depth = self.queue_depth()
+        with self._stats_lock:
+            waits = sorted(self._recent_waits)
+            runs = list(self._recent_runs)
+            batches = self._batches
+            served = sum(size * count for size, count in self._batch_sizes.items())
+            run_time = sum(t for _, t in runs)
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": depth,
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._requests,
+                "rejected": self._rejected,
+                "batches": batches,
+                "errors": self._errors,
+                "avg_batch_size": round(served / batches, 2) if batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "queue_wait_ms": {
+                    "p50": _percentile_ms(waits, 0.50),
+                    "p95": _percentile_ms(waits, 0.95),
+                    "p99": _percentile_ms(waits, 0.99),
+                },
+                "recent_images_per_sec": round(sum(s for s, _ in runs) / run_time, 2) if run_time > 0 else 0.0,
+            }
+
+
+def _percentile_ms(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return round(sorted_values[idx] * 1000.0, 3)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+# Спільний дисковий кеш (напр. /models/.prediction_cache), щоб blue і green прогрівали один одного
+PREDICTION_CACHE_DIR = os.getenv("PREDICTION_CACHE_DIR", "")
+
+
+def image_digest(image_bytes):
+    return hashlib.blake2b(image_bytes, digest_size=20).hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of prediction results keyed by (model version, hash of image bytes).
+    Memory is bounded by `max_entries`; results are small dicts so an entry costs ~0.5 KB.
+    If `disk_dir` is set, entries are also written there (one small JSON file per entry)
+    and looked up on a memory miss, so processes sharing the volume warm each other.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL,
+                 disk_dir=PREDICTION_CACHE_DIR or None):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.disk_dir = disk_dir
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(image_bytes, version):
+        return f"{version}:{image_digest(image_bytes)}"
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, result = entry
+                if expires >= now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._data[key]
+
+        result = self._disk_get(key)
+        with self._lock:
+            if result is not None:
+                self.disk_hits += 1
+                self._store(key, result, now)
+            else:
+                self.misses += 1
+        return result
+
+    def put(self, key, result):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(key, result, time.monotonic())
+        self._disk_put(key, result)
+
+    def _store(self, key, result, now):
+        self._data[key] = (now + self.ttl, result)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all in-memory entries (called on /reload). Disk entries are keyed by version."""
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def _disk_path(self, key):
+        version, digest = key.split(":", 1)
+        safe_version = "".join(c if c.isalnum() or c in "._-" else "_" for c in version)
+        return os.path.join(self.disk_dir, safe_version, digest[:2], digest + ".json")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, result):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "disk_dir": self.disk_dir,
+            }
@@ -0,0 +1,223 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "256"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_TTL = float(os.getenv("JOB_TTL", "600"))
+# Стан задач дублюється у файли, щоб /jobs/<id> працював з будь-якого gunicorn-воркера
+JOB_DIR = os.getenv("JOB_DIR", "/tmp/ai_api_jobs")
+
+FINAL_STATUSES = ("done", "failed")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue served by a pool of worker threads.
+    `handler(payload, timings)` does the work, fills `timings` with stage durations in ms
+    and returns a JSON-serializable result.
+    """
+
+    def __init__(self, handler, workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE,
+                 ttl=JOB_TTL, store_dir=JOB_DIR):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.ttl = ttl
+        self.store_dir = store_dir
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._jobs = {}
+        self._events = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self.submitted = 0
+        self.rejected = 0
+        self._last_sweep = 0.0
+        if self.store_dir:
+            os.makedirs(self.store_dir, exist_ok=True)
+
+    def _ensure_workers(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # після fork черга й потоки батьківського процесу недійсні
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._jobs, self._events = {}, {}
+            self._pid = pid
+            self._threads = []
+            for i in range(self.workers):
+                t = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, payload, meta=None):
+        """Enqueue a job and return its public record. Raises JobQueueFull under backpressure."""
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "timings_ms": {},
+            "result": None,
+            "error": None,
+        }
+        if meta:
+            job.update(meta)
+        snapshot = dict(job)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._events[job_id] = threading.Event()
+        self._persist(snapshot)
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._events.pop(job_id, None)
+                self.rejected += 1
+            self._remove(job_id)
+            raise JobQueueFull(f"Job queue is full ({self.max_queue})")
+        with self._lock:
+            self.submitted += 1
+        return snapshot
+
+    def _loop(self):
+        while True:
+            job_id, payload = self._queue.get()
+            started = time.time()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                job["status"] = "running"
+                job["started_at"] = started
+                job["timings_ms"]["queue_wait"] = round((started - job["created_at"]) * 1000, 2)
+                snapshot = dict(job)
+            self._persist(snapshot)
+
+            timings = {}
+            try:
+                result, error, status = self.handler(payload, timings), None, "done"
+            except Exception as e:
+                result, error, status = None, str(e), "failed"
+            finished = time.time()
+
+            with self._lock:
+                job["status"] = status
+                job["result"] = result
+                job["error"] = error
+                job["finished_at"] = finished
+                job["timings_ms"].update({k: round(v, 2) for k, v in timings.items()})
+                job["timings_ms"]["total"] = round((finished - job["created_at"]) * 1000, 2)
+                snapshot = dict(job)
+                event = self._events.get(job_id)
+            self._persist(snapshot)
+            if event is not None:
+                event.set()
+            self._expire()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._load(job_id)
+
+    def wait(self, job_id, timeout):
+        """Block until the job reaches a final status or `timeout` seconds pass; returns its record."""
+        with self._lock:
+            event = self._events.get(job_id)
+        if event is not None:
+            event.wait(timeout)
+            return self.get(job_id)
+
+        # задача з іншого воркера: опитуємо її файл
+        deadline = time.time() + timeout
+        job = self._load(job_id)
+        while job is not None and job["status"] not in FINAL_STATUSES and time.time() < deadline:
+            time.sleep(0.2)
+            job = self._load(job_id)
+        return job
+
+    def _path(self, job_id):
+        return os.path.join(self.store_dir, f"{job_id}.json")
+
+    def _persist(self, job):
+        if not self.store_dir:
+            return
+        path = self._path(job["id"])
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(job, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _remove(self, job_id):
+        if not self.store_dir:
+            return
+        try:
+            os.remove(self._path(job_id))
+        except OSError:
+            pass
+
+    def _load(self, job_id):
+        if not self.store_dir or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        try:
+            with open(self._path(job_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items()
+                       if job["finished_at"] is not None and now - job["finished_at"] > self.ttl]
+            for jid in expired:
+                self._jobs.pop(jid, None)
+                self._events.pop(jid, None)
+        for jid in expired:
+            self._remove(jid)
+
+        # файли задач від воркерів, які вже перезапущено
+        if self.store_dir and now - self._last_sweep > 60:
+            self._last_sweep = now
+            try:
+                for name in os.listdir(self.store_dir):
+                    path = os.path.join(self.store_dir, name)
+                    if now - os.path.getmtime(path) > 2 * self.ttl:
+                        os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "jobs": counts,
+            }
@@ -0,0 +1,114 @@
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Частка звичайних запитів, що потрапляють в access-лог (1.0 = всі)
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.1"))
+# Health-check запити логуються не частіше одного разу на цей інтервал (секунди)
+HEALTH_LOG_INTERVAL = float(os.getenv("HEALTH_LOG_INTERVAL", "60"))
+HEALTH_PATHS = ("/health", "/status", "/batch_stats", "/metrics")
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on an in-memory queue; a background QueueListener formats them and does
+    the file/console I/O. The listener is (re)started lazily in each process, so the handler
+    keeps working in gunicorn workers forked after the app was preloaded.
+    """
+
+    def __init__(self, handlers, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target_handlers = handlers
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                self.queue = queue.Queue(maxsize=self.maxsize)
+            self._listener = logging.handlers.QueueListener(
+                self.queue, *self.target_handlers, respect_handler_level=True)
+            self._listener.start()
+            self._pid = pid
+
+    def prepare(self, record):
+        # Черга в межах одного процесу: запис не потрібно форматувати й копіювати в потоці
+        # запиту, це зробить listener. Лише traceback форматуємо одразу, поки він живий.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+
+
+def setup_logging(log_file, level=logging.INFO):
+    """Root logger -> AsyncQueueHandler -> (file, console). Returns the queue handler."""
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(formatter)
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+
+    handler = AsyncQueueHandler([file_handler, console])
+    root = logging.getLogger("")
+    root.setLevel(level)
+    root.addHandler(handler)
+    return handler
+
+
+class AccessLogSampler:
+    """
+    Decides whether a request is written to the access log: health-check paths at most once
+    per `health_interval` seconds (with the number of skipped hits), others with probability
+    `sample_rate`.
+    """
+
+    def __init__(self, sample_rate=ACCESS_LOG_SAMPLE_RATE, health_interval=HEALTH_LOG_INTERVAL,
+                 health_paths=HEALTH_PATHS):
+        self.sample_rate = sample_rate
+        self.health_interval = health_interval
+        self.health_paths = health_paths
+        self._last_health = 0.0
+        self._skipped_health = 0
+
+    def sample(self, path):
+        """Returns (log_it, skipped_health_count)."""
+        if path in self.health_paths:
+            now = time.monotonic()
+            if now - self._last_health >= self.health_interval:
+                # гонка між потоками тут не страшна: у гіршому разі зайвий рядок логу
+                skipped, self._skipped_health = self._skipped_health, 0
+                self._last_health = now
+                return True, skipped
+            self._skipped_health += 1
+            return False, 0
+        if self.sample_rate >= 1.0:
+            return True, 0
+        return random.random() < self.sample_rate, 0
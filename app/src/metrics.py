@@ -0,0 +1,347 @@
+"""
+Prometheus metrics of ai_api (GET /metrics, text exposition format 0.0.4).
+
+Gunicorn runs several worker processes, and a scrape reaches only one of them. So every
+process keeps its values in its own memory-mapped file <pid>.db in METRICS_DIR, and render()
+sums the files of all processes. When gunicorn replaces a worker, the master folds its file
+into archive.db (child_exit in gunicorn.conf.py), so counters never go backwards and the
+directory holds one file per live process plus the archive. gunicorn.conf.py clears the
+directory on start.
+
+Hot path: Counter.inc() / Histogram.observe() on a child bound with .labels(...) update a
+Python float and pack it into the mapping under one per-process lock (~1-2 us), with no
+system calls. Histogram buckets are stored non-cumulative and accumulated when rendered.
+"""
+import bisect
+import fcntl
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "ai_api_metrics"))
+
+# Межі (секунди) для латентності етапів інференсу та запитів
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOAD_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+ARCHIVE_NAME = "archive.db"
+
+_INITIAL_SIZE = 64 * 1024
+_HEADER = struct.Struct("<Q")   # використані байти файлу
+_KEYLEN = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+
+
+class _ProcessFile:
+    """Append-only {series key: float} of one process: records [u32 len][key, padded to 8][f64]."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._offsets = {}
+        self._values = {}
+        if os.path.exists(path):
+            os.remove(path)  # той самий pid від попереднього запуску
+        self._f = open(path, "w+b")
+        self._f.truncate(_INITIAL_SIZE)
+        self._mm = mmap.mmap(self._f.fileno(), _INITIAL_SIZE)
+        self._used = _HEADER.size
+        _HEADER.pack_into(self._mm, 0, self._used)
+
+    def _slot(self, key):
+        raw = key.encode()
+        size = (_KEYLEN.size + len(raw) + 7) // 8 * 8 + _VALUE.size
+        if self._used + size > len(self._mm):
+            new_size = max(2 * len(self._mm), self._used + size)
+            self._mm.close()
+            self._f.truncate(new_size)
+            self._mm = mmap.mmap(self._f.fileno(), new_size)
+        start = self._used
+        _KEYLEN.pack_into(self._mm, start, len(raw))
+        self._mm[start + _KEYLEN.size:start + _KEYLEN.size + len(raw)] = raw
+        offset = start + size - _VALUE.size
+        _VALUE.pack_into(self._mm, offset, 0.0)
+        # заголовок оновлюється останнім: читач бачить лише повністю записані записи
+        self._used = start + size
+        _HEADER.pack_into(self._mm, 0, self._used)
+        self._offsets[key] = offset
+        self._values[key] = 0.0
+        return offset
+
+    def add(self, items):
+        """items: iterable of (key, amount); one lock for all of them."""
+        with self.lock:
+            for key, amount in items:
+                offset = self._offsets.get(key)
+                if offset is None:
+                    offset = self._slot(key)
+                value = self._values[key] + amount
+                self._values[key] = value
+                _VALUE.pack_into(self._mm, offset, value)
+
+
+_file = None
+_file_pid = None
+_file_lock = threading.Lock()
+
+
+def _process_file():
+    # файл відкривається ліниво й наново після fork (gunicorn preload): у кожного процесу свій
+    global _file, _file_pid
+    pid = os.getpid()
+    if _file_pid != pid:
+        with _file_lock:
+            if _file_pid != pid:
+                os.makedirs(METRICS_DIR, exist_ok=True)
+                _file = _ProcessFile(os.path.join(METRICS_DIR, f"{pid}.db"))
+                _file_pid = pid
+    return _file
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        return
+    (used,) = _HEADER.unpack_from(data, 0)
+    pos = _HEADER.size
+    while pos < min(used, len(data)):
+        (n,) = _KEYLEN.unpack_from(data, pos)
+        key = data[pos + _KEYLEN.size:pos + _KEYLEN.size + n].decode()
+        size = (_KEYLEN.size + n + 7) // 8 * 8 + _VALUE.size
+        (value,) = _VALUE.unpack_from(data, pos + size - _VALUE.size)
+        yield key, value
+        pos += size
+
+
+@contextmanager
+def _dir_lock(kind):
+    # render() читає файли під спільним локом, archive() замінює їх під ексклюзивним:
+    # scrape не побачить процес і в архіві, і в його власному файлі (або в жодному)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, ".lock"), "a") as f:
+        fcntl.flock(f, kind)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_file(path, values):
+    out = bytearray(_HEADER.size)
+    for key, value in values.items():
+        raw = key.encode()
+        size = (_KEYLEN.size + len(raw) + 7) // 8 * 8 + _VALUE.size
+        record = bytearray(size)
+        _KEYLEN.pack_into(record, 0, len(raw))
+        record[_KEYLEN.size:_KEYLEN.size + len(raw)] = raw
+        _VALUE.pack_into(record, size - _VALUE.size, value)
+        out += record
+    _HEADER.pack_into(out, 0, len(out))
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(out)
+    os.replace(tmp, path)
+
+
+def archive(pid):
+    """
+    Fold the file of an exited process into archive.db and remove it (called by the gunicorn
+    master from child_exit), so recycled workers do not accumulate files read on every scrape.
+    """
+    path = os.path.join(METRICS_DIR, f"{pid}.db")
+    if not os.path.exists(path):
+        return
+    archive_path = os.path.join(METRICS_DIR, ARCHIVE_NAME)
+    with _dir_lock(fcntl.LOCK_EX):
+        totals = {}
+        for p in (archive_path, path):
+            if os.path.exists(p):
+                for key, value in _read_file(p):
+                    totals[key] = totals.get(key, 0.0) + value
+        _write_file(archive_path, totals)
+        os.remove(path)
+
+
+def clear():
+    """
+    Remove the files of earlier runs (called by the gunicorn master on start). The caller's own
+    file is kept: with preload_app the master has already recorded the initial model load.
+    """
+    own = f"{os.getpid()}.db"
+    if os.path.isdir(METRICS_DIR):
+        for f in os.listdir(METRICS_DIR):
+            if f.endswith(".db") and f != own:
+                try:
+                    os.remove(os.path.join(METRICS_DIR, f))
+                except OSError:
+                    pass
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _fmt(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+_registry = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _registry.append(self)
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._child(_labels(self.labelnames, values))
+        return child
+
+    def _child(self, labelstr):
+        raise NotImplementedError
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _CounterChild:
+    def __init__(self, key):
+        self._items = ((key, 1.0),)
+        self._key = key
+
+    def inc(self, amount=1.0):
+        _process_file().add(self._items if amount == 1.0 else ((self._key, amount),))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self, labelstr):
+        return _CounterChild(f"{self.name}_total\x00{labelstr}")
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def render(self, series):
+        lines = self._header()
+        values = series.get(f"{self.name}_total", {})
+        if not values and not self.labelnames:
+            values = {"": 0.0}
+        for labelstr, value in sorted(values.items()):
+            lines.append(f"{self.name}_total{{{labelstr}}} {_fmt(value)}" if labelstr
+                         else f"{self.name}_total {_fmt(value)}")
+        return lines
+
+
+class _HistogramChild:
+    def __init__(self, name, labelstr, buckets):
+        self._buckets = buckets
+        prefix = f"{name}_bucket\x00{labelstr}" + ("," if labelstr else "")
+        self._bucket_keys = [f'{prefix}le="{_fmt(b)}"' for b in buckets] + [f'{prefix}le="+Inf"']
+        self._sum = f"{name}_sum\x00{labelstr}"
+        self._count = (f"{name}_count\x00{labelstr}", 1.0)
+
+    def observe(self, value):
+        i = bisect.bisect_left(self._buckets, value)
+        _process_file().add(((self._bucket_keys[i], 1.0), (self._sum, value), self._count))
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(b) for b in buckets)
+
+    def _child(self, labelstr):
+        return _HistogramChild(self.name, labelstr, self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self, series):
+        lines = self._header()
+        counts = series.get(f"{self.name}_count", {})
+        if not counts and not self.labelnames:
+            counts = {"": 0.0}
+        sums = series.get(f"{self.name}_sum", {})
+        buckets = series.get(f"{self.name}_bucket", {})
+        bounds = [_fmt(b) for b in self.buckets] + ["+Inf"]
+        for labelstr in sorted(counts):
+            prefix = labelstr + "," if labelstr else ""
+            total = 0.0
+            for le in bounds:
+                total += buckets.get(f'{prefix}le="{le}"', 0.0)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {_fmt(total)}')
+            braces = f"{{{labelstr}}}" if labelstr else ""
+            lines.append(f"{self.name}_sum{braces} {_fmt(sums.get(labelstr, 0.0))}")
+            lines.append(f"{self.name}_count{braces} {_fmt(counts[labelstr])}")
+        return lines
+
+
+def render():
+    """All metrics, summed over the files of every process, in the Prometheus text format."""
+    series = {}
+    with _dir_lock(fcntl.LOCK_SH):
+        for f in os.listdir(METRICS_DIR):
+            if not f.endswith(".db"):
+                continue
+            try:
+                for key, value in _read_file(os.path.join(METRICS_DIR, f)):
+                    name, _, labelstr = key.partition("\x00")
+                    per_name = series.setdefault(name, {})
+                    per_name[labelstr] = per_name.get(labelstr, 0.0) + value
+            except (OSError, struct.error, UnicodeDecodeError):
+                continue
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render(series))
+    return "\n".join(lines) + "\n"
+
+
+# --- метрики ai_api ----------------------------------------------------------
+
+REQUEST_SECONDS = Histogram(
+    "ai_api_request_duration_seconds", "End-to-end HTTP request time by endpoint and status code.",
+    ("endpoint", "code"))
+STAGE_SECONDS = Histogram(
+    "ai_api_inference_stage_seconds",
+    "Time of one inference stage: decode (per image), preprocess and forward (per batch).",
+    ("stage",))
+BATCH_SIZE = Histogram(
+    "ai_api_inference_batch_size", "Images per forward pass.", buckets=BATCH_SIZE_BUCKETS)
+MODEL_LOAD_SECONDS = Histogram(
+    "ai_api_model_load_seconds", "Time to load, warm up and smoke-test a model.",
+    ("kind",), buckets=LOAD_BUCKETS)
+MODEL_RELOADS = Counter(
+    "ai_api_model_reloads", "Reloads of model_latest.pth by result.", ("result",))
+CACHE_LOOKUPS = Counter(
+    "ai_api_prediction_cache_lookups", "Prediction cache lookups by result.", ("result",))
+
+DECODE = STAGE_SECONDS.labels("decode")
+PREPROCESS = STAGE_SECONDS.labels("preprocess")
+FORWARD = STAGE_SECONDS.labels("forward")
+CACHE_HIT = CACHE_LOOKUPS.labels("hit")
+CACHE_MISS = CACHE_LOOKUPS.labels("miss")
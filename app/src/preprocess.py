@@ -0,0 +1,150 @@
+import io
+import os
+import threading
+import numpy as np
+import torch
+from PIL import Image, UnidentifiedImageError
+
+IMAGE_SIZE = 224
+MEAN = (0.4914, 0.4822, 0.4465)
+STD = (0.2023, 0.1994, 0.2010)
+
+# JPEG draft mode lets libjpeg decode big photos at 1/2..1/8 scale straight away.
+# It is much faster for large uploads but no longer bit-exact with the reference transform.
+JPEG_DRAFT = os.getenv("PREPROCESS_JPEG_DRAFT", "0") == "1"
+
+# Максимальне відхилення від transforms.Compose (Resize -> ToTensor -> Normalize) при JPEG_DRAFT=0
+PARITY_ATOL = 1e-5
+
+
+class _MemoryReader(io.RawIOBase):
+    """Seekable read-only file over a memoryview, so PIL can decode without copying the upload."""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = len(self._view) + offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def _open_bytes(data):
+    # BytesIO(bytes) у CPython не копіює дані; memoryview читаємо напряму
+    return io.BytesIO(data) if isinstance(data, bytes) else _MemoryReader(memoryview(data))
+
+
+def decode_to_uint8(image_bytes, out=None, size=IMAGE_SIZE):
+    """
+    Decode image bytes and resize to size x size RGB. The pixels are written into `out`
+    (a [size, size, 3] uint8 array, e.g. one slot of a preallocated batch buffer) if given,
+    otherwise a new array is returned. Returns None if the bytes are not a readable image.
+    """
+    try:
+        img = Image.open(_open_bytes(image_bytes))
+        if JPEG_DRAFT and img.format == "JPEG":
+            img.draft("RGB", (size, size))
+        img = img.convert("RGB")
+        if img.size != (size, size):
+            # те саме, що transforms.Resize((224, 224)) для PIL: bilinear з антиаліасингом
+            img = img.resize((size, size), Image.BILINEAR)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    if out is None:
+        return np.asarray(img, dtype=np.uint8)
+    out[...] = np.asarray(img, dtype=np.uint8)
+    return out
+
+
+class BatchPreprocessor:
+    """
+    Turns a list of [H, W, 3] uint8 images into a normalized [N, 3, H, W] float tensor with
+    one set of batched tensor ops. The uint8 staging buffer and the float output are
+    preallocated per thread and reused across requests; they only grow when a larger
+    batch arrives.
+
+    The returned tensor is a view into the thread's buffer and is only valid until the
+    same thread calls `__call__` again.
+    """
+
+    def __init__(self, size=IMAGE_SIZE, mean=MEAN, std=STD, channels_last=False):
+        self.size = size
+        self.channels_last = channels_last
+        # (x / 255 - mean) / std  ==  x * scale - shift
+        std_t = torch.tensor(std, dtype=torch.float32).view(1, 3, 1, 1)
+        mean_t = torch.tensor(mean, dtype=torch.float32).view(1, 3, 1, 1)
+        self.scale = 1.0 / (255.0 * std_t)
+        self.shift = mean_t / std_t
+        self._local = threading.local()
+
+    def _buffers(self, n):
+        loc = self._local
+        cap = getattr(loc, "capacity", 0)
+        if cap < n:
+            cap = max(n, 2 * cap)
+            loc.staging = torch.empty((cap, self.size, self.size, 3), dtype=torch.uint8)
+            fmt = torch.channels_last if self.channels_last else torch.contiguous_format
+            loc.output = torch.empty((cap, 3, self.size, self.size), dtype=torch.float32,
+                                     memory_format=fmt)
+            loc.capacity = cap
+        return loc.staging, loc.output
+
+    def staging(self, n):
+        """Uint8 [n, size, size, 3] buffer of this thread, for decoding directly into it."""
+        return self._buffers(n)[0][:n]
+
+    def __call__(self, images, staged=False):
+        """
+        images: list of [size, size, 3] uint8 arrays, or the count of images already decoded
+        into `staging(n)` when staged=True.
+        """
+        n = images if staged else len(images)
+        staging, output = self._buffers(n)
+        u8 = staging[:n]
+        if not staged:
+            np_view = u8.numpy()
+            for i, arr in enumerate(images):
+                np_view[i] = arr
+
+        out = output[:n]
+        # NHWC uint8 -> NCHW float: одна копія з конвертацією типу, далі in-place нормалізація
+        out.copy_(u8.permute(0, 3, 1, 2))
+        out.mul_(self.scale).sub_(self.shift)
+        return out
+
+
+def check_parity(image_bytes_list, reference_transform, atol=PARITY_ATOL):
+    """
+    Compare BatchPreprocessor output against the reference torchvision transform.
+    Returns (max_abs_diff, ok).
+    """
+    pre = BatchPreprocessor()
+    arrays = [decode_to_uint8(b) for b in image_bytes_list]
+    batch = pre(arrays)
+    ref = torch.stack([reference_transform(Image.open(io.BytesIO(b)).convert("RGB"))
+                       for b in image_bytes_list])
+    diff = (batch - ref).abs().max().item()
+    return diff, diff <= atol
@@ -0,0 +1,274 @@
+"""
+On-demand inference profiling (POST /admin/profile).
+
+A session profiles the next N prediction requests or T seconds, whichever ends first, and
+writes one Chrome trace (chrome://tracing, https://ui.perfetto.dev) to PROFILE_DIR with:
+    - torch.profiler operator events (aten::conv2d, ...)
+    - record_function ranges per stage: request, decode, preprocess, forward
+    - "stageTimings": Python-level timings per stage (count, mean, p50/p95/p99, max in ms)
+    - "topOperators": operators with the largest self CPU time
+
+torch.profiler records CPU operators only on the thread that started it, so while a session
+runs the sampled requests are executed on the session's own thread, one at a time, without
+the micro-batcher and the prediction cache (their queue wait is reported as "queue_wait").
+Under gunicorn a session covers the worker that received POST /admin/profile; traces are
+files on disk, so any worker can serve the download.
+
+Without a session the request path checks one module global, and stage() returns a shared
+no-op context manager.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import nullcontext
+import numpy as np
+from torch.profiler import profile, record_function, ProfilerActivity
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/logs/profiles")
+PROFILE_MAX_REQUESTS = int(os.getenv("PROFILE_MAX_REQUESTS", "1000"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+# Скільки останніх трас зберігати на диску
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+# Поточна сесія цього процесу (None — профілювання вимкнене)
+active = None
+_last = None
+_start_lock = threading.Lock()
+_local = threading.local()
+_NOOP = nullcontext()
+
+
+class ProfilingBusy(Exception):
+    pass
+
+
+class _Stage:
+    __slots__ = ("session", "name", "rf", "started")
+
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+
+    def __enter__(self):
+        self.rf = record_function(self.name)
+        self.rf.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.session.timings[self.name].append(time.perf_counter() - self.started)
+        self.rf.__exit__(*exc)
+        return False
+
+
+def stage(name):
+    """Time one inference stage of a profiled request; a no-op outside profiling sessions."""
+    if active is None:
+        return _NOOP
+    session = getattr(_local, "session", None)
+    if session is None:
+        return _NOOP
+    return _Stage(session, name)
+
+
+def _percentiles_ms(values):
+    a = np.asarray(values) * 1000.0
+    return {"count": len(a), "mean_ms": round(float(a.mean()), 3),
+            "p50_ms": round(float(np.percentile(a, 50)), 3),
+            "p95_ms": round(float(np.percentile(a, 95)), 3),
+            "p99_ms": round(float(np.percentile(a, 99)), 3),
+            "max_ms": round(float(a.max()), 3)}
+
+
+class ProfileSession:
+    """One profiling window; see the module docstring. Use start() to create it."""
+
+    def __init__(self, max_requests, seconds, record_shapes=False):
+        self.id = time.strftime("%Y%m%d_%H%M%S") + f"_{os.getpid()}"
+        self.max_requests = max_requests
+        self.seconds = seconds
+        self.record_shapes = record_shapes
+        self.started_at = time.time()
+        self.finished_at = None
+        self.requests = 0
+        self.errors = 0
+        self.status = "running"
+        self.error = None
+        self.timings = defaultdict(list)
+        self.top_operators = []
+        self.path = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+
+    def run(self, fn):
+        """Run fn() for one request on the profiler thread and return its result (or raise)."""
+        fut = Future()
+        with self._lock:
+            if self._closed:
+                return fn()
+            self._queue.put((fn, fut, time.perf_counter()))
+        return fut.result()
+
+    def stop(self):
+        self._stop.set()
+
+    def _serve(self, deadline):
+        while self.requests < self.max_requests and not self._stop.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            try:
+                fn, fut, enqueued = self._queue.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                continue
+            self.timings["queue_wait"].append(time.perf_counter() - enqueued)
+            try:
+                with _Stage(self, "request"):
+                    result = fn()
+                fut.set_result(result)
+            except Exception as e:
+                self.errors += 1
+                fut.set_exception(e)
+            self.requests += 1
+
+    def _loop(self):
+        global active
+        _local.session = self
+        prof = profile(activities=[ProfilerActivity.CPU], record_shapes=self.record_shapes)
+        running = False
+        try:
+            prof.start()
+            running = True
+            self._serve(self.started_at + self.seconds)
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            if active is self:
+                active = None
+            with self._lock:
+                self._closed = True
+            if running:
+                prof.stop()
+            _local.session = None
+            # запити, що встигли стати в чергу після завершення вікна, виконуються без профайлера
+            while not self._queue.empty():
+                fn, fut, _ = self._queue.get_nowait()
+                try:
+                    fut.set_result(fn())
+                except Exception as e:
+                    fut.set_exception(e)
+        if running:
+            try:
+                self._export(prof)
+                if self.status == "running":
+                    self.status = "done"
+            except Exception as e:
+                self.status = "failed"
+                self.error = str(e)
+        self.finished_at = time.time()
+
+    def _export(self, prof):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        tmp = os.path.join(PROFILE_DIR, f".profile_{self.id}.tmp")
+        prof.export_chrome_trace(tmp)
+        with open(tmp, "r") as f:
+            trace = json.load(f)
+        ops = sorted(prof.key_averages(), key=lambda e: e.self_cpu_time_total, reverse=True)
+        self.top_operators = [{"name": e.key, "calls": e.count,
+                               "self_cpu_ms": round(e.self_cpu_time_total / 1000.0, 3),
+                               "cpu_total_ms": round(e.cpu_time_total / 1000.0, 3)}
+                              for e in ops[:15]]
+        trace["stageTimings"] = self.stage_summary()
+        trace["topOperators"] = self.top_operators
+        trace["profileSession"] = {k: v for k, v in self.info().items() if k not in ("stages", "top_operators")}
+        path = os.path.join(PROFILE_DIR, f"profile_{self.id}.json")
+        with open(tmp, "w") as f:
+            json.dump(trace, f)
+        os.replace(tmp, path)
+        self.path = path
+        _apply_retention()
+
+    def stage_summary(self):
+        return {name: _percentiles_ms(values) for name, values in list(self.timings.items()) if values}
+
+    def info(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "pid": os.getpid(),
+            "requests": self.requests,
+            "max_requests": self.max_requests,
+            "seconds": self.seconds,
+            "errors": self.errors,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "stages": self.stage_summary(),
+            "top_operators": self.top_operators,
+            "trace": f"/admin/profile/{self.id}/trace" if self.path else None,
+        }
+
+
+def start(max_requests=50, seconds=30.0, record_shapes=False):
+    """Start a session in this process; raises ProfilingBusy if one is already running."""
+    global active, _last
+    with _start_lock:
+        if active is not None:
+            raise ProfilingBusy(f"Profiling session {active.id} is already running")
+        session = ProfileSession(max(1, min(int(max_requests), PROFILE_MAX_REQUESTS)),
+                                 max(0.1, min(float(seconds), PROFILE_MAX_SECONDS)), record_shapes)
+        active = _last = session
+        session._thread.start()
+    return session
+
+
+def stop():
+    """End the running session early (its trace is still written). Returns it, or None."""
+    session = active
+    if session is not None:
+        session.stop()
+    return session
+
+
+def status():
+    return {"active": active.info() if active is not None else None,
+            "last": _last.info() if _last is not None else None,
+            "traces": list_traces()}
+
+
+def list_traces():
+    try:
+        names = [f for f in os.listdir(PROFILE_DIR) if f.startswith("profile_") and f.endswith(".json")]
+    except FileNotFoundError:
+        return []
+    traces = []
+    for f in sorted(names, reverse=True):
+        trace_id = f[len("profile_"):-len(".json")]
+        traces.append({"id": trace_id, "trace": f"/admin/profile/{trace_id}/trace",
+                       "size_bytes": os.path.getsize(os.path.join(PROFILE_DIR, f))})
+    return traces
+
+
+def trace_path(trace_id):
+    """Path of a stored trace, or None (ids are validated: no path components)."""
+    if not trace_id or os.path.basename(trace_id) != trace_id or trace_id.startswith("."):
+        return None
+    path = os.path.join(PROFILE_DIR, f"profile_{trace_id}.json")
+    return path if os.path.exists(path) else None
+
+
+def _apply_retention():
+    traces = list_traces()
+    for t in traces[PROFILE_KEEP:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, f"profile_{t['id']}.json"))
+        except OSError:
+            pass
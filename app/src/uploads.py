@@ -0,0 +1,129 @@
+import io
+import os
+import tarfile
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1024"))
+ARCHIVE_MAX_MEMBER_BYTES = int(os.getenv("ARCHIVE_MAX_MEMBER_BYTES", str(20 * 1024 * 1024)))
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class UploadError(Exception):
+    pass
+
+
+_read_buffers = threading.local()
+
+
+def _backing_file(stream):
+    # werkzeug кладе multipart-файли в SpooledTemporaryFile: до max_size дані лежать у BytesIO
+    # (_file), після — у тимчасовому файлі. fileno() чи readinto() на самому SpooledTemporaryFile
+    # переносять дані на диск (або відсутні в Python 3.10), тож працюємо з _file напряму.
+    if isinstance(stream, tempfile.SpooledTemporaryFile):
+        return stream._file
+    return stream
+
+
+@contextmanager
+def read_upload(storage):
+    """
+    Single read of an uploaded file, yields a memoryview valid only inside the `with` block.
+    Uploads werkzeug keeps in memory (BytesIO, or a SpooledTemporaryFile that has not rolled
+    over) are exposed zero-copy; uploads already on disk are read once into a per-thread
+    bytearray that is reused across requests.
+    """
+    f = _backing_file(storage.stream)
+    if isinstance(f, io.BytesIO):
+        view = f.getbuffer()
+    elif not hasattr(f, "readinto"):
+        f.seek(0)
+        view = memoryview(f.read())
+    else:
+        size = f.seek(0, io.SEEK_END)
+        f.seek(0)
+        buf = getattr(_read_buffers, "buf", None)
+        if buf is None or len(buf) < size:
+            buf = bytearray(max(size, 64 * 1024))
+            _read_buffers.buf = buf
+        view = memoryview(buf)
+        n = 0
+        while n < size:
+            got = f.readinto(view[n:size])
+            if not got:
+                break
+            n += got
+        view.release()
+        view = memoryview(buf)[:n]
+    try:
+        yield view
+    finally:
+        # BytesIO не можна закрити, поки на його буфер є експортований memoryview
+        view.release()
+
+
+def is_archive_name(filename):
+    return (filename or "").lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def iter_archive(filename, data):
+    """
+    Yields (member_name, bytes) for every regular file in a zip/tar archive, in archive order.
+    Members larger than ARCHIVE_MAX_MEMBER_BYTES are yielded with bytes=None.
+    """
+    buf = io.BytesIO(data)
+    if zipfile.is_zipfile(buf):
+        buf.seek(0)
+        with zipfile.ZipFile(buf) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                if info.file_size > ARCHIVE_MAX_MEMBER_BYTES:
+                    yield info.filename, None
+                    continue
+                yield info.filename, zf.read(info)
+        return
+
+    buf.seek(0)
+    try:
+        tf = tarfile.open(fileobj=buf, mode="r:*")
+    except tarfile.TarError:
+        raise UploadError(f"Unsupported or corrupted archive: {filename}")
+    with tf:
+        for member in tf:
+            if not member.isfile():
+                continue
+            if member.size > ARCHIVE_MAX_MEMBER_BYTES:
+                yield member.name, None
+                continue
+            f = tf.extractfile(member)
+            yield member.name, (f.read() if f is not None else None)
+
+
+def collect_batch_files(files):
+    """
+    Turns the multipart files of a /predict/batch request into an ordered list of (name, bytes).
+    Accepts any number of image parts plus zip/tar archives, which are expanded in place.
+    Raises UploadError if nothing was sent or the batch is larger than BATCH_MAX_ITEMS.
+    """
+    items = []
+    for field in ("files", "file", "archive"):
+        for storage in files.getlist(field):
+            if not storage or storage.filename == "":
+                continue
+            data = storage.read()
+            if field == "archive" or is_archive_name(storage.filename):
+                members = iter_archive(storage.filename, data)
+            else:
+                members = [(storage.filename, data)]
+            for item in members:
+                if len(items) >= BATCH_MAX_ITEMS:
+                    raise UploadError(f"Too many images in one batch (max {BATCH_MAX_ITEMS})")
+                items.append(item)
+
+    if not items:
+        raise UploadError("No input provide")
+    return items
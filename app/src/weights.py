@@ -0,0 +1,81 @@
+"""
+Memory-mapped model weights in the safetensors layout.
+
+    [8 bytes: header length N, little-endian u64][N bytes: JSON header][raw tensor data]
+
+The header maps every tensor name to {"dtype", "shape", "data_offsets": [begin, end]}
+(offsets relative to the start of the data block), as in the safetensors spec, so the files
+can also be read with the `safetensors` package. The trainer writes <hash>.safetensors next to
+each registry object <hash>.pth.
+
+load_weights() does not read the tensors: it maps the file privately (copy-on-write) and
+returns tensors that point straight into the mapping. Every process serving the same file
+shares its page-cache pages, and only the pages actually touched are read from disk.
+"""
+import json
+import mmap
+import os
+import struct
+import torch
+
+SUFFIX = ".safetensors"
+
+_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+_NAMES = {dtype: name for name, dtype in _DTYPES.items()}
+
+
+def weights_path(path):
+    """Sidecar of a .pth file: the same path with the .safetensors suffix."""
+    stem = path[:-4] if path.endswith(".pth") else path
+    return stem + SUFFIX
+
+
+def save_weights(state_dict, path):
+    """Write a state dict of CPU/GPU tensors atomically (tmp + rename)."""
+    # більші елементи першими: кожен тензор лишається вирівняним за розміром свого елемента
+    items = sorted(((k, t.detach().cpu().contiguous()) for k, t in state_dict.items()),
+                   key=lambda kv: -kv[1].element_size())
+    header, offset = {}, 0
+    for name, t in items:
+        nbytes = t.numel() * t.element_size()
+        header[name] = {"dtype": _NAMES[t.dtype], "shape": list(t.shape),
+                        "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+    raw = json.dumps(header, separators=(",", ":")).encode()
+    raw += b" " * (-len(raw) % 8)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<Q", len(raw)))
+        f.write(raw)
+        for _, t in items:
+            if t.numel():
+                f.write(t.reshape(-1).view(torch.uint8).numpy().data)
+    os.replace(tmp, path)
+
+
+def load_weights(path):
+    """State dict of CPU tensors backed by a private memory map of `path` (no copy)."""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    (n,) = struct.unpack("<Q", mm[:8])
+    header = json.loads(mm[8:8 + n])
+    base = 8 + n
+    state_dict = {}
+    for name, meta in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _DTYPES[meta["dtype"]]
+        begin, end = meta["data_offsets"]
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        if count == 0:
+            state_dict[name] = torch.empty(meta["shape"], dtype=dtype)
+            continue
+        # frombuffer тримає посилання на mmap, тож мапінг живе, поки живуть тензори
+        t = torch.frombuffer(mm, dtype=dtype, count=count, offset=base + begin)
+        state_dict[name] = t.view(meta["shape"])
+    return state_dict
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# тести запускаються з app/ або з кореня репозиторію; модулі імпортуються як src.*
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,44 @@
+import io
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("torch")
+
+from src import api  # noqa: E402
+from src.batching import MicroBatcher  # noqa: E402
+
+
+@pytest.fixture
+def full_batcher():
+    gate = threading.Event()
+    entered = threading.Event()
+
+    def blocked(items):
+        entered.set()
+        gate.wait(5)
+        return items
+
+    batcher = MicroBatcher(blocked, max_batch_size=1, max_wait_ms=0, max_queue=1)
+    busy = batcher.submit_async(b"busy")
+    assert entered.wait(5)
+    queued = batcher.submit_async(b"queued")
+    yield batcher
+    gate.set()
+    busy.result(timeout=5)
+    queued.result(timeout=5)
+
+
+def test_predict_returns_503_when_batcher_queue_is_full(monkeypatch, full_batcher):
+    monkeypatch.setattr(api, "get_batcher", lambda version: full_batcher)
+    # без ваг моделі: "передбачення" — це лише постановка в чергу батчера
+    monkeypatch.setattr(api, "predict_image_bytes",
+                        lambda image_bytes, batcher=None, **kwargs: batcher.submit(bytes(image_bytes)))
+
+    client = api.app.test_client()
+    response = client.post("/predict", data={"file": (io.BytesIO(b"img"), "a.png")},
+                           content_type="multipart/form-data")
+
+    assert response.status_code == 503
+    assert response.get_json() == {"error": "Server busy, try again later"}
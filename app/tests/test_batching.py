@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from src.batching import MicroBatcher, QueueFullError
+
+
+class Recorder:
+    """Stub forward pass: returns (item, batch_no) per item and remembers the batches it saw."""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+        self.entered = threading.Event()
+
+    def __call__(self, items):
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(items))
+        n = len(self.batches)
+        return [(item, n) for item in items]
+
+
+def submit_all(batcher, items):
+    futures = [batcher.submit_async(item) for item in items]
+    return [f.result(timeout=5) for f in futures]
+
+
+def test_concurrent_items_are_coalesced_into_one_batch():
+    run = Recorder()
+    batcher = MicroBatcher(run, max_batch_size=8, max_wait_ms=200)
+    results = submit_all(batcher, list(range(8)))
+
+    # 8 = max_batch_size: батч відправляється одразу, не чекаючи max_wait
+    assert run.batches == [list(range(8))]
+    assert [item for item, _ in results] == list(range(8))
+    assert batcher.stats()["batch_size_histogram"] == {"8": 1}
+
+
+def test_batch_is_split_at_max_batch_size():
+    gate = threading.Event()
+    run = Recorder(gate)
+    batcher = MicroBatcher(run, max_batch_size=4, max_wait_ms=50)
+    first = batcher.submit_async("warmup")
+    assert run.entered.wait(5)
+    # поки перший батч заблокований, у черзі накопичується 10 елементів
+    futures = [batcher.submit_async(i) for i in range(10)]
+    gate.set()
+    first.result(timeout=5)
+    results = [f.result(timeout=5) for f in futures]
+
+    assert [item for item, _ in results] == list(range(10))
+    assert [len(b) for b in run.batches] == [1, 4, 4, 2]
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    run = Recorder()
+    batcher = MicroBatcher(run, max_batch_size=32, max_wait_ms=30)
+    started = time.perf_counter()
+    results = submit_all(batcher, ["a", "b", "c"])
+    elapsed = time.perf_counter() - started
+
+    assert run.batches == [["a", "b", "c"]]
+    assert [item for item, _ in results] == ["a", "b", "c"]
+    assert 0.02 <= elapsed < 2.0
+
+
+def test_each_caller_gets_its_own_result():
+    batcher = MicroBatcher(lambda items: [x * 10 for x in items], max_batch_size=16, max_wait_ms=20)
+    results = {}
+    barrier = threading.Barrier(24)
+
+    def client(i):
+        barrier.wait()
+        results[i] = batcher.submit(i, timeout=5)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(24)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert results == {i: i * 10 for i in range(24)}
+    assert batcher.stats()["requests"] == 24
+    assert batcher.stats()["batches"] < 24
+
+
+def test_full_queue_rejects_new_items():
+    gate = threading.Event()
+    run = Recorder(gate)
+    batcher = MicroBatcher(run, max_batch_size=1, max_wait_ms=0, max_queue=2)
+    busy = batcher.submit_async("busy")
+    assert run.entered.wait(5)
+    queued = [batcher.submit_async(i) for i in range(2)]
+
+    with pytest.raises(QueueFullError):
+        batcher.submit_async("overflow")
+    assert batcher.stats()["rejected"] == 1
+
+    gate.set()
+    assert busy.result(timeout=5)[0] == "busy"
+    assert [f.result(timeout=5)[0] for f in queued] == [0, 1]
+
+
+def test_batch_error_is_raised_in_every_caller():
+    def fail(items):
+        raise RuntimeError("forward failed")
+
+    batcher = MicroBatcher(fail, max_batch_size=4, max_wait_ms=20)
+    futures = [batcher.submit_async(i) for i in range(3)]
+    for f in futures:
+        with pytest.raises(RuntimeError, match="forward failed"):
+            f.result(timeout=5)
+    assert batcher.stats()["errors"] >= 1
+
+
+def test_wrong_result_count_fails_the_batch():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=2, max_wait_ms=50)
+    futures = [batcher.submit_async(i) for i in range(2)]
+    for f in futures:
+        with pytest.raises(RuntimeError, match="1 results for 2 items"):
+            f.result(timeout=5)
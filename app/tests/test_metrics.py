@@ -0,0 +1,28 @@
+from src import metrics
+
+
+def worker_file(directory, pid, values):
+    metrics._write_file(str(directory / f"{pid}.db"), values)
+
+
+def reloads(text):
+    return [line for line in text.splitlines() if line.startswith("ai_api_model_reloads_total")]
+
+
+def test_exited_workers_are_folded_into_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    key = 'ai_api_model_reloads_total\x00result="ok"'
+    worker_file(tmp_path, 101, {key: 2.0})
+    worker_file(tmp_path, 102, {key: 3.0, 'ai_api_model_reloads_total\x00result="error"': 1.0})
+    worker_file(tmp_path, 103, {key: 5.0})
+    before = metrics.render()
+
+    metrics.archive(101)
+    metrics.archive(102)
+    metrics.archive(999)  # файлу немає — нічого не змінюється
+
+    assert sorted(p.name for p in tmp_path.glob("*.db")) == ["103.db", metrics.ARCHIVE_NAME]
+    # лічильники не зменшуються після злиття
+    assert metrics.render() == before
+    assert reloads(before) == ['ai_api_model_reloads_total{result="error"} 1',
+                               'ai_api_model_reloads_total{result="ok"} 10']
@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+transforms = pytest.importorskip("torchvision.transforms")
+from PIL import Image  # noqa: E402
+
+from src.preprocess import BatchPreprocessor, check_parity, decode_to_uint8, PARITY_ATOL  # noqa: E402
+
+# те саме еталонне перетворення, що й src.model.transform (без завантаження моделі)
+REFERENCE = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize((0.4914, 0.4822, 0.4465),
+                         (0.2023, 0.1994, 0.2010))
+])
+
+
+def encode(size, mode="RGB", fmt="PNG", seed=0):
+    rng = np.random.default_rng(seed)
+    channels = {"RGB": 3, "RGBA": 4, "L": 1}[mode]
+    pixels = rng.integers(0, 256, size=(size[1], size[0], channels), dtype=np.uint8)
+    img = Image.fromarray(pixels.squeeze(-1) if channels == 1 else pixels, mode)
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+FIXED_IMAGES = [
+    encode((224, 224), seed=1),               # без ресайзу
+    encode((32, 32), seed=2),                 # CIFAR-розмір, збільшення
+    encode((640, 480), fmt="JPEG", seed=3),   # зменшення, JPEG
+    encode((97, 311), mode="RGBA", seed=4),   # неквадратне, альфа-канал
+    encode((300, 200), mode="L", seed=5),     # відтінки сірого
+]
+
+
+def test_batch_preprocessor_matches_reference_transform():
+    diff, ok = check_parity(FIXED_IMAGES, REFERENCE)
+    assert ok, f"max abs diff {diff}"
+
+
+def test_parity_holds_when_buffers_are_reused():
+    pre = BatchPreprocessor()
+    arrays = [decode_to_uint8(b) for b in FIXED_IMAGES]
+    pre(arrays[::-1])  # більший батч виділяє буфери, наступний їх перевикористовує
+    out = pre(arrays[:2]).clone()
+    ref = REFERENCE(Image.open(io.BytesIO(FIXED_IMAGES[1])).convert("RGB"))
+    assert (out[1] - ref).abs().max().item() <= PARITY_ATOL
+
+
+def test_invalid_bytes_are_not_decoded():
+    assert decode_to_uint8(b"not an image") is None
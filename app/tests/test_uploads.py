@@ -0,0 +1,52 @@
+import io
+import os
+import tempfile
+
+import pytest
+
+flask = pytest.importorskip("flask")
+
+from src.uploads import read_upload  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    app = flask.Flask(__name__)
+
+    @app.route("/upload", methods=["POST"])
+    def upload():
+        storage = flask.request.files["file"]
+        stream = storage.stream
+        with read_upload(storage) as data:
+            body = {"size": len(data), "head": bytes(data[:16]).hex(), "tail": bytes(data[-16:]).hex()}
+        body["spooled"] = isinstance(stream, tempfile.SpooledTemporaryFile)
+        body["rolled"] = bool(getattr(stream, "_rolled", False))
+        return body
+
+    return app.test_client()
+
+
+def post(client, payload):
+    return client.post("/upload", data={"file": (io.BytesIO(payload), "img.jpg")},
+                       content_type="multipart/form-data").get_json()
+
+
+def test_small_multipart_upload_is_read_without_rolling_to_disk(client):
+    payload = os.urandom(200 * 1024)
+    body = post(client, payload)
+
+    assert body["spooled"]
+    # без fileno(): файл лишається в пам'яті, читається через getbuffer() без копіювання
+    assert not body["rolled"]
+    assert body["size"] == len(payload)
+    assert body["head"] == payload[:16].hex() and body["tail"] == payload[-16:].hex()
+
+
+def test_large_multipart_upload_is_read_from_the_temp_file(client):
+    for size in (900 * 1024, 600 * 1024):  # другий запит перевикористовує буфер потоку
+        payload = os.urandom(size)
+        body = post(client, payload)
+
+        assert body["rolled"]
+        assert body["size"] == len(payload)
+        assert body["head"] == payload[:16].hex() and body["tail"] == payload[-16:].hex()
@@ -0,0 +1,88 @@
+"""
+Compare two benchmark result files (from run_suite.py, or a single benchmark's JSON) and flag
+regressions. Metrics are matched by their path, e.g. inference_micro.results.8.forward_ms:
+
+    *rps, *per_sec           higher is better (offered_rps is an input and is skipped)
+    other *_ms, *_sec        lower is better
+    anything else            reported only in the "ignored" count
+
+A metric regresses when it is worse than the baseline by more than --threshold (relative).
+Exit code 1 if any metric regressed, so the script can gate CI.
+
+    python benchmarks/compare.py results.json benchmarks/baseline.json --threshold 0.15
+"""
+import argparse
+import json
+import sys
+
+
+def flatten(data, prefix=""):
+    out = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            out.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[path] = float(value)
+    return out
+
+
+def direction(path):
+    """-1: lower is better, 1: higher is better, 0: not compared."""
+    name = path.rsplit(".", 1)[-1]
+    if name == "offered_rps":
+        return 0
+    if name.endswith("rps") or name.endswith("per_sec"):
+        return 1
+    if name.endswith("_ms") or name.endswith("_sec"):
+        return -1
+    return 0
+
+
+def compare(current, baseline, threshold=0.1):
+    cur, base = flatten(current.get("benchmarks", current)), flatten(baseline.get("benchmarks", baseline))
+    rows, ignored = [], 0
+    for path in sorted(set(cur) & set(base)):
+        sign = direction(path)
+        if sign == 0:
+            ignored += 1
+            continue
+        old, new = base[path], cur[path]
+        change = (new - old) / old if old else 0.0
+        # >0 — покращення, <0 — погіршення, незалежно від напрямку метрики
+        gain = change * sign
+        status = "regressed" if gain < -threshold else "improved" if gain > threshold else "ok"
+        rows.append({"metric": path, "baseline": old, "current": new,
+                     "change_pct": round(100 * change, 1), "status": status})
+    return {
+        "threshold_pct": round(100 * threshold, 1),
+        "compared": len(rows),
+        "ignored": ignored,
+        "missing": sorted(p for p in set(base) - set(cur) if direction(p)),
+        "regressed": [r for r in rows if r["status"] == "regressed"],
+        "improved": [r for r in rows if r["status"] == "improved"],
+        "metrics": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("current")
+    parser.add_argument("baseline")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.current) as f:
+        current = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    report = compare(current, baseline, args.threshold)
+    print(json.dumps(report, indent=4))
+    for r in report["regressed"]:
+        print(f"REGRESSION {r['metric']}: {r['baseline']:g} -> {r['current']:g} ({r['change_pct']:+.1f}%)",
+              file=sys.stderr)
+    return 1 if report["regressed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Micro-benchmarks of the ai_api inference stages per batch size, in one process without HTTP:
+
+    decode      decode_to_uint8 of N JPEGs (256x256) straight into the preprocessor's staging buffer
+    preprocess  BatchPreprocessor: uint8 NHWC -> normalized float NCHW
+    forward     the served model (ResNet-18, random weights) + softmax/argmax, as in _forward()
+
+Each value is the median wall time of one call for the whole batch, repeated for at least
+--min-time seconds (and --min-iters calls) after one warm-up call.
+
+    python benchmarks/inference_micro.py --batch-sizes 1,2,4,8,16,32,64,128,256 --min-time 1
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+sys.path.insert(0, APP_DIR)
+
+from serving_throughput import sample_image
+
+
+def measure(fn, min_time, min_iters):
+    fn()
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < min_iters or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return round(statistics.median(times) * 1000, 3), len(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32,64,128,256")
+    parser.add_argument("--min-time", type=float, default=1.0)
+    parser.add_argument("--min-iters", type=int, default=3)
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0: default)")
+    args = parser.parse_args()
+
+    import torch
+    from src.model import _build_model
+    from src.preprocess import BatchPreprocessor, decode_to_uint8
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    model = _build_model().cpu().eval()
+    if args.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    preprocessor = BatchPreprocessor(channels_last=args.channels_last)
+    image = sample_image()
+
+    results = {}
+    for n in (int(b) for b in args.batch_sizes.split(",")):
+        staging = preprocessor.staging(n).numpy()
+
+        def decode():
+            for i in range(n):
+                decode_to_uint8(image, out=staging[i])
+
+        def preprocess():
+            return preprocessor(n, staged=True)
+
+        x = preprocess().clone()
+
+        def forward():
+            with torch.no_grad():
+                probs = torch.nn.functional.softmax(model(x), dim=1)
+                torch.max(probs, 1)[1].tolist()
+
+        decode()
+        row = {}
+        for name, fn in (("decode", decode), ("preprocess", preprocess), ("forward", forward)):
+            row[f"{name}_ms"], row[f"{name}_iters"] = measure(fn, args.min_time, args.min_iters)
+        total = row["decode_ms"] + row["preprocess_ms"] + row["forward_ms"]
+        row["total_ms"] = round(total, 3)
+        row["img_per_sec"] = round(n * 1000 / total, 2)
+        results[str(n)] = row
+        print(json.dumps({"batch_size": n, **row}), file=sys.stderr)
+
+    print(json.dumps({"benchmark": "inference_micro", "channels_last": args.channels_last,
+                      "torch_threads": torch.get_num_threads(), "results": results}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
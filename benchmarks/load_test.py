@@ -0,0 +1,136 @@
+"""
+HTTP load generator for ai_api /predict (multipart JPEG upload, 256x256).
+
+    closed  N clients, each sends its next request as soon as the previous one returns;
+            measures the throughput the server sustains at that concurrency
+    open    requests arrive at a fixed mean rate (Poisson arrivals), independent of how fast
+            the server answers. Latency is counted from the scheduled send time, so time spent
+            waiting for a free client connection is included (no coordinated omission)
+
+Without --url it starts gunicorn (gunicorn.conf.py) on a random-weight model in a temp dir,
+as benchmarks/serving_throughput.py does. Prints JSON with RPS and p50/p95/p99 per run.
+
+    python benchmarks/load_test.py --closed 1,8,32 --open 5,10 --duration 20
+    python benchmarks/load_test.py --url http://localhost:8000/predict --open 20 --duration 60
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from serving_throughput import drive, free_port, make_model, sample_image, start_server
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+
+    def pct(q):
+        return round(1000 * latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 2),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def open_loop(url, image, rate, duration, warmup=3.0, max_inflight=256, seed=0):
+    rng = random.Random(seed)
+    local = threading.local()
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def send(scheduled):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        try:
+            ok = session.post(url, files={"file": ("img.jpg", image, "image/jpeg")}, timeout=30).ok
+        except requests.RequestException:
+            ok = False
+        # від запланованого моменту відправки: очікування вільного з'єднання теж рахується
+        elapsed = time.perf_counter() - scheduled
+        if scheduled >= measure_from:
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    pool = ThreadPoolExecutor(max_inflight)
+    at = started
+    while True:
+        at += rng.expovariate(rate)
+        if at >= stop_at:
+            break
+        delay = at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pool.submit(send, at)
+    pool.shutdown(wait=True)
+
+    res = summarize(latencies, errors[0], duration)
+    res["offered_rps"] = rate
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="existing /predict endpoint (default: start gunicorn locally)")
+    parser.add_argument("--closed", default="1,8,32", help="client counts for closed-loop runs ('' to skip)")
+    parser.add_argument("--open", default="", help="arrival rates (req/s) for open-loop runs")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--max-inflight", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    image = sample_image()
+    results = {}
+    with tempfile.TemporaryDirectory() as models_dir:
+        proc = None
+        url = args.url
+        if url is None:
+            port = free_port()
+            proc = start_server("gunicorn", port, make_model(models_dir), args.workers, args.threads)
+            url = f"http://127.0.0.1:{port}/predict"
+        try:
+            for c in (int(v) for v in args.closed.split(",") if v):
+                res = drive(url, image, c, args.duration, args.warmup)
+                res["concurrency"] = c
+                results[f"closed_c{c}"] = res
+                print(json.dumps({"run": f"closed_c{c}", **res}), file=sys.stderr)
+            for rate in (float(v) for v in args.open.split(",") if v):
+                res = open_loop(url, image, rate, args.duration, args.warmup, args.max_inflight)
+                name = f"open_r{rate:g}"
+                results[name] = res
+                print(json.dumps({"run": name, **res}), file=sys.stderr)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    print(json.dumps({"benchmark": "load_test", "url": args.url or "local gunicorn",
+                      "workers": None if args.url else args.workers,
+                      "threads": None if args.url else args.threads,
+                      "duration": args.duration, "cpu_count": os.cpu_count(),
+                      "results": results}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
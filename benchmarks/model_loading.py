@@ -0,0 +1,115 @@
+"""
+Model load time of ai_api for the two weight formats: pickled .pth (torch.load into freshly
+allocated tensors) vs memory-mapped .safetensors (src.weights, zero-copy).
+
+    cold    new process, file evicted from the page cache (posix_fadvise DONTNEED), so the
+            weights come from disk; measured for the weights alone and for the whole
+            _load_handle() (weights + warm-up + smoke test)
+    reload  the same process loading the same file again (page cache warm), as on a
+            hot reload of model_latest.pth
+
+anon_mb is the anonymous (process-private) memory added by loading the weights: the .pth copy
+is private to every process, the mapped file is page cache shared by all of them.
+
+    python benchmarks/model_loading.py --repeats 5 --reloads 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+sys.path.insert(0, APP_DIR)
+
+
+def anon_kb():
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Anonymous:"):
+                return int(line.split()[1])
+    return 0
+
+
+def evict(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def child(path, reloads):
+    # окремий процес: MODEL_WEIGHTS_MMAP читається при імпорті src.model
+    from src import model as m
+
+    before = anon_kb()
+    started = time.perf_counter()
+    net, fmt = m._load_weights_into_model(path)
+    cold_ms = (time.perf_counter() - started) * 1000
+    anon_mb = (anon_kb() - before) / 1024
+    del net
+
+    reload_ms = []
+    for _ in range(reloads):
+        started = time.perf_counter()
+        net, _ = m._load_weights_into_model(path)
+        reload_ms.append((time.perf_counter() - started) * 1000)
+        del net
+
+    started = time.perf_counter()
+    m._load_handle(path)
+    handle_ms = (time.perf_counter() - started) * 1000
+    print(json.dumps({"format": fmt, "cold_ms": cold_ms, "anon_mb": anon_mb,
+                      "reload_ms": statistics.median(reload_ms) if reload_ms else None,
+                      "handle_ms": handle_ms}))
+
+
+def run(path, mmap, reloads):
+    for f in (path, path[:-4] + ".safetensors"):
+        if os.path.exists(f):
+            evict(f)
+    env = dict(os.environ, MODEL_WEIGHTS_MMAP="1" if mmap else "0")
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", path,
+                          "--reloads", str(reloads)],
+                         cwd=APP_DIR, env=env, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--reloads", type=int, default=20)
+    parser.add_argument("--child")
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.reloads)
+
+    import torch
+    from src.model import _build_model
+    from src.weights import save_weights
+
+    with tempfile.TemporaryDirectory() as tmp:
+        torch.manual_seed(0)
+        state_dict = _build_model().cpu().state_dict()
+        # як у реєстрі тренера: objects/<hash>.pth і поруч <hash>.safetensors
+        path = os.path.join(tmp, "weights.pth")
+        torch.save(state_dict, path)
+        save_weights(state_dict, path[:-4] + ".safetensors")
+
+        report = {"file_mb": round(os.path.getsize(path) / (1024 * 1024), 1)}
+        for name, mmap in (("pth", False), ("safetensors", True)):
+            runs = [run(path, mmap, args.reloads) for _ in range(args.repeats)]
+            assert all(r["format"] == name for r in runs)
+            report[name] = {key: round(statistics.median(r[key] for r in runs), 2)
+                            for key in ("cold_ms", "reload_ms", "handle_ms", "anon_mb")}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Per-request overhead of the /predict pipeline around the model, before and after the
+single-read upload path and asynchronous, sampled logging.
+
+    before: len(file.read()) + seek(0) + read() again, f-string logs written synchronously
+            to a FileHandler and the console for every request (incl. the access log line)
+    after:  read_upload() (zero-copy / reused buffer), AsyncQueueHandler, AccessLogSampler
+
+Uploads are built with werkzeug's default_stream_factory, as the multipart parser does,
+so uploads above 500 KB go through the on-disk path.
+
+No model is involved: only upload handling and logging are timed.
+
+    python benchmarks/request_overhead.py --iterations 20000 --size-kb 200
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from werkzeug.datastructures import FileStorage  # noqa: E402
+from werkzeug.formparser import default_stream_factory  # noqa: E402
+from src.uploads import read_upload  # noqa: E402
+from src.logging_setup import AsyncQueueHandler, AccessLogSampler, LOG_FORMAT  # noqa: E402
+
+
+def upload(payload):
+    # Так само, як werkzeug при розборі multipart: потік від default_stream_factory
+    # (SpooledTemporaryFile, понад 500 KB — на диску) наповнюється через write()
+    stream = default_stream_factory(total_content_length=len(payload), content_type="image/jpeg",
+                                    filename="img.jpg", content_length=len(payload))
+    stream.write(payload)
+    stream.seek(0)
+    return FileStorage(stream, "img.jpg")
+
+
+def make_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def sync_handlers(log_path, console_stream):
+    formatter = logging.Formatter(LOG_FORMAT)
+    fh = logging.FileHandler(log_path)
+    fh.setFormatter(formatter)
+    ch = logging.StreamHandler(console_stream)
+    ch.setFormatter(formatter)
+    return fh, ch
+
+
+def bench_before(payload, iterations, log_path, console):
+    fh, ch = sync_handlers(log_path, console)
+    logger = logging.getLogger("bench.before")
+    logger.handlers[:] = [fh, ch]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        file = upload(payload)
+        logger.info(f"Incoming request: POST /predict from 127.0.0.1")
+        logger.info(f"Received file: {file.filename}, size: {len(file.read())} bytes")
+        file.seek(0)
+        img_bytes = file.read()
+        result = {"class": "cat", "confidence": 0.9, "n": len(img_bytes)}
+        logger.info(f"Prediction result: {result}")
+    elapsed = time.perf_counter() - started
+    fh.close()
+    return elapsed
+
+
+def bench_after(payload, iterations, log_path, console, sample_rate):
+    fh, ch = sync_handlers(log_path, console)
+    handler = AsyncQueueHandler([fh, ch], maxsize=1_000_000)
+    logger = make_logger("bench.after", handler)
+    sampler = AccessLogSampler(sample_rate=sample_rate)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        file = upload(payload)
+        sampled, _ = sampler.sample("/predict")
+        if sampled:
+            logger.info("Incoming request: %s %s from %s", "POST", "/predict", "127.0.0.1")
+        with read_upload(file) as img_bytes:
+            if sampled:
+                logger.info("Received file: %s, size: %d bytes", file.filename, len(img_bytes))
+            result = {"class": "cat", "confidence": 0.9, "n": len(img_bytes)}
+        if sampled:
+            logger.info("Prediction result: %s", result)
+    elapsed = time.perf_counter() - started
+    handler.stop()
+    fh.close()
+    return elapsed
+
+
+def bench_read(payload, iterations, single_read):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        file = upload(payload)
+        if single_read:
+            with read_upload(file) as img_bytes:
+                len(img_bytes)
+        else:
+            len(file.read())
+            file.seek(0)
+            len(file.read())
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--size-kb", type=int, default=200)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size_kb * 1024)
+    read_before = bench_read(payload, args.iterations, single_read=False)
+    read_after = bench_read(payload, args.iterations, single_read=True)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as console:
+        before = bench_before(payload, args.iterations, os.path.join(tmp, "before.log"), console)
+        after_full = bench_after(payload, args.iterations, os.path.join(tmp, "after_full.log"), console, 1.0)
+        after = bench_after(payload, args.iterations, os.path.join(tmp, "after.log"), console,
+                            args.sample_rate)
+
+    per_req = lambda t: round(t / args.iterations * 1e6, 2)  # noqa: E731
+    print(json.dumps({
+        "iterations": args.iterations,
+        "upload_kb": args.size_kb,
+        "read_before_us": per_req(read_before),
+        "read_after_us": per_req(read_after),
+        "before_us_per_request": per_req(before),
+        "after_unsampled_us_per_request": per_req(after_full),
+        "after_sampled_us_per_request": per_req(after),
+        "sample_rate": args.sample_rate,
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark suite: runs inference_micro.py, load_test.py and trainer_steps.py (each in its own
+process, with fixed seeds and random-weight models) and writes one JSON file with their
+results plus the environment they ran in. With --baseline the results are compared against a
+stored run (compare.py) and the exit code is 1 on a regression.
+
+    --preset quick   small batch sizes, short load runs, a small synthetic dataset (~3 min on 1 CPU)
+    --preset full    batch sizes 1-256, closed and open-loop load, a larger dataset
+
+    python benchmarks/run_suite.py --preset quick --output results.json --baseline benchmarks/baseline.json
+    python benchmarks/run_suite.py --preset full --only inference_micro,load_test
+
+Baselines are only comparable on the same machine and settings: refresh benchmarks/baseline.json
+with --output when the hardware changes.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from compare import compare
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+
+PRESETS = {
+    "quick": {
+        "inference_micro": ["--batch-sizes", "1,4,16", "--min-time", "0.5"],
+        "load_test": ["--closed", "1,4", "--open", "5", "--duration", "10", "--warmup", "2",
+                      "--workers", "1", "--threads", "4"],
+        "trainer_steps": ["--images", "320", "--batch-size", "16", "--modes", "device,cpu"],
+    },
+    "full": {
+        "inference_micro": ["--batch-sizes", "1,2,4,8,16,32,64,128,256", "--min-time", "2"],
+        "load_test": ["--closed", "1,8,32", "--open", "5,10,20", "--duration", "30"],
+        "trainer_steps": ["--images", "2048", "--batch-size", "64", "--modes", "device,cpu"],
+    },
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import torch
+    return {"commit": git_commit(), "python": platform.python_version(), "torch": torch.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "cuda": torch.cuda.is_available()}
+
+
+def run_benchmark(name, args):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.join(BENCH_DIR, f"{name}.py"), *args],
+                         cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True)
+    result = json.loads(out.stdout)
+    result["wall_time_s"] = round(time.perf_counter() - started, 1)
+    result["args"] = args
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--only", help="comma-separated benchmarks to run")
+    parser.add_argument("--output", help="write the results here (default: stdout)")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(PRESETS[args.preset])
+    results = {"preset": args.preset, "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+               "environment": environment(), "benchmarks": {}}
+    for name in names:
+        print(f"[suite] {name} ...", file=sys.stderr)
+        results["benchmarks"][name] = run_benchmark(name, PRESETS[args.preset][name])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+            f.write("\n")
+    else:
+        print(json.dumps(results, indent=4))
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("preset") != args.preset:
+        print(f"[suite] baseline preset {baseline.get('preset')!r} != {args.preset!r}", file=sys.stderr)
+    report = compare(results, baseline, args.threshold)
+    print(f"[suite] {report['compared']} metrics compared, {len(report['improved'])} improved, "
+          f"{len(report['regressed'])} regressed (threshold {report['threshold_pct']}%)", file=sys.stderr)
+    for r in report["regressed"]:
+        print(f"REGRESSION {r['metric']}: {r['baseline']:g} -> {r['current']:g} ({r['change_pct']:+.1f}%)",
+              file=sys.stderr)
+    return 1 if report["regressed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
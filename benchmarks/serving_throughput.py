@@ -0,0 +1,150 @@
+"""
+Throughput of the ai_api serving modes: Flask/Werkzeug dev server vs gunicorn (gunicorn.conf.py).
+
+Starts each server on a random-weight ResNet-18 in a temp dir, drives /predict with N
+concurrent keep-alive clients for a fixed duration and prints JSON with RPS and latency
+percentiles per mode.
+
+    python benchmarks/serving_throughput.py --concurrency 16 --duration 20
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_model(models_dir):
+    sys.path.insert(0, APP_DIR)
+    import torch
+    from src.model import _build_model
+    torch.manual_seed(0)
+    path = os.path.join(models_dir, "model_latest.pth")
+    torch.save(_build_model().cpu().state_dict(), path)
+    return path
+
+
+def sample_image():
+    from PIL import Image
+    import numpy as np
+    rng = np.random.default_rng(0)
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (256, 256, 3), dtype=np.uint8)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def start_server(mode, port, model_path, workers, threads):
+    env = dict(os.environ, MODEL_PATH=model_path, PORT=str(port),
+               GUNICORN_BIND=f"127.0.0.1:{port}", GUNICORN_WORKERS=str(workers),
+               GUNICORN_THREADS=str(threads), PREDICTION_CACHE_SIZE="0")
+    if mode == "flask":
+        cmd = [sys.executable, "-m", "src.api"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "src.api:app"]
+    proc = subprocess.Popen(cmd, cwd=APP_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not become healthy")
+
+
+def drive(url, image, concurrency, duration, warmup=3.0):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + warmup + duration
+    measure_from = time.perf_counter() + warmup
+
+    def client():
+        session = requests.Session()
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                return
+            try:
+                ok = session.post(url, files={"file": ("img.jpg", image, "image/jpeg")}, timeout=30).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if started >= measure_from:
+                with lock:
+                    if ok:
+                        latencies.append(elapsed)
+                    else:
+                        errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+
+    def pct(q):
+        return round(1000 * latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / duration, 2),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", default="flask,gunicorn")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    image = sample_image()
+    results = []
+    with tempfile.TemporaryDirectory() as models_dir:
+        model_path = make_model(models_dir)
+        for mode in args.modes.split(","):
+            port = free_port()
+            proc = start_server(mode, port, model_path, args.workers, args.threads)
+            try:
+                res = drive(f"http://127.0.0.1:{port}/predict", image, args.concurrency, args.duration)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+            res.update({"mode": mode, "concurrency": args.concurrency,
+                        "workers": args.workers if mode == "gunicorn" else 1,
+                        "threads": args.threads if mode == "gunicorn" else None,
+                        "cpu_count": os.cpu_count()})
+            results.append(res)
+            print(json.dumps(res), file=sys.stderr)
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Training speed of ai_trainer: train_one_run on synthetic data (seeded random images, random
+initial weights, no downloads) in a temporary MODELS_DIR, for each data mode.
+
+steps_per_sec and img_per_sec come from the run's own metadata (training time only, without
+validation, checkpoints and registry writes), together with the trainer's per-batch stage
+timings (load, transfer, augment, step).
+
+    python benchmarks/trainer_steps.py --images 1024 --batch-size 32 --modes device,cpu
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAINER_DIR = os.path.join(ROOT, "trainer", "src")
+
+
+def run(mode, args):
+    params = dict(epochs=1, batch_size=args.batch_size, data_mode=mode, synthetic=args.images,
+                  num_workers=args.num_workers, amp=args.amp, channels_last=args.channels_last,
+                  checkpoint_every=0, report_every=10, seed=0)
+    # тренер друкує прогрес у stdout (і при імпорті); JSON звіту йде туди ж, тож лог — у stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        import train
+        meta = train.train_one_run(**params)
+    if meta is None:
+        raise RuntimeError(f"train_one_run failed for data_mode={mode}")
+    img_per_sec = meta["throughput_img_per_sec"]
+    return {"data_mode": mode, "images": args.images, "batch_size": args.batch_size,
+            "amp": args.amp, "channels_last": args.channels_last,
+            "img_per_sec": img_per_sec,
+            "steps_per_sec": round(img_per_sec / args.batch_size, 3),
+            "stage_ms_per_batch": meta.get("stage_ms_per_batch")}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", default="device,cpu")
+    parser.add_argument("--images", type=int, default=1024, help="synthetic dataset size (90%% train)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--num-workers", type=int, default=0)
+    parser.add_argument("--amp", default="off")
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0: default)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as models_dir:
+        # до імпорту тренера: шляхи реєстру й чекпоінтів читаються при імпорті
+        os.environ["MODELS_DIR"] = models_dir
+        os.environ.setdefault("TELEMETRY_DIR", models_dir)
+        sys.path.insert(0, TRAINER_DIR)
+        import torch
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        results = [run(mode, args) for mode in args.modes.split(",")]
+    print(json.dumps({"benchmark": "trainer_steps", "torch_threads": torch.get_num_threads(),
+                      "results": {r["data_mode"]: r for r in results}}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,8 @@ def index():
             .row > .card { flex: 1; }
             button { padding: 8px 16px; cursor: pointer; }
             #prediction-result, #train-result, #status-result { white-space: pre-wrap; font-family: monospace; }
+            #live-info { font-family: monospace; margin-bottom: 8px; }
+            #live-curve { width: 100%; height: 260px; border: 1px solid #eee; }
             input[type="file"] { margin-bottom: 8px; }
         </style>
     </head>
@@ -58,6 +60,12 @@ def index():
             </div>
         </div>
 
+        <div class="card">
+            <h2>Live: тренування</h2>
+            <div id="live-info">Очікування подій...</div>
+            <canvas id="live-curve" width="860" height="260"></canvas>
+        </div>
+
         <div class="card">
             <h2>3. Статус системи</h2>
             <button id="refresh-status">Оновити статус</button>
@@ -127,6 +135,81 @@ def index():
             }
 
             refreshStatusBtn.addEventListener("click", refreshStatus);
+
+            // Live-крива loss через Server-Sent Events (/api/train/events) замість опитування
+            const liveInfo = document.getElementById("live-info");
+            const canvas = document.getElementById("live-curve");
+            const MAX_POINTS = 2000;
+            let curve = { step: [], loss: [], ema: [] };
+            let ema = null;
+
+            function resetCurve() {
+                curve = { step: [], loss: [], ema: [] };
+                ema = null;
+            }
+
+            function addPoints(p) {
+                if (!p || !p.step) return;
+                for (let i = 0; i < p.step.length; i++) {
+                    const l = p.loss[i];
+                    if (l === null || l === undefined) continue;
+                    ema = ema === null ? l : 0.9 * ema + 0.1 * l;
+                    curve.step.push(p.step[i]);
+                    curve.loss.push(l);
+                    curve.ema.push(ema);
+                }
+                if (curve.step.length > MAX_POINTS) {
+                    const drop = curve.step.length - MAX_POINTS;
+                    for (const k of ["step", "loss", "ema"]) curve[k].splice(0, drop);
+                }
+            }
+
+            function drawCurve() {
+                const ctx = canvas.getContext("2d");
+                const w = canvas.width, h = canvas.height, pad = 36;
+                ctx.clearRect(0, 0, w, h);
+                if (curve.step.length < 2) return;
+                const x0 = curve.step[0], x1 = curve.step[curve.step.length - 1];
+                const lo = Math.min(...curve.loss), hi = Math.max(...curve.loss);
+                const sx = s => pad + (s - x0) / Math.max(1, x1 - x0) * (w - 2 * pad);
+                const sy = v => h - pad - (v - lo) / Math.max(1e-9, hi - lo) * (h - 2 * pad);
+                const line = (ys, color) => {
+                    ctx.strokeStyle = color;
+                    ctx.beginPath();
+                    curve.step.forEach((s, i) => i ? ctx.lineTo(sx(s), sy(ys[i])) : ctx.moveTo(sx(s), sy(ys[i])));
+                    ctx.stroke();
+                };
+                line(curve.loss, "#ccc");
+                line(curve.ema, "#1f77b4");
+                ctx.fillStyle = "#333";
+                ctx.fillText(`loss ${hi.toFixed(3)}`, 2, pad - 6);
+                ctx.fillText(`${lo.toFixed(3)}`, 2, h - pad + 12);
+                ctx.fillText(`step ${x0}`, pad, h - 8);
+                ctx.fillText(`step ${x1}`, w - pad - 60, h - 8);
+            }
+
+            function showState(d) {
+                liveInfo.textContent = `статус: ${d.status}, епоха: ${d.epoch}, прогрес: ${d.progress}%, ` +
+                    `loss: ${d.loss}, accuracy: ${d.accuracy}` + (d.run_id ? `, run: ${d.run_id}` : "");
+            }
+
+            const events = new EventSource("/api/train/events");
+            for (const kind of ["snapshot", "run"]) {
+                events.addEventListener(kind, (e) => {
+                    const d = JSON.parse(e.data);
+                    resetCurve();
+                    addPoints(d.points);
+                    showState(d);
+                    drawCurve();
+                });
+            }
+            events.addEventListener("progress", (e) => {
+                const d = JSON.parse(e.data);
+                addPoints(d.points);
+                showState(d);
+                drawCurve();
+            });
+            events.onerror = () => { liveInfo.textContent = "З'єднання з тренером втрачено, перепідключення..."; };
         </script>
     </body>
     </html>
@@ -157,6 +240,28 @@ def api_train():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/train/events", methods=["GET"])
+def api_train_events():
+    # SSE-потік тренера пропускаємо як є, без буферизації
+    headers = {}
+    if request.headers.get("Last-Event-ID"):
+        headers["Last-Event-ID"] = request.headers["Last-Event-ID"]
+    try:
+        upstream = requests.get(f"{TRAINER_URL}/events", headers=headers, stream=True, timeout=(5, 60))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+
+    def relay():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        finally:
+            upstream.close()
+
+    return Response(relay(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route("/api/status", methods=["GET"])
 def api_status():
     result = {}
@@ -2,98 +2,146 @@
 import time
 import json
 import os
-import requests
 import psutil
 import threading
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
+from timeseries import MetricsStore, TIERS
+from probes import Prober
 
 app = Flask(__name__)
 os.makedirs("/logs", exist_ok=True)
+# Старий формат (увесь JSON-масив переписувався кожні 15 с); імпортується в сховище один раз
 METRICS_FILE = "/logs/metrics.json"
+METRICS_DIR = os.getenv("METRICS_DIR", "/logs/metrics")
+COLLECT_INTERVAL = 15
+
+# Ретеншн рівнів сховища в годинах: METRICS_RETENTION_RAW_H, _1M_H, _5M_H, _1H_H
+store = MetricsStore(METRICS_DIR, retention_hours={
+    tier: float(os.getenv(f"METRICS_RETENTION_{tier.upper()}_H", TIERS[tier][2])) for tier in TIERS
+})
 
 SERVICES = {
     "ai_api": "http://host.docker.internal:8080/health",
-    "ai_trainer": "http://host.docker.internal:8090/metrics"
+    # points=0: лише ковзні середні, без часових рядів (історія зберігається у файлі)
+    "ai_trainer": "http://host.docker.internal:8090/metrics?points=0"
 }
 
+# Опитування сервісів: кожен за своїм розкладом (PROBE_INTERVAL, 15 с, ± PROBE_JITTER частки),
+# паралельно в PROBE_WORKERS потоках з keep-alive сесіями.
+# MONITOR_SERVICES (JSON) замінює SERVICES: {"name": "url"} або {"name": {"url": ..., "interval": 5}},
+# наприклад, щоб опитувати кожну blue/green репліку окремо.
+PROBE_INTERVAL = float(os.getenv("PROBE_INTERVAL", "15"))
+PROBE_JITTER = float(os.getenv("PROBE_JITTER", "0.1"))
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "3"))
+PROBE_WORKERS = int(os.getenv("PROBE_WORKERS", "16"))
+
+
+def load_targets():
+    services = json.loads(os.getenv("MONITOR_SERVICES", "null")) or SERVICES
+    targets = {}
+    for name, spec in services.items():
+        if isinstance(spec, str):
+            spec = {"url": spec}
+        targets[name] = {"url": spec["url"], "interval": float(spec.get("interval", PROBE_INTERVAL))}
+    return targets
+
+
+prober = Prober(load_targets(), workers=PROBE_WORKERS, timeout=PROBE_TIMEOUT, jitter=PROBE_JITTER)
+
 # безпечний локер для роботи з файлами
 file_lock = threading.Lock()
 
-def get_service_status(name, url):
-    try:
-        r = requests.get(url, timeout=3)
-        if r.ok:
-            try:
-                payload = r.json()
-            except:
-                payload = None
-                
-            return {"ok": True, "status_code": r.status_code, "data": payload}
-        return {"ok": False, "status_code": r.status_code, "error": "Bad response"}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
+# Останній зібраний зразок; /metrics_json віддає його, не опитуючи сервіси
+_snapshot = None
 
 def collect_metrics():
-    """Збір системних та сервісних метрик."""
+    """Збір системних метрик плюс останні результати опитування сервісів (без мережевих запитів)."""
     metrics = {
+        "ts": time.time(),
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
         "cpu_usage": psutil.cpu_percent(),
         "ram_usage": psutil.virtual_memory().percent,
         "disk_usage": psutil.disk_usage('/').percent,
-        "services": {}
+        "services": prober.results()
     }
-
-    for name, url in SERVICES.items():
-        metrics["services"][name] = get_service_status(name, url)
-
     return metrics
 
 
 def write_metrics(new_metrics):
-    """Запис даних у файл з локером."""
+    """Дописування зразка в сховище (один рядок у поточний сегмент)."""
     with file_lock:
-        data = []
-        if os.path.exists(METRICS_FILE):
-            try:
-                with open(METRICS_FILE, "r") as f:
-                    data = json.load(f)
-            except:
-                data = []
+        store.append(new_metrics)
 
-        data.append(new_metrics)
-        data = data[-200:]  # зберігаємо останні 200 записів
 
-        with open(METRICS_FILE, "w") as f:
-            json.dump(data, f, indent=4)
+def migrate_legacy_file():
+    """Переносить записи старого metrics.json у сховище, якщо воно ще порожнє."""
+    if not os.path.exists(METRICS_FILE) or store.latest(1):
+        return
+    try:
+        with open(METRICS_FILE, "r") as f:
+            data = json.load(f)
+    except:
+        data = []
+    for m in data:
+        try:
+            m["ts"] = time.mktime(time.strptime(m["timestamp"], "%Y-%m-%d %H:%M:%S"))
+        except (KeyError, ValueError):
+            continue
+        write_metrics(m)
+    os.replace(METRICS_FILE, METRICS_FILE + ".migrated")
 
 
 def background_loop():
     """Цикл періодичного збору метрик."""
+    global _snapshot
     while True:
+        started = time.time()
         m = collect_metrics()
+        _snapshot = m
         write_metrics(m)
-        time.sleep(15)
+        time.sleep(max(0.0, COLLECT_INTERVAL - (time.time() - started)))
 
 @app.route("/dashboard", methods=["GET"])
 def dashboard():
-    """Повертає останні 20 метрик."""
-    if not os.path.exists(METRICS_FILE):
-        return jsonify([])
+    """Повертає останні 20 метрик (з пам'яті, без читання файлів)."""
+    return jsonify(store.latest(20))
+
+
+@app.route("/metrics/range", methods=["GET"])
+def metrics_range():
+    """
+    Числові метрики за проміжок часу.
+    ?start=&end= (epoch секунди) або ?last=<секунд> (3600); ?tier=auto|raw|1m|5m|1h;
+    ?fields=cpu_usage,services.ai_api.ok; ?max_points= (1000, понад це точки зливаються в інтервали)
+    """
+    now = time.time()
+    try:
+        end = float(request.args.get("end", now))
+        start = float(request.args.get("start", end - float(request.args.get("last", 3600))))
+        max_points = max(1, min(int(request.args.get("max_points", 1000)), 10000))
+    except ValueError:
+        return jsonify({"error": "start, end, last and max_points must be numbers"}), 400
+    fields = [f for f in request.args.get("fields", "").split(",") if f] or None
+    try:
+        result = store.query(start, end, tier=request.args.get("tier", "auto"),
+                             fields=fields, max_points=max_points)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
 
-    with file_lock:
-        try:
-            with open(METRICS_FILE, "r") as f:
-                data = json.load(f)
-        except:
-            return jsonify([])
 
-    return jsonify(data[-20:])
+@app.route("/metrics/store", methods=["GET"])
+def metrics_store():
+    """Розмір сховища: кількість сегментів на рівень, байти на диску, ретеншн."""
+    return jsonify(store.stats())
 
 
 @app.route("/metrics_json", methods=["GET"])
 def metrics_json():
-    """Формат для Prometheus/Grafana."""
-    m = collect_metrics()
+    """Формат для Prometheus/Grafana: останній зразок колектора."""
+    m = _snapshot
+    if m is None:
+        m = collect_metrics()
     return jsonify(m)
 
 
@@ -104,6 +152,8 @@ def health():
 
 
 if __name__ == "__main__":
+    migrate_legacy_file()
+    prober.start()
     t = threading.Thread(target=background_loop, daemon=True)
     t.start()
     app.run(host="0.0.0.0", port=8070)
@@ -0,0 +1,113 @@
+# monitor/src/probes.py
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Prober:
+    """
+    Probes HTTP targets concurrently on their own schedules and keeps the latest result of each.
+
+    targets: {name: {"url": ..., "interval": seconds}}. Every target is due again after its
+    interval +/- `jitter` (a fraction), and the first probes are spread over one interval, so
+    dozens of targets (e.g. every blue/green replica) do not fire at once. Probes run on a
+    thread pool; each worker keeps its own keep-alive requests.Session. A target whose probe
+    is still running is not probed again, so a hung service costs one worker, not the cycle.
+    """
+
+    def __init__(self, targets, workers=16, timeout=3.0, jitter=0.1):
+        self.targets = targets
+        self.timeout = timeout
+        self.jitter = jitter
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="probe")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._results = {}
+        self._inflight = set()
+        self._wake = threading.Event()
+        self._stop = False
+        now = time.time()
+        self._due = [(now + random.uniform(0, t["interval"]), name) for name, t in targets.items()]
+        heapq.heapify(self._due)
+
+    def _session(self):
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = requests.Session()
+            s.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+            s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        return s
+
+    def probe(self, url):
+        started = time.perf_counter()
+        try:
+            r = self._session().get(url, timeout=self.timeout)
+            latency = round((time.perf_counter() - started) * 1000, 1)
+            if r.ok:
+                try:
+                    payload = r.json()
+                except ValueError:
+                    payload = None
+                return {"ok": True, "status_code": r.status_code, "latency_ms": latency, "data": payload}
+            return {"ok": False, "status_code": r.status_code, "latency_ms": latency, "error": "Bad response"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def _run(self, name):
+        try:
+            result = self.probe(self.targets[name]["url"])
+        finally:
+            with self._lock:
+                self._inflight.discard(name)
+        result["checked_at"] = time.time()
+        with self._lock:
+            self._results[name] = result
+
+    def _next_due(self, name, now):
+        interval = self.targets[name]["interval"]
+        return now + interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def loop(self):
+        """Scheduler thread: submit due targets to the pool, sleep until the next one is due."""
+        while not self._stop:
+            now = time.time()
+            while self._due and self._due[0][0] <= now:
+                _, name = heapq.heappop(self._due)
+                with self._lock:
+                    busy = name in self._inflight
+                    self._inflight.add(name)
+                if not busy:
+                    try:
+                        self._pool.submit(self._run, name)
+                    except RuntimeError:
+                        return  # пул зупинено (stop() або завершення інтерпретатора)
+                heapq.heappush(self._due, (self._next_due(name, now), name))
+            delay = self._due[0][0] - time.time() if self._due else 1.0
+            self._wake.wait(max(0.0, delay))
+            self._wake.clear()
+
+    def start(self):
+        threading.Thread(target=self.loop, daemon=True, name="prober").start()
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+        self._pool.shutdown(wait=False)
+
+    def results(self):
+        """Latest result per target; "stale" when it is older than 3 intervals (or not probed yet)."""
+        now = time.time()
+        with self._lock:
+            results = dict(self._results)
+        out = {}
+        for name, target in self.targets.items():
+            r = results.get(name)
+            if r is None:
+                out[name] = {"ok": False, "error": "Not probed yet", "stale": True}
+            else:
+                out[name] = dict(r, stale=now - r["checked_at"] > 3 * target["interval"])
+        return out
@@ -0,0 +1,329 @@
+# monitor/src/timeseries.py
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Рівні зберігання: сирі зразки та агрегати за 1 хв / 5 хв / 1 год.
+# Кожен рівень — сегменти JSONL фіксованої тривалості (<tier>-<start>.jsonl); сегменти
+# старші за ретеншн видаляються цілком, тож диск обмежений часом зберігання.
+TIERS = {
+    # tier: (крок агрегації, тривалість сегмента, ретеншн за замовчуванням у годинах)
+    "raw": (None, 3600, 48),
+    "1m": (60, 86400, 24 * 7),
+    "5m": (300, 86400, 24 * 30),
+    "1h": (3600, 30 * 86400, 24 * 365),
+}
+ROLLUPS = ("1m", "5m", "1h")
+
+
+def numeric_fields(sample, prefix=""):
+    """Flatten the numeric leaves of a sample into {"services.ai_api.ok": 1, ...} (lists are skipped)."""
+    out = {}
+    for key, value in sample.items():
+        if key == "ts" and not prefix:
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, bool):
+            out[name] = int(value)
+        elif isinstance(value, (int, float)):
+            out[name] = value
+        elif isinstance(value, dict):
+            out.update(numeric_fields(value, name + "."))
+    return out
+
+
+class _Bucket:
+    """Running count/sum/min/max per field for one rollup interval."""
+
+    def __init__(self, start):
+        self.start = start
+        self.n = 0
+        self.stats = {}
+
+    def add(self, fields):
+        self.n += 1
+        for k, v in fields.items():
+            s = self.stats.get(k)
+            if s is None:
+                self.stats[k] = [1, v, v, v]
+            else:
+                s[0] += 1
+                s[1] += v
+                if v < s[2]:
+                    s[2] = v
+                if v > s[3]:
+                    s[3] = v
+
+    def merge(self, n, fields):
+        """Add an already aggregated record ({name: {"avg", "min", "max"}} over n samples)."""
+        self.n += n
+        for k, agg in fields.items():
+            s = self.stats.get(k)
+            if s is None:
+                self.stats[k] = [n, agg["avg"] * n, agg["min"], agg["max"]]
+            else:
+                s[0] += n
+                s[1] += agg["avg"] * n
+                if agg["min"] < s[2]:
+                    s[2] = agg["min"]
+                if agg["max"] > s[3]:
+                    s[3] = agg["max"]
+
+    def record(self):
+        return {"ts": self.start, "n": self.n,
+                "fields": {k: {"avg": round(s[1] / s[0], 4), "min": s[2], "max": s[3]}
+                           for k, s in self.stats.items()}}
+
+
+class _Downsampler:
+    """
+    Collects query points in order. Once there are more than `max_points`, they are merged
+    into `max_points` equal time bins over [start, end) (avg weighted by n, min/max), so
+    memory stays bounded and the whole range is still covered.
+    """
+
+    def __init__(self, start, end, max_points):
+        self.start = start
+        self.width = (end - start) / max_points
+        self.max_points = max_points
+        self.total = 0
+        self.points = []
+        self.bins = None
+        self.partial = set()
+
+    def add(self, record):
+        self.total += 1
+        if self.bins is None:
+            self.points.append(record)
+            if len(self.points) <= self.max_points:
+                return
+            self.bins = {}
+            pending, self.points = self.points, []
+        else:
+            pending = (record,)
+        for r in pending:
+            self._merge(r)
+
+    def _merge(self, record):
+        i = min(max(int((record["ts"] - self.start) / self.width), 0), self.max_points - 1)
+        bucket = self.bins.get(i)
+        if bucket is None:
+            bucket = self.bins[i] = _Bucket(round(self.start + i * self.width, 3))
+        if "n" in record:
+            bucket.merge(record["n"], record["fields"])
+        else:
+            bucket.add(record["fields"])
+        if record.get("partial"):
+            self.partial.add(i)
+
+    @property
+    def downsampled(self):
+        return self.bins is not None
+
+    def result(self):
+        if self.bins is None:
+            return self.points
+        return [dict(self.bins[i].record(), partial=True) if i in self.partial else self.bins[i].record()
+                for i in sorted(self.bins)]
+
+
+class MetricsStore:
+    """
+    Append-only time-series store over segmented JSONL files in `root`.
+
+    append() writes one line to the open raw segment and updates the in-progress 1m/5m/1h
+    buckets; a bucket is written to its tier when the interval closes. The index is the sorted
+    list of segment start times per tier, so range queries open only the overlapping segments.
+    Memory use is bounded by the index, the open buckets and the `recent` tail kept for
+    latest(). After a restart the open buckets are rebuilt from the raw tail.
+    Single writer (the collector thread); readers may run concurrently.
+    """
+
+    def __init__(self, root, retention_hours=None, recent=200):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.retention = {tier: (retention_hours or {}).get(tier, TIERS[tier][2]) * 3600 for tier in TIERS}
+        self._lock = threading.Lock()
+        self._index = {tier: [] for tier in TIERS}
+        self._files = {}
+        self._buckets = {tier: None for tier in ROLLUPS}
+        # відкриті інтервали змінює потік збирача, а query() читає з потоків Flask
+        self._buckets_lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+        for f in os.listdir(root):
+            tier, _, rest = f.partition("-")
+            if tier in TIERS and rest.endswith(".jsonl"):
+                try:
+                    self._index[tier].append(int(rest[:-6]))
+                except ValueError:
+                    continue
+        for starts in self._index.values():
+            starts.sort()
+        self._recover()
+
+    # --- запис ---------------------------------------------------------------
+
+    def _path(self, tier, start):
+        return os.path.join(self.root, f"{tier}-{start}.jsonl")
+
+    def _write(self, tier, ts, record):
+        seg_len = TIERS[tier][1]
+        start = int(ts // seg_len * seg_len)
+        f = self._files.get(tier)
+        if f is None or f[0] != start:
+            if f is not None:
+                f[1].close()
+            with self._lock:
+                starts = self._index[tier]
+                if not starts or starts[-1] != start:
+                    bisect.insort(starts, start)
+            f = (start, open(self._path(tier, start), "a"))
+            self._files[tier] = f
+            self._expire(tier, ts)
+        f[1].write(json.dumps(record, separators=(",", ":")) + "\n")
+        f[1].flush()
+
+    def _expire(self, tier, now):
+        # видаляється сегмент, що повністю старший за ретеншн рівня
+        seg_len = TIERS[tier][1]
+        cutoff = now - self.retention[tier]
+        with self._lock:
+            starts = self._index[tier]
+            expired = [s for s in starts if s + seg_len <= cutoff]
+            del starts[:len(expired)]
+        for s in expired:
+            try:
+                os.remove(self._path(tier, s))
+            except OSError:
+                pass
+
+    def _roll(self, ts, fields, after=None):
+        with self._buckets_lock:
+            for tier in ROLLUPS:
+                if after is not None and ts < after[tier]:
+                    continue
+                step = TIERS[tier][0]
+                start = int(ts // step * step)
+                bucket = self._buckets[tier]
+                if bucket is not None and bucket.start != start:
+                    self._write(tier, bucket.start, bucket.record())
+                    bucket = None
+                if bucket is None:
+                    bucket = self._buckets[tier] = _Bucket(start)
+                bucket.add(fields)
+
+    def append(self, sample):
+        """Store one sample (a dict with a numeric "ts" in epoch seconds)."""
+        ts = sample["ts"]
+        self._write("raw", ts, sample)
+        self._recent.append(sample)
+        self._roll(ts, numeric_fields(sample))
+
+    def _recover(self):
+        # Незакриті інтервали 1m/5m/1h відновлюються з сирих зразків після останнього запису рівня
+        last = {}
+        for tier in ROLLUPS:
+            tail = self._tail(tier, 1)
+            last[tier] = tail[0]["ts"] + TIERS[tier][0] if tail else 0
+        for sample in self._read("raw", min(last.values()), float("inf")):
+            self._roll(sample["ts"], numeric_fields(sample), after=last)
+        self._recent.extend(self._tail("raw", self._recent.maxlen))
+
+    # --- читання -------------------------------------------------------------
+
+    def _segments(self, tier, start, end):
+        seg_len = TIERS[tier][1]
+        with self._lock:
+            starts = list(self._index[tier])
+        i = bisect.bisect_right(starts, start - seg_len)
+        j = bisect.bisect_left(starts, end)
+        return starts[i:j]
+
+    def _read_segment(self, tier, seg):
+        try:
+            with open(self._path(tier, seg), "r") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # рядок, який саме дописується
+        except FileNotFoundError:
+            return  # сегмент видалено ретеншном під час читання
+
+    def _read(self, tier, start, end):
+        for seg in self._segments(tier, start, end):
+            for record in self._read_segment(tier, seg):
+                if start <= record["ts"] < end:
+                    yield record
+
+    def _tail(self, tier, n):
+        out = []
+        with self._lock:
+            starts = list(self._index[tier])
+        for seg in reversed(starts):
+            out = list(deque(self._read_segment(tier, seg), maxlen=n - len(out))) + out
+            if len(out) >= n:
+                break
+        return out
+
+    def latest(self, n=20):
+        """The last n raw samples, from memory."""
+        return list(self._recent)[-n:]
+
+    def pick_tier(self, start, end, max_points=1000, interval=15):
+        """Finest tier that still has data from `start` and yields at most max_points."""
+        now = time.time()
+        for tier in TIERS:
+            step = TIERS[tier][0] or interval
+            if now - start <= self.retention[tier] and (end - start) / step <= max_points:
+                return tier
+        return "1h"
+
+    def query(self, start, end, tier="auto", fields=None, max_points=1000):
+        """
+        Points in [start, end) as {"ts", "fields": {name: value}} for raw samples or
+        {"ts", "n", "fields": {name: {"avg", "min", "max"}}} for rollups (the interval still
+        open is included with "partial": true). `fields` limits the names returned.
+        If the range has more than `max_points` points, they are merged into `max_points`
+        equal time bins (rollup format) and "downsampled" is true.
+        """
+        if tier == "auto":
+            tier = self.pick_tier(start, end, max_points)
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier: {tier}")
+        wanted = set(fields) if fields else None
+        points = _Downsampler(start, end, max_points)
+        for record in self._read(tier, start, end):
+            if tier == "raw":
+                record = {"ts": record["ts"], "fields": numeric_fields(record)}
+            if wanted is not None:
+                record["fields"] = {k: v for k, v in record["fields"].items() if k in wanted}
+            points.add(record)
+        with self._buckets_lock:
+            bucket = self._buckets.get(tier)
+            record = bucket.record() if bucket is not None and start <= bucket.start < end else None
+        if record is not None:
+            record["partial"] = True
+            if wanted is not None:
+                record["fields"] = {k: v for k, v in record["fields"].items() if k in wanted}
+            points.add(record)
+        result = {"tier": tier, "start": start, "end": end, "points": points.result(),
+                  "downsampled": points.downsampled}
+        if points.downsampled:
+            result["source_points"] = points.total
+        return result
+
+    def stats(self):
+        with self._lock:
+            segments = {tier: len(starts) for tier, starts in self._index.items()}
+        size = 0
+        for f in os.listdir(self.root):
+            try:
+                size += os.path.getsize(os.path.join(self.root, f))
+            except OSError:
+                pass
+        return {"segments": segments, "disk_bytes": size,
+                "retention_hours": {tier: r / 3600 for tier, r in self.retention.items()}}
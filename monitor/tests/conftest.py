@@ -0,0 +1,5 @@
+import os
+import sys
+
+# модулі монітора імпортуються напряму (як у контейнері: python src/monitor.py)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+from timeseries import MetricsStore, numeric_fields
+
+INTERVAL = 15
+
+
+@pytest.fixture
+def t0():
+    # початок години, дві години тому: усі рівні ще в межах ретеншну
+    return int(time.time() // 3600 * 3600) - 7200
+
+
+def fill(store, t0, count, start=0):
+    for i in range(start, start + count):
+        store.append({"ts": t0 + i * INTERVAL, "cpu_usage": i, "services": {"ai_api": {"ok": i % 2 == 0}}})
+
+
+def test_numeric_fields_flattens_nested_values():
+    sample = {"ts": 1, "cpu": 2.5, "services": {"a": {"ok": True, "name": "x"}}, "tags": [1, 2]}
+    assert numeric_fields(sample) == {"cpu": 2.5, "services.a.ok": 1}
+
+
+def test_rollups_aggregate_closed_intervals(tmp_path, t0):
+    store = MetricsStore(str(tmp_path))
+    fill(store, t0, 8)  # дві повні хвилини: 0..3 і 4..7
+
+    result = store.query(t0, t0 + 3600, tier="1m", fields=["cpu_usage"])
+    points = result["points"]
+    assert [p["ts"] for p in points] == [t0, t0 + 60]
+    assert points[0]["n"] == 4 and points[0]["fields"]["cpu_usage"] == {"avg": 1.5, "min": 0, "max": 3}
+    # друга хвилина ще не закрита — повертається з пам'яті
+    assert points[1].get("partial") is True and "partial" not in points[0]
+    assert result["downsampled"] is False
+
+
+def test_explicit_tier_is_downsampled_over_the_whole_range(tmp_path, t0):
+    store = MetricsStore(str(tmp_path))
+    fill(store, t0, 400)  # 100 хвилин сирих зразків
+
+    result = store.query(t0, t0 + 400 * INTERVAL, tier="raw", fields=["cpu_usage"], max_points=10)
+
+    points = result["points"]
+    assert result["downsampled"] is True and result["source_points"] == 400
+    assert len(points) == 10
+    # покрито весь проміжок, а не лише останні max_points зразків
+    assert points[0]["fields"]["cpu_usage"]["min"] == 0
+    assert points[-1]["fields"]["cpu_usage"]["max"] == 399
+    assert sum(p["n"] for p in points) == 400
+    assert points[0]["fields"]["cpu_usage"]["avg"] == pytest.approx(19.5)
+
+
+def test_downsampled_rollups_weight_by_sample_count(tmp_path, t0):
+    store = MetricsStore(str(tmp_path))
+    fill(store, t0, 400)
+
+    result = store.query(t0, t0 + 400 * INTERVAL, tier="1m", fields=["cpu_usage"], max_points=5)
+
+    assert result["downsampled"] is True and result["source_points"] == 100
+    assert sum(p["n"] for p in result["points"]) == 400
+    assert result["points"][-1].get("partial") is True
+    overall = sum(p["fields"]["cpu_usage"]["avg"] * p["n"] for p in result["points"]) / 400
+    assert overall == pytest.approx(199.5)
+
+
+def test_auto_tier_picks_finest_tier_within_max_points(tmp_path, t0):
+    store = MetricsStore(str(tmp_path))
+    assert store.pick_tier(t0, t0 + 3600, max_points=1000) == "raw"
+    assert store.pick_tier(t0, t0 + 3600, max_points=100) == "1m"
+    assert store.pick_tier(t0, t0 + 7200, max_points=30) == "5m"
+
+
+def test_open_buckets_are_recovered_after_restart(tmp_path, t0):
+    store = MetricsStore(str(tmp_path))
+    fill(store, t0, 6)
+    before = store.query(t0, t0 + 3600, tier="1m")["points"]
+
+    reopened = MetricsStore(str(tmp_path))
+    assert reopened.query(t0, t0 + 3600, tier="1m")["points"] == before
+    assert [s["ts"] for s in reopened.latest(3)] == [t0 + i * INTERVAL for i in (3, 4, 5)]
+
+
+def test_query_while_collector_appends(tmp_path, t0):
+    store = MetricsStore(str(tmp_path))
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            # нове поле в кожному зразку: відкритий інтервал змінює розмір словника
+            store.append({"ts": t0 + i, f"field_{i}": i})
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(200):
+            try:
+                store.query(t0, t0 + 10 ** 6, tier="1h")
+            except RuntimeError as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
@@ -1,18 +1,27 @@
 # trainer/src/api.py
 import threading
 import time
+from collections import OrderedDict
 import os
 import json
 import logging
-from flask import Flask, jsonify, request
-from state import get_state, set_state, reset_state
-from train import train_one_run
-from registry import list_models
+from flask import Flask, Response, jsonify, request
+from state import get_state, set_state, reset_state, add_listener
+from train import resolve_amp, AMP_MODES, DEVICE
+from distributed import run_distributed, DDP_DEVICE, TrainingCancelled
+from checkpoint import load_latest, new_run_id
+from scheduler import TrainScheduler, RunAlreadyActive, expand_sweep
+from telemetry import StepRing, summarize
+from events import EventHub
+from registry import list_models, migrate as migrate_registry
+from exposition import StepHistogram, render as render_prometheus, CONTENT_TYPE
 
 app = Flask(__name__)
 os.makedirs("/models", exist_ok=True)
 os.makedirs("/trainer_logs", exist_ok=True)
 METADATA_PATH = "/trainer_logs/training_metadata.json"
+# Верхня межа world_size для DDP-запусків (процесів на одній машині)
+MAX_WORLD_SIZE = int(os.getenv("TRAIN_MAX_WORLD_SIZE", "8"))
 
 logging.basicConfig(
     filename="/trainer_logs/trainer_api.log",
@@ -20,8 +29,35 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
-_train_thread = None
-_thread_lock = threading.Lock()
+_metadata_lock = threading.Lock()
+# run_id -> StepRing останніх запусків (для /metrics); старіші буфери видаляються
+TELEMETRY_KEEP = int(os.getenv("TELEMETRY_KEEP", "4"))
+_rings = OrderedDict()
+_rings_lock = threading.Lock()
+
+def new_ring(run_id):
+    ring = StepRing.create()
+    with _rings_lock:
+        _rings[run_id] = ring
+        _rings.move_to_end(run_id)
+        while len(_rings) > TELEMETRY_KEEP:
+            _rings.popitem(last=False)[1].unlink()
+    return ring
+
+def get_ring(run_id=None):
+    with _rings_lock:
+        if run_id is not None:
+            return _rings.get(run_id)
+        return next(reversed(_rings.values()), None)
+
+def latest_ring():
+    with _rings_lock:
+        return next(reversed(_rings.items()), (None, None))
+
+event_hub = EventHub(get_state, latest_ring)
+# Лічильники кроків для /metrics/prometheus, накопичуються з кільцевих буферів телеметрії
+step_histogram = StepHistogram()
+add_listener(event_hub.notify)
 
 def load_metadata():
     if os.path.exists(METADATA_PATH):
@@ -33,16 +69,76 @@ def load_metadata():
     return []
 
 def save_metadata(entry):
-    data = load_metadata()
-    data.append(entry)
-    with open(METADATA_PATH, "w") as f:
-        json.dump(data, f, indent=4)
+    # кілька запусків можуть завершитися одночасно
+    with _metadata_lock:
+        data = load_metadata()
+        data.append(entry)
+        with open(METADATA_PATH, "w") as f:
+            json.dump(data, f, indent=4)
+
+def parse_train_params(data):
+    """Параметри /train з JSON; відсутні беруться за замовчуванням."""
+    # fast=true вмикає AMP (auto) і channels_last, якщо їх не задано явно
+    fast = bool(data.get("fast", False))
+    params = {
+        "epochs": int(data.get("epochs", 1)),
+        "batch_size": int(data.get("batch_size", 64)),
+        "lr": float(data.get("lr", 1e-3)),
+        "num_workers": int(data["num_workers"]) if data.get("num_workers") is not None else None,
+        "persistent_workers": bool(data.get("persistent_workers", True)),
+        "prefetch_factor": int(data.get("prefetch_factor", 2)),
+        "cache_dataset": bool(data.get("cache_dataset", False)),
+        "seed": int(data.get("seed", 42)),
+        "data_mode": str(data.get("data_mode", "cpu")),
+        "random_crop": bool(data.get("random_crop", False)),
+        "random_flip": bool(data.get("random_flip", False)),
+        "amp": str(data.get("amp", "auto" if fast else "off")),
+        "channels_last": bool(data.get("channels_last", fast)),
+        "compile_model": bool(data.get("compile", False)),
+        "grad_accum_steps": int(data.get("grad_accum_steps", 1)),
+        "report_every": int(data.get("report_every", 20)),
+        "world_size": int(data.get("world_size", 1)),
+        "checkpoint_every": int(data.get("checkpoint_every", 500)),
+        "synthetic": int(data.get("synthetic", 0)),
+    }
+    if params["data_mode"] not in ("cpu", "device"):
+        raise ValueError("data_mode must be 'cpu' or 'device'")
+    if params["epochs"] < 1 or params["batch_size"] < 1 or params["lr"] <= 0:
+        raise ValueError("epochs and batch_size must be >= 1, lr must be > 0")
+    if params["amp"] not in AMP_MODES:
+        raise ValueError(f"amp must be one of {AMP_MODES}")
+    if not 1 <= params["world_size"] <= MAX_WORLD_SIZE:
+        raise ValueError(f"world_size must be between 1 and {MAX_WORLD_SIZE}")
+    resolve_amp(params["amp"], DDP_DEVICE if params["world_size"] > 1 else DEVICE)
+    if params["grad_accum_steps"] < 1 or params["report_every"] < 1:
+        raise ValueError("grad_accum_steps and report_every must be >= 1")
+    if params["checkpoint_every"] < 0:
+        raise ValueError("checkpoint_every must be >= 0")
+    if params["synthetic"] < 0:
+        raise ValueError("synthetic must be >= 0")
+    return params
 
-def background_train(epochs, batch_size, lr):
+def run_training_job(params, on_update, cancel, threads):
+    """
+    Runs one scheduled job. Training always happens in separate processes (one, or a DDP group
+    for world_size > 1), so it does not share the GIL with Flask and can be cancelled.
+    Progress goes to the job record and to state.py (/status shows the latest reporting job).
+    """
+    epochs, batch_size, lr = params["epochs"], params["batch_size"], params["lr"]
     start_time = time.time()
+
+    def report(**fields):
+        set_state(**fields)
+        on_update(**fields)
+
+    reset_state()
+    set_state(status="training", started_at=start_time)
+    ring = new_ring(params["run_id"])
     try:
-        logging.info(f"Training started: epochs={epochs}, batch_size={batch_size}, lr={lr}")
-        result = train_one_run(epochs=epochs, batch_size=batch_size, lr=lr)
+        logging.info(f"Training started: {params}")
+        result = run_distributed(params, on_update=report, cancel=cancel, threads=threads,
+                                 telemetry=ring.path)
+        set_state(status="done", progress=100.0, finished_at=time.time(), last_error=None)
         duration_min = round((time.time() - start_time) / 60, 2)
 
         entry = {
@@ -50,51 +146,145 @@ def background_train(epochs, batch_size, lr):
             "epochs": epochs,
             "batch_size": batch_size,
             "lr": lr,
+            "params": params,
             "accuracy": result.get("accuracy"),
             "saved_model": result.get("model_name"),
             "duration_min": duration_min
         }
         save_metadata(entry)
         logging.info(f"Training finished successfully: {entry}")
+        return result
 
+    except TrainingCancelled as e:
+        logging.info(f"Training cancelled: {params}")
+        set_state(status="cancelled", finished_at=time.time(), last_error=str(e))
+        raise
     except Exception as e:
         logging.exception("Training error")
         set_state(status="failed", last_error=str(e))
+        raise
+
+scheduler = TrainScheduler(run_training_job)
+
+def resume_params(run_id=None):
+    """Params to continue the latest unfinished run (or `run_id`) from its checkpoint, or None."""
+    info = load_latest(run_id)
+    if info is None:
+        return None
+    params = dict(info["params"])
+    params["resume_from"] = info["path"]
+    return params
 
 @app.route("/train", methods=["POST"])
 def start_train():
-    global _train_thread
-    with _thread_lock:
-        st = get_state()
-        if st["status"] == "training":
-            return jsonify({"status":"busy", "message":"Training already running"}), 409
-        # parameters optional in JSON
-        data = request.get_json() or {}
-        epochs = int(data.get("epochs", 1))
-        batch_size = int(data.get("batch_size", 64))
-        lr = float(data.get("lr", 1e-3))
-        reset_state()
-        set_state(status="training", started_at=time.time())
-        _train_thread = threading.Thread(target=background_train, args=(epochs, batch_size, lr), daemon=True)
-        _train_thread.start()
-
-        logging.info(f"Training launched via API: epochs={epochs}, batch_size={batch_size}, lr={lr}")
-        return jsonify({"status":"started", "epochs":epochs}), 202
+    """
+    Queue training runs: one spec (the params themselves), {"runs": [spec, ...]} or
+    {"sweep": {"grid" | "random": ...}, "base": spec}. Returns the queued job ids.
+    """
+    # parameters optional in JSON
+    data = request.get_json(silent=True) or {}
+    sweep_id = None
+    try:
+        if "sweep" in data:
+            specs = expand_sweep(data["sweep"], data.get("base"))
+            sweep_id = new_run_id()
+        elif "runs" in data:
+            specs = list(data["runs"])
+        else:
+            specs = [data]
+        params_list = [parse_train_params(spec) for spec in specs]
+    except (TypeError, ValueError, KeyError, AttributeError) as e:
+        return jsonify({"status":"error", "message":str(e)}), 400
+    jobs = scheduler.submit(params_list, sweep_id=sweep_id)
+
+    logging.info(f"Training queued via API: {[job['id'] for job in jobs]} {params_list}")
+    if len(jobs) == 1 and sweep_id is None:
+        return jsonify({"status":"queued", "job_id":jobs[0]["id"], "epochs":params_list[0]["epochs"]}), 202
+    return jsonify({"status":"queued", "sweep_id":sweep_id, "job_ids":[job["id"] for job in jobs]}), 202
+
+@app.route("/train/resume", methods=["POST"])
+def resume_train():
+    data = request.get_json(silent=True) or {}
+    params = resume_params(data.get("run_id"))
+    if params is None:
+        return jsonify({"status":"error", "message":"No checkpoint to resume from"}), 404
+    try:
+        # той самий run_id уже в черзі (напр. відновлений після перезапуску) — другий запуск зіпсує чекпоінт
+        job = scheduler.submit([params], exclusive=True)[0]
+    except RunAlreadyActive as e:
+        return jsonify({"status":"error", "message":str(e), "job_id":e.job["id"]}), 409
+
+    logging.info(f"Training resume queued via API: {params}")
+    return jsonify({"status":"queued", "job_id":job["id"], "run_id":params["run_id"], "epochs":params["epochs"]}), 202
+
+@app.route("/jobs", methods=["GET"])
+def jobs():
+    return jsonify({"jobs": scheduler.list(request.args.get("status")), "scheduler": scheduler.stats()})
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({"status":"error", "message":"Unknown job"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = scheduler.cancel(job_id)
+    if job is None:
+        return jsonify({"status":"error", "message":"Unknown job"}), 404
+    return jsonify(job), 202
 
 @app.route("/status", methods=["GET"])
 def status():
-    return jsonify(get_state())
+    st = get_state()
+    st["queue"] = scheduler.stats()
+    return jsonify(st)
 
 @app.route("/metrics", methods=["GET"])
 def metrics():
+    """
+    Latest state plus per-step telemetry of a run (?run_id=, default: the latest run):
+    moving averages over ?window= steps (50) and time series downsampled to ?points= (100, 0: none).
+    """
     st = get_state()
-    return jsonify({
+    payload = {
         "accuracy": st.get("accuracy"),
         "loss": st.get("loss"),
         "epoch": st.get("epoch"),
         "progress": st.get("progress"),
         "status": st.get("status")
-    })
+    }
+    ring = get_ring(request.args.get("run_id"))
+    if ring is not None:
+        points = request.args.get("points", 100, type=int)
+        window = request.args.get("window", 50, type=int)
+        telemetry = summarize(ring, points=max(1, points), window=window)
+        if points <= 0:
+            telemetry.pop("series")
+        payload["telemetry"] = telemetry
+    return jsonify(payload)
+
+@app.route("/metrics/prometheus", methods=["GET"])
+def metrics_prometheus():
+    """Prometheus text format: step-time histogram, throughput, loss, progress, job queue."""
+    with _rings_lock:
+        # під локом: new_ring() не видалить буфер, поки з нього читаються нові кроки
+        rings = list(_rings.items())
+        step_histogram.update(rings)
+        moving = summarize(rings[-1][1], points=1)["moving_avg"] if rings else {}
+    body = render_prometheus(get_state(), scheduler.stats(), moving, step_histogram)
+    return Response(body, mimetype=CONTENT_TYPE)
+
+@app.route("/events", methods=["GET"])
+def events():
+    """
+    Server-Sent Events: "snapshot" on connect, then "run" / "progress" events with state and
+    the new step points of the latest run. Supports Last-Event-ID on reconnect.
+    """
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    return Response(event_hub.stream(last_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/models", methods=["GET"])
 def models():
@@ -109,8 +299,15 @@ def home():
     return jsonify({
         "message": "AI Trainer API active",
         "gpu_enabled": os.environ.get("CUDA_VISIBLE_DEVICES", "auto"),
-        "endpoints": ["/train", "/status", "/metrics", "/models", "/metadata"]
+        "endpoints": ["/train", "/train/resume", "/jobs", "/status", "/metrics", "/metrics/prometheus", "/events", "/models", "/metadata"]
     })
 
 if __name__ == "__main__":
+    # лише в процесі API: процеси тренування (spawn) імпортують цей модуль повторно
+    try:
+        # разова міграція старих model_v*.pth у реєстр — до старту, а не в першому GET /models
+        migrate_registry()
+    except Exception:
+        logging.exception("Model registry migration failed")
+    scheduler.start()
     app.run(host="0.0.0.0", port=8090, threaded=True)
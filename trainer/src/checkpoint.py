@@ -0,0 +1,208 @@
+# trainer/src/checkpoint.py
+import json
+import os
+import random
+import threading
+import time
+import uuid
+import numpy as np
+import torch
+from registry import MODELS_DIR
+
+# Чекпоінти незавершених запусків: ckpt_<run_id>.pt + ckpt_<run_id>.json (дані для POST /train/resume);
+# latest.json — копія даних запуску, що писав чекпоінт останнім (resume без run_id)
+CHECKPOINT_DIR = os.path.join(MODELS_DIR, "checkpoints")
+
+
+def new_run_id():
+    return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def checkpoint_path(run_id, directory=CHECKPOINT_DIR):
+    return os.path.join(directory, f"ckpt_{run_id}.pt")
+
+
+def info_path(run_id, directory=CHECKPOINT_DIR):
+    return os.path.join(directory, f"ckpt_{run_id}.json")
+
+
+def to_cpu(obj):
+    """Deep copy of a (nested) state dict with every tensor cloned to CPU memory."""
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(v) for v in obj)
+    return obj
+
+
+def rng_state():
+    return {
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+        "numpy": np.random.get_state(),
+        "python": random.getstate(),
+    }
+
+
+def set_rng_state(st):
+    torch.set_rng_state(st["torch"])
+    if st.get("cuda") is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(st["cuda"])
+    np.random.set_state(st["numpy"])
+    random.setstate(st["python"])
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp, path)
+
+
+class AsyncCheckpointer:
+    """
+    Writes checkpoints of one run from a background thread. save() only copies the state to
+    CPU on the caller's thread; serialization and disk I/O happen in the writer. If a write is
+    still running when the next checkpoint arrives, only the newest pending one is written.
+    Files are written to a temp name and renamed, so a crash never leaves a torn checkpoint.
+    """
+
+    def __init__(self, run_id, params, directory=CHECKPOINT_DIR):
+        self.run_id = run_id
+        self.params = params
+        self.directory = directory
+        self.path = checkpoint_path(run_id, directory)
+        self.saved = 0
+        self.superseded = 0
+        self.last_write_ms = None
+        self._pending = None
+        self._busy = False
+        self._closed = False
+        self._cond = threading.Condition()
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._loop, name=f"checkpoint-{run_id}", daemon=True)
+        self._thread.start()
+
+    def save(self, state):
+        snapshot = to_cpu(state)
+        with self._cond:
+            if self._pending is not None:
+                self.superseded += 1
+            self._pending = snapshot
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self._write(snapshot)
+            except Exception as e:
+                print(f"[WARN] Checkpoint write failed: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, snapshot):
+        started = time.perf_counter()
+        tmp = self.path + ".tmp"
+        torch.save(snapshot, tmp)
+        os.replace(tmp, self.path)
+        info = {
+            "run_id": self.run_id,
+            "path": self.path,
+            "params": self.params,
+            "epoch": snapshot["epoch"],
+            "batch": snapshot["batch"],
+            "step": snapshot["step"],
+            "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        _write_json(info_path(self.run_id, self.directory), info)
+        _write_json(os.path.join(self.directory, "latest.json"), info)
+        self.saved += 1
+        self.last_write_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    def flush(self):
+        """Block until every checkpoint handed to save() is on disk."""
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+
+    def close(self, finished=False):
+        """Stop the writer. finished=True: the run completed, its checkpoint is no longer needed."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        if finished:
+            discard(self.run_id, self.directory)
+
+    def stats(self):
+        return {"run_id": self.run_id, "saved": self.saved, "superseded": self.superseded,
+                "last_write_ms": self.last_write_ms}
+
+
+def _read_info(path):
+    try:
+        with open(path, "r") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return info if os.path.exists(info["path"]) else None
+
+
+def load_latest(run_id=None, directory=CHECKPOINT_DIR):
+    """
+    Resume info of `run_id`'s checkpoint, or, without run_id, of the run that checkpointed
+    last (the newest remaining one if that run has finished). None if there is nothing to resume.
+    """
+    if run_id is not None:
+        return _read_info(info_path(run_id, directory))
+    info = _read_info(os.path.join(directory, "latest.json"))
+    if info is not None:
+        return info
+    try:
+        names = [f for f in os.listdir(directory) if f.startswith("ckpt_") and f.endswith(".json")]
+    except FileNotFoundError:
+        return None
+    candidates = []
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            candidates.append((os.path.getmtime(path), path))
+        except OSError:
+            continue  # запуск завершився й прибрав чекпоінт паралельно
+    for _, path in sorted(candidates, reverse=True):
+        info = _read_info(path)
+        if info is not None:
+            return info
+    return None
+
+
+def load_checkpoint(path):
+    # RNG-стани numpy/python не є тензорами, тож weights_only=False (файли пише лише сам тренер)
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+
+def discard(run_id, directory=CHECKPOINT_DIR):
+    for path in (checkpoint_path(run_id, directory), info_path(run_id, directory)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    latest = os.path.join(directory, "latest.json")
+    info = _read_info(latest)
+    if info is None or info["run_id"] == run_id:
+        try:
+            os.remove(latest)
+        except OSError:
+            pass
@@ -0,0 +1,313 @@
+# trainer/src/data.py
+import itertools
+import os
+import time
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Dataset, Subset, random_split
+from torch.utils.data.distributed import DistributedSampler
+from torchvision import datasets, transforms
+
+DATA_ROOT = "/data"
+MEAN = (0.4914, 0.4822, 0.4465)
+STD = (0.2023, 0.1994, 0.2010)
+IMAGE_SIZE = 224
+
+
+def default_num_workers():
+    return min(4, os.cpu_count() or 1)
+
+
+def build_transform(size=IMAGE_SIZE):
+    return transforms.Compose([
+        transforms.Resize(size),
+        transforms.ToTensor(),
+        transforms.Normalize(MEAN, STD)
+    ])
+
+
+def cache_path(root=DATA_ROOT, train=True, size=IMAGE_SIZE):
+    split = "train" if train else "test"
+    return os.path.join(root, f"cifar10_{split}_{size}_uint8.npy")
+
+
+def build_cache(root=DATA_ROOT, train=True, size=IMAGE_SIZE):
+    """
+    Decode and resize CIFAR-10 once into a memory-mapped uint8 [N, size, size, 3] .npy file
+    (plus labels next to it). Later runs and epochs read pixels straight from the page cache.
+    224x224 for the 50k train images is ~7.5 GB on disk.
+    """
+    path = cache_path(root, train, size)
+    labels_path = path.replace("_uint8.npy", "_labels.npy")
+    if os.path.exists(path) and os.path.exists(labels_path):
+        return path, labels_path
+
+    started = time.time()
+    raw = datasets.CIFAR10(root=root, train=train, download=True)
+    resize = transforms.Resize(size)
+    tmp = path + ".tmp"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.uint8, shape=(len(raw), size, size, 3))
+    for i, (img, _) in enumerate(raw):
+        # той самий PIL Resize, що й у звичайному transform — результат збігається до пікселя
+        out[i] = np.asarray(resize(img), dtype=np.uint8)
+    out.flush()
+    del out
+    np.save(labels_path, np.asarray(raw.targets, dtype=np.int64))
+    os.replace(tmp, path)
+    print(f"[INFO] Dataset cache {path} built in {time.time() - started:.1f}s")
+    return path, labels_path
+
+
+class CachedCIFAR10(Dataset):
+    """
+    CIFAR-10 served from the uint8 cache built by build_cache(). Items are uint8 [3, H, W]
+    tensors; normalization happens per batch in normalize_batch(), so workers ship 4x fewer
+    bytes to the training process. The memmap is opened lazily in each worker process.
+    """
+
+    def __init__(self, path, labels_path):
+        self.path = path
+        self.targets = np.load(labels_path)
+        self._images = None
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        if self._images is None:
+            self._images = np.load(self.path, mmap_mode="r")
+        img = torch.from_numpy(np.array(self._images[idx])).permute(2, 0, 1)
+        return img, int(self.targets[idx])
+
+
+class SyntheticImages(Dataset):
+    """
+    `size` random uint8 [3, H, W] images with random labels, shaped like CachedCIFAR10 items.
+    Every item is generated from (seed, idx), so it is the same in any worker and epoch.
+    """
+
+    def __init__(self, size, seed=42, image_size=IMAGE_SIZE, num_classes=10):
+        self.seed = seed
+        self.image_size = image_size
+        self.targets = torch.randint(0, num_classes, (size,),
+                                     generator=torch.Generator().manual_seed(seed)).tolist()
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        g = torch.Generator().manual_seed(self.seed * 1_000_003 + idx)
+        s = self.image_size
+        img = torch.randint(0, 256, (3, s, s), dtype=torch.uint8, generator=g)
+        return img, self.targets[idx]
+
+
+def synthetic_raw(size, seed=42, num_classes=10):
+    """Random uint8 [size, 32, 32, 3] pixels and int64 labels, like CIFAR-10's raw arrays."""
+    g = torch.Generator().manual_seed(seed)
+    images = torch.randint(0, 256, (size, 32, 32, 3), dtype=torch.uint8, generator=g)
+    targets = torch.randint(0, num_classes, (size,), generator=g)
+    return images, targets
+
+
+def normalize_batch(inputs, device):
+    """Move a batch to `device`; uint8 batches (cache mode) are converted and normalized there."""
+    inputs = inputs.to(device, non_blocking=True)
+    if inputs.dtype != torch.uint8:
+        return inputs
+    mean = torch.tensor(MEAN, device=device).view(1, 3, 1, 1)
+    std = torch.tensor(STD, device=device).view(1, 3, 1, 1)
+    return (inputs.float().div_(255.0) - mean) / std
+
+
+class ResumableSampler(DistributedSampler):
+    """
+    DistributedSampler (also used for a single process) that can start an epoch part-way.
+    The order depends only on (seed, epoch), so set_epoch(epoch, start_batch) reproduces an
+    interrupted epoch and skips the batches already trained without loading them.
+    """
+
+    def __init__(self, dataset, batch_size, num_replicas=1, rank=0, seed=42):
+        super().__init__(dataset, num_replicas=num_replicas, rank=rank, shuffle=True, seed=seed)
+        self.batch_size = batch_size
+        self.start = 0
+
+    def set_epoch(self, epoch, start_batch=0):
+        super().set_epoch(epoch)
+        self.start = min(start_batch * self.batch_size, self.num_samples)
+
+    def __iter__(self):
+        return itertools.islice(super().__iter__(), self.start, None)
+
+    def __len__(self):
+        return self.num_samples - self.start
+
+
+def make_loaders(batch_size, num_workers=None, persistent_workers=True, prefetch_factor=2,
+                 cache_dataset=False, seed=42, root=DATA_ROOT, val_fraction=0.1, rank=0, world_size=1,
+                 synthetic=0):
+    """
+    Train/val DataLoaders for CIFAR-10 with a split that is reproducible for a given seed.
+    num_workers > 0 decodes in worker processes; persistent_workers keeps them alive between
+    epochs; prefetch_factor batches are prepared ahead per worker.
+    Train batches come from a ResumableSampler: call set_loader_epoch() before every epoch.
+    With world_size > 1 each rank gets its shard (same number of train batches on every rank)
+    and every world_size-th val item.
+    synthetic > 0 replaces CIFAR-10 with that many SyntheticImages (benchmarks, smoke runs).
+    """
+    if num_workers is None:
+        num_workers = default_num_workers()
+
+    if synthetic:
+        dataset = SyntheticImages(synthetic, seed=seed)
+    elif cache_dataset:
+        dataset = CachedCIFAR10(*build_cache(root, train=True))
+    else:
+        dataset = datasets.CIFAR10(root=root, train=True, download=True, transform=build_transform())
+
+    val_size = int(val_fraction * len(dataset))
+    train_size = len(dataset) - val_size
+    train_ds, val_ds = random_split(dataset, [train_size, val_size],
+                                    generator=torch.Generator().manual_seed(seed))
+
+    loader_kwargs = {
+        "batch_size": batch_size,
+        "num_workers": num_workers,
+        "pin_memory": torch.cuda.is_available(),
+    }
+    if num_workers > 0:
+        loader_kwargs["persistent_workers"] = persistent_workers
+        loader_kwargs["prefetch_factor"] = prefetch_factor
+
+    train_sampler = ResumableSampler(train_ds, batch_size, num_replicas=world_size, rank=rank, seed=seed)
+    if world_size > 1:
+        val_ds = Subset(val_ds, range(rank, len(val_ds), world_size))
+
+    train_loader = DataLoader(train_ds, sampler=train_sampler,
+                              generator=torch.Generator().manual_seed(seed), **loader_kwargs)
+    val_loader = DataLoader(val_ds, shuffle=False, **loader_kwargs)
+    return train_loader, val_loader
+
+
+class RawBatches:
+    """
+    Batches of raw CIFAR-10 pixels as uint8 [B, 32, 32, 3] straight from dataset.data, with no
+    per-image Python work. Resize, normalization and augmentation happen on the training
+    device in DeviceAugment, so only 32x32 pixels cross the host-to-device path.
+    Shuffling depends only on (seed, epoch), see set_epoch(). With world_size > 1 every rank
+    draws the same permutation and takes every world_size-th index, padded so that all ranks
+    get the same number of batches.
+    """
+
+    def __init__(self, images, targets, batch_size, shuffle=False, seed=42, rank=0, world_size=1):
+        self.images = images
+        self.targets = targets
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.start_batch = 0
+        self.pin = torch.cuda.is_available()
+        self.num_workers = 0
+        self.rank = rank
+        self.world_size = world_size
+
+    def _per_rank(self):
+        return (len(self.targets) + self.world_size - 1) // self.world_size
+
+    def __len__(self):
+        return (self._per_rank() + self.batch_size - 1) // self.batch_size - self.start_batch
+
+    def set_epoch(self, epoch, start_batch=0):
+        self.epoch = epoch
+        self.start_batch = start_batch
+
+    def __iter__(self):
+        n = len(self.targets)
+        if self.shuffle:
+            order = torch.randperm(n, generator=torch.Generator().manual_seed(self.seed + self.epoch))
+        else:
+            order = torch.arange(n)
+        if self.world_size > 1:
+            padded = self._per_rank() * self.world_size
+            order = torch.cat([order, order[:padded - n]])[self.rank::self.world_size]
+            n = len(order)
+        for start in range(self.start_batch * self.batch_size, n, self.batch_size):
+            idx = order[start:start + self.batch_size]
+            x = self.images.index_select(0, idx)
+            if self.pin:
+                x = x.pin_memory()
+            yield x, self.targets.index_select(0, idx)
+
+
+class DeviceAugment:
+    """
+    Batched uint8 NHWC -> normalized float NCHW at `size`, on the batch's device:
+    optional random crop (with `padding`) and horizontal flip for training, then bilinear resize.
+    """
+
+    def __init__(self, size=IMAGE_SIZE, random_crop=True, flip=True, padding=4):
+        self.size = size
+        self.random_crop = random_crop
+        self.flip = flip
+        self.padding = padding
+        self._stats = {}
+
+    def _mean_std(self, device):
+        if device not in self._stats:
+            self._stats[device] = (torch.tensor(MEAN, device=device).view(1, 3, 1, 1),
+                                   torch.tensor(STD, device=device).view(1, 3, 1, 1))
+        return self._stats[device]
+
+    def _crop(self, x):
+        b, c, h, w = x.shape
+        p = self.padding
+        x = F.pad(x, (p, p, p, p))
+        oy = torch.randint(0, 2 * p + 1, (b,), device=x.device)
+        ox = torch.randint(0, 2 * p + 1, (b,), device=x.device)
+        rows = (oy.view(b, 1) + torch.arange(h, device=x.device)).view(b, 1, h, 1).expand(b, c, h, w + 2 * p)
+        x = x.gather(2, rows)
+        cols = (ox.view(b, 1) + torch.arange(w, device=x.device)).view(b, 1, 1, w).expand(b, c, h, w)
+        return x.gather(3, cols)
+
+    def __call__(self, inputs, device, train=True):
+        x = inputs.to(device, non_blocking=True).permute(0, 3, 1, 2).float().div_(255.0)
+        if train and self.random_crop:
+            x = self._crop(x)
+        if train and self.flip:
+            mask = torch.rand(x.shape[0], device=x.device) < 0.5
+            x = torch.where(mask.view(-1, 1, 1, 1), x.flip(3), x)
+        if x.shape[-1] != self.size:
+            x = F.interpolate(x, size=(self.size, self.size), mode="bilinear", align_corners=False)
+        mean, std = self._mean_std(x.device)
+        return (x - mean) / std
+
+
+def make_device_loaders(batch_size, seed=42, root=DATA_ROOT, val_fraction=0.1, rank=0, world_size=1,
+                        synthetic=0):
+    """Train/val RawBatches over CIFAR-10 with the same seeded split (and sharding) as make_loaders()."""
+    if synthetic:
+        images, targets = synthetic_raw(synthetic, seed=seed)
+    else:
+        raw = datasets.CIFAR10(root=root, train=True, download=True)
+        images = torch.from_numpy(raw.data)
+        targets = torch.as_tensor(raw.targets, dtype=torch.int64)
+
+    val_size = int(val_fraction * len(targets))
+    train_size = len(targets) - val_size
+    train_idx, val_idx = random_split(range(len(targets)), [train_size, val_size],
+                                      generator=torch.Generator().manual_seed(seed))
+    train_idx = torch.as_tensor(list(train_idx), dtype=torch.int64)
+    val_idx = torch.as_tensor(list(val_idx), dtype=torch.int64)[rank::world_size]
+
+    train_loader = RawBatches(images[train_idx], targets[train_idx], batch_size, shuffle=True, seed=seed,
+                              rank=rank, world_size=world_size)
+    val_loader = RawBatches(images[val_idx], targets[val_idx], batch_size, shuffle=False)
+    return train_loader, val_loader
+
+
+def set_loader_epoch(loader, epoch, start_batch=0):
+    """Set the shuffle epoch of a train loader from make_loaders()/make_device_loaders()."""
+    target = loader if isinstance(loader, RawBatches) else loader.sampler
+    target.set_epoch(epoch, start_batch)
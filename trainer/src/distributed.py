@@ -0,0 +1,158 @@
+# trainer/src/distributed.py
+import os
+import queue
+import socket
+import time
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import state
+import train
+from state import set_state
+from data import default_num_workers
+
+# gloo працює на CPU на будь-якій Linux-машині; всі DDP-процеси тренують на CPU
+BACKEND = "gloo"
+DDP_DEVICE = torch.device("cpu")
+
+# Ці ключі з set_state() у процесах-рангах агрегуються в state.py батьківського процесу
+PROGRESS_KEYS = ("progress", "epoch", "loss", "accuracy", "step", "total_steps")
+
+
+class TrainingCancelled(Exception):
+    pass
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, params, events, threads):
+    # ядра CPU ділимо між рангами, інакше потоки intra-op конкурують між процесами
+    torch.set_num_threads(threads)
+    state.set_forwarder(lambda update: events.put(("state", rank, update)))
+    params = dict(params, rank=rank, world_size=world_size)
+    distributed = world_size > 1
+    if distributed:
+        os.environ["MASTER_ADDR"] = "127.0.0.1"
+        os.environ["MASTER_PORT"] = str(port)
+        train.DEVICE = DDP_DEVICE
+        if params.get("num_workers") is None:
+            params["num_workers"] = max(1, default_num_workers() // world_size)
+        dist.init_process_group(BACKEND, rank=rank, world_size=world_size)
+    try:
+        result = train.train_one_run(**params)
+        if rank == 0:
+            events.put(("result", rank, result))
+    except Exception as e:
+        events.put(("error", rank, str(e)))
+        raise
+    finally:
+        if distributed:
+            dist.destroy_process_group()
+
+
+class _Progress:
+    """Merges per-rank updates: progress/epoch/step of the slowest rank, mean train loss."""
+
+    def __init__(self, world_size, on_update):
+        self.world_size = world_size
+        self.on_update = on_update
+        self.ranks = {}
+
+    def update(self, rank, update):
+        r = self.ranks.setdefault(rank, {})
+        r.update({k: v for k, v in update.items() if k in PROGRESS_KEYS})
+        per_rank = {str(i): self.ranks.get(i, {}).get("progress", 0.0) for i in range(self.world_size)}
+        merged = {"ranks": per_rank} if self.world_size > 1 else {}
+        merged["progress"] = min(per_rank.values())
+        merged["epoch"] = min(self.ranks.get(i, {}).get("epoch", 0) for i in range(self.world_size))
+        merged["step"] = min(self.ranks.get(i, {}).get("step", 0) for i in range(self.world_size))
+        if "total_steps" in update:
+            merged["total_steps"] = update["total_steps"]
+        losses = [x["loss"] for x in self.ranks.values() if x.get("loss") is not None]
+        if losses:
+            merged["loss"] = round(sum(losses) / len(losses), 4)
+        # точність після валідації вже all-reduce'нута — однакова на всіх рангах
+        if "accuracy" in update:
+            merged["accuracy"] = update["accuracy"]
+        self.on_update(**merged)
+
+
+def run_distributed(params, on_update=set_state, cancel=None, threads=None, telemetry=None,
+                    poll_interval=1.0):
+    """
+    Run train_one_run(**params) in params["world_size"] spawned local processes: a
+    DistributedDataParallel job (gloo backend) when world_size > 1, a single training process
+    otherwise. Blocks until all ranks exit; progress merged from every rank is passed to
+    `on_update(**fields)` (state.py by default) while it runs. `threads` is the torch thread
+    budget for the whole job. Setting the `cancel` event terminates the processes and raises
+    TrainingCancelled. `telemetry` is the path of a StepRing for rank 0's per-step metrics.
+    Returns rank 0's metadata, raises if any rank failed.
+    """
+    world_size = int(params.get("world_size", 1))
+    if telemetry:
+        params = dict(params, telemetry=telemetry)
+    threads = threads or os.cpu_count() or 1
+    ctx = mp.get_context("spawn")
+    events = ctx.Queue()
+    port = _free_port()
+    procs = [ctx.Process(target=_worker,
+                         args=(rank, world_size, port, params, events, max(1, threads // world_size)),
+                         name=f"ddp-rank-{rank}", daemon=False)
+             for rank in range(world_size)]
+    for p in procs:
+        p.start()
+
+    progress = _Progress(world_size, on_update)
+    result, errors = None, {}
+
+    def handle(kind, rank, payload):
+        nonlocal result
+        if kind == "state":
+            progress.update(rank, payload)
+        elif kind == "result":
+            result = payload
+        elif kind == "error":
+            errors[rank] = payload
+
+    started = time.time()
+    cancelled = False
+    while True:
+        try:
+            handle(*events.get(timeout=poll_interval))
+            if not (cancel is not None and cancel.is_set()):
+                continue
+        except queue.Empty:
+            pass
+        if cancel is not None and cancel.is_set() and not cancelled:
+            cancelled = True
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+        if any(p.exitcode not in (None, 0) for p in procs):
+            # один ранг упав — інші зависнуть на all-reduce, зупиняємо їх
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+        if all(p.exitcode is not None for p in procs):
+            break
+    for p in procs:
+        p.join()
+    # залишок подій після завершення процесів
+    while True:
+        try:
+            handle(*events.get_nowait())
+        except queue.Empty:
+            break
+
+    if cancelled:
+        raise TrainingCancelled(f"Training cancelled after {time.time() - started:.1f}s")
+    failed = {p.name: p.exitcode for p in procs if p.exitcode != 0}
+    if errors or failed or result is None:
+        detail = "; ".join(f"rank {r}: {msg}" for r, msg in sorted(errors.items())) or str(failed)
+        raise RuntimeError(f"Distributed training failed ({detail})")
+    print(f"[INFO] Training run with {world_size} process(es) finished in {time.time() - started:.1f}s")
+    return result
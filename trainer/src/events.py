@@ -0,0 +1,163 @@
+# trainer/src/events.py
+import json
+import threading
+import time
+from collections import deque
+import numpy as np
+from telemetry import summarize
+
+# Найменший інтервал між подіями: часті оновлення стану зливаються в одну подію
+SSE_MIN_INTERVAL = 0.5
+# Коментар-heartbeat, щоб проксі не закривали простоюче з'єднання
+SSE_HEARTBEAT = 15.0
+STATE_KEYS = ("status", "progress", "epoch", "step", "total_steps", "loss", "accuracy", "last_error")
+
+
+def format_event(event_id, kind, data):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class EventHub:
+    """
+    One producer thread turns training progress into Server-Sent Events for any number of
+    watchers. It wakes on state changes (at most once per `min_interval`, so bursts coalesce
+    into one event), serializes each event once and keeps the last `history` of them; a watcher
+    just sends the events it has not seen yet. New step points from the telemetry ring ride
+    along in each event, so the curve on the client has no gaps.
+
+    state_fn() returns the state dict; ring_fn() returns (run_id, StepRing) of the latest run.
+    """
+
+    def __init__(self, state_fn, ring_fn, min_interval=SSE_MIN_INTERVAL, history=256,
+                 max_points=200):
+        self.state_fn = state_fn
+        self.ring_fn = ring_fn
+        self.min_interval = min_interval
+        self.max_points = max_points
+        self.watchers = 0
+        self.published = 0
+        self._events = deque(maxlen=history)
+        self._version = 0
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_state = None
+        self._run_id = None
+        self._last_step = 0
+        self._last_head = 0
+
+    def notify(self, *_):
+        """State changed (cheap; called from set_state listeners)."""
+        self._wake.set()
+
+    def _ensure_producer(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._produce, name="sse-producer", daemon=True)
+                self._thread.start()
+
+    def _produce(self):
+        last_publish = 0.0
+        while True:
+            # без змін стану все одно перевіряємо нові кроки телеметрії раз на секунду
+            self._wake.wait(timeout=1.0)
+            pause = self.min_interval - (time.monotonic() - last_publish)
+            if pause > 0:
+                time.sleep(pause)
+            self._wake.clear()
+            if self.watchers == 0:
+                continue
+            event = self._collect()
+            if event is not None:
+                self._publish(*event)
+                last_publish = time.monotonic()
+
+    def _collect(self):
+        st = {k: v for k, v in self.state_fn().items() if k in STATE_KEYS}
+        run_id, ring = self.ring_fn()
+        kind = "progress"
+        if run_id != self._run_id:
+            self._run_id, self._last_step, self._last_head = run_id, 0, 0
+            kind = "run"
+        points = self._new_points(ring)
+        if kind == "progress" and st == self._last_state and not points:
+            return None
+        self._last_state = st
+        data = dict(st, run_id=run_id)
+        if points:
+            data["points"] = points
+        return kind, data
+
+    def _new_points(self, ring):
+        if ring is None or ring.head == self._last_head:
+            return None
+        head = ring.head
+        snap = ring.snapshot(last=head - self._last_head)
+        self._last_head = head
+        new = snap["step"] > self._last_step
+        if not new.any():
+            return None
+        steps = snap["step"][new]
+        self._last_step = int(steps[-1])
+        stride = max(1, -(-len(steps) // self.max_points))
+        pick = np.arange(len(steps) - 1, -1, -stride)[::-1]
+        return {"step": [int(s) for s in steps[pick]],
+                **{name: [None if np.isnan(v) else round(float(v), 5) for v in snap[name][new][pick]]
+                   for name in ("loss", "images_per_sec")}}
+
+    def _publish(self, kind, data):
+        with self._cond:
+            self._version += 1
+            self._events.append((self._version, format_event(self._version, kind, data)))
+            self.published += 1
+            self._cond.notify_all()
+
+    def snapshot_event(self):
+        """Full state plus the recent curve, sent once to each new watcher."""
+        st = {k: v for k, v in self.state_fn().items() if k in STATE_KEYS}
+        run_id, ring = self.ring_fn()
+        data = dict(st, run_id=run_id)
+        if ring is not None:
+            series = summarize(ring, points=self.max_points, window=1).get("series", {})
+            data["points"] = {k: series[k] for k in ("step", "loss", "images_per_sec") if k in series}
+        with self._cond:
+            version = self._version
+        return version, format_event(version, "snapshot", data)
+
+    def stream(self, last_event_id=None, heartbeat=SSE_HEARTBEAT):
+        """Generator of SSE text for one watcher."""
+        self._ensure_producer()
+        with self._cond:
+            self.watchers += 1
+        self._wake.set()
+        try:
+            with self._cond:
+                oldest = self._events[0][0] if self._events else self._version + 1
+            if last_event_id is not None and oldest <= last_event_id + 1:
+                # перепідключення: досилаємо пропущені події з історії
+                seen = last_event_id
+            else:
+                seen, payload = self.snapshot_event()
+                yield payload
+            while True:
+                with self._cond:
+                    if self._version == seen:
+                        self._cond.wait(timeout=heartbeat)
+                    pending = [text for v, text in self._events if v > seen]
+                    lost = self._events and self._events[0][0] > seen + 1
+                    seen = self._version
+                if lost:
+                    # клієнт відстав більше, ніж на історію подій: повний знімок замість дірок
+                    seen, payload = self.snapshot_event()
+                    yield payload
+                elif pending:
+                    yield "".join(pending)
+                else:
+                    yield ": ping\n\n"
+        finally:
+            with self._cond:
+                self.watchers -= 1
+
+    def stats(self):
+        with self._cond:
+            return {"watchers": self.watchers, "published": self.published, "version": self._version}
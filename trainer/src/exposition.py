@@ -0,0 +1,97 @@
+# trainer/src/exposition.py
+import threading
+import numpy as np
+
+# Межі (секунди) гістограми часу кроку тренування
+STEP_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class StepHistogram:
+    """
+    Cumulative histogram of training step times plus step/image counters, fed from StepRing
+    rows. Every update() consumes only the rows written since the previous one (per run), so
+    the values only grow, as Prometheus counters must, however often it is scraped.
+    """
+
+    def __init__(self, buckets=STEP_BUCKETS):
+        self.bounds = np.asarray(buckets, dtype=np.float64)
+        self.buckets = np.zeros(len(buckets) + 1, dtype=np.int64)
+        self.sum = 0.0
+        self.count = 0
+        self.steps = 0
+        self.images = 0.0
+        self._seen = {}  # run_id -> (head, time останнього врахованого рядка)
+        self._lock = threading.Lock()
+
+    def update(self, rings):
+        """rings: [(run_id, StepRing)]; runs that are no longer listed are forgotten."""
+        with self._lock:
+            self._seen = {run_id: seen for run_id, seen in self._seen.items()
+                          if any(run_id == r for r, _ in rings)}
+            for run_id, ring in rings:
+                head = ring.head
+                seen_head, seen_time = self._seen.get(run_id, (0, -np.inf))
+                if head <= seen_head:
+                    continue
+                # запас рядків: письменник міг дописати ще блок між head і snapshot
+                snap = ring.snapshot(last=head - seen_head + 64)
+                new = snap["time"] > seen_time
+                if not new.any():
+                    continue
+                step_s = snap["step_ms"][new] / 1000.0
+                images = snap["images_per_sec"][new] * step_s
+                timed = ~np.isnan(step_s)
+                self.steps += int(new.sum())
+                self.images += float(np.nansum(images))
+                self.count += int(timed.sum())
+                self.sum += float(step_s[timed].sum())
+                idx = np.searchsorted(self.bounds, step_s[timed], side="left")
+                self.buckets += np.bincount(idx, minlength=len(self.buckets))
+                self._seen[run_id] = (head, float(snap["time"][new].max()))
+
+    def lines(self, name):
+        with self._lock:
+            out = [f"# HELP {name} Training step time (rank 0; DDP steps include gradient all-reduce).",
+                   f"# TYPE {name} histogram"]
+            total = 0
+            for bound, n in zip(list(self.bounds) + [None], self.buckets):
+                total += int(n)
+                le = "+Inf" if bound is None else repr(float(bound))
+                out.append(f'{name}_bucket{{le="{le}"}} {total}')
+            out += [f"{name}_sum {self.sum!r}", f"{name}_count {self.count}",
+                    "# HELP ai_trainer_steps_total Training steps recorded in telemetry.",
+                    "# TYPE ai_trainer_steps_total counter",
+                    f"ai_trainer_steps_total {self.steps}",
+                    "# HELP ai_trainer_images_total Training images processed.",
+                    "# TYPE ai_trainer_images_total counter",
+                    f"ai_trainer_images_total {round(self.images, 1)!r}"]
+            return out
+
+
+def _gauge(out, name, doc, value, labels=""):
+    out += [f"# HELP {name} {doc}", f"# TYPE {name} gauge"]
+    if value is not None:
+        out.append(f"{name}{labels} {float(value)!r}")
+
+
+def render(state, queue, moving, histogram):
+    """
+    Prometheus text format of ai_trainer: step-time histogram and counters, moving averages
+    of the latest run (`moving` from telemetry.summarize), run state and job queue.
+    """
+    out = histogram.lines("ai_trainer_step_duration_seconds")
+    _gauge(out, "ai_trainer_images_per_second", "Training throughput, moving average of the latest run.",
+           moving.get("images_per_sec"))
+    _gauge(out, "ai_trainer_loss", "Training loss, moving average of the latest run.", moving.get("loss"))
+    _gauge(out, "ai_trainer_learning_rate", "Current learning rate.", moving.get("lr"))
+    _gauge(out, "ai_trainer_progress_ratio", "Progress of the latest run (0..1).",
+           (state.get("progress") or 0) / 100.0)
+    _gauge(out, "ai_trainer_epoch", "Current epoch of the latest run.", state.get("epoch"))
+    _gauge(out, "ai_trainer_accuracy", "Validation accuracy of the latest run.", state.get("accuracy"))
+    _gauge(out, "ai_trainer_running", "1 while a training run is in progress.",
+           1 if state.get("status") == "training" else 0)
+    out += ["# HELP ai_trainer_jobs Jobs in the training queue by status.", "# TYPE ai_trainer_jobs gauge"]
+    for status in ("queued", "running", "done", "failed", "cancelled"):
+        out.append(f'ai_trainer_jobs{{status="{status}"}} {queue.get("jobs", {}).get(status, 0)}')
+    return "\n".join(out) + "\n"
@@ -1,28 +1,256 @@
 # trainer/src/registry.py
+import fcntl
+import hashlib
+import json
 import os
-from datetime import datetime
 import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import torch
+from weights import save_weights, SUFFIX
+
+MODELS_DIR = os.getenv("MODELS_DIR", "/models")  # will be mounted as volume from docker-compose
 
-MODELS_DIR = "/models"  # will be mounted as volume from docker-compose
+# Артефакти зберігаються один раз під своїм sha256; версії й model_latest.pth — посилання на них
+OBJECTS_DIR = os.path.join(MODELS_DIR, "objects")
+MANIFEST_PATH = os.path.join(MODELS_DIR, "manifest.json")
+LOCK_PATH = os.path.join(MODELS_DIR, ".registry.lock")
+LATEST_NAME = "model_latest.pth"
+
+# Ретеншн: зберігаються останні N і найкращі K (за accuracy) версій, плюс поточна latest; 0 = без обмеження
+REGISTRY_KEEP_LAST = int(os.getenv("REGISTRY_KEEP_LAST", "10"))
+REGISTRY_KEEP_BEST = int(os.getenv("REGISTRY_KEEP_BEST", "3"))
 
 os.makedirs(MODELS_DIR, exist_ok=True)
 
-def save_model_state(state_dict):
-    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    name = f"model_v{ts}.pth"
-    path = os.path.join(MODELS_DIR, name)
-    # caller should save torch.save(state_dict, path)
-    return path, name
+_cache = {"stamp": None, "manifest": None}
+
+
+@contextmanager
+def _locked():
+    # тренування йдуть в окремих процесах (кілька задач, DDP) — лок на рівні файлової системи
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    with open(LOCK_PATH, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 
-def set_latest(path):
-    latest = os.path.join(MODELS_DIR, "model_latest.pth")
+def _write_manifest(manifest):
+    tmp = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp, MANIFEST_PATH)
+    _cache["stamp"] = None
+
+
+def _link(target_name, link_path):
+    """Atomically point `link_path` at objects/<target_name>: symlink, else hardlink, else copy."""
+    tmp = f"{link_path}.{os.getpid()}.tmp"
+    target = os.path.join(OBJECTS_DIR, target_name)
     try:
-        # atomic replace
-        if os.path.exists(latest):
-            os.remove(latest)
-        shutil.copy2(path, latest)
-    except Exception:
-        shutil.copy2(path, latest)  # fallback
+        os.symlink(os.path.relpath(target, os.path.dirname(link_path)), tmp)
+    except OSError:
+        try:
+            os.link(target, tmp)
+        except OSError:
+            shutil.copy2(target, tmp)
+    # rename поверх старого файлу: читач бачить або стару, або нову модель, без проміжку
+    os.replace(tmp, link_path)
+
+
+def _store_object(src):
+    """Move a finished file into objects/ under its hash (dedup: identical content kept once)."""
+    digest = _sha256(src)
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    obj = os.path.join(OBJECTS_DIR, f"{digest}.pth")
+    if os.path.exists(obj):
+        os.remove(src)
+    else:
+        os.replace(src, obj)
+    return digest, os.path.getsize(obj)
+
+
+def _import_existing():
+    """One-time migration: plain model_v*.pth files from before the manifest become entries."""
+    manifest = {"versions": {}, "latest": None}
+    latest_path = os.path.join(MODELS_DIR, LATEST_NAME)
+    latest_hash = None
+    if os.path.isfile(latest_path) and not os.path.islink(latest_path):
+        latest_hash = _sha256(latest_path)
+    for f in sorted(os.listdir(MODELS_DIR)):
+        path = os.path.join(MODELS_DIR, f)
+        if not (f.startswith("model_v") and f.endswith(".pth")) or os.path.islink(path):
+            continue
+        name = f[:-4]
+        created = os.path.getmtime(path)
+        digest, size = _store_object(path)
+        mapped = os.path.join(OBJECTS_DIR, f"{digest}{SUFFIX}")
+        if not os.path.exists(mapped):
+            save_weights(torch.load(os.path.join(OBJECTS_DIR, f"{digest}.pth"), map_location="cpu"), mapped)
+        _link(f"{digest}.pth", path)
+        manifest["versions"][name] = {"version": name, "hash": digest, "accuracy": None,
+                                      "size": size, "created_at": created}
+    if manifest["versions"]:
+        # стара копія model_latest.pth — це одна з версій, якщо хеш збігається; інакше найновіша
+        same = [e for e in manifest["versions"].values() if e["hash"] == latest_hash]
+        latest = same[0] if same else max(manifest["versions"].values(), key=lambda e: e["created_at"])
+        manifest["latest"] = latest["version"]
+        _link(f"{latest['hash']}.pth", latest_path)
+    return manifest
+
+
+def _read_manifest(migrate=False):
+    # Викликається під _locked(), якщо migrate=True: flock на другому дескрипторі заблокував би той самий процес
+    if not os.path.exists(MANIFEST_PATH):
+        if not migrate:
+            # читачі не запускають міграцію: її робить migrate() на старті або перший запис
+            return {"versions": {}, "latest": None}
+        _write_manifest(_import_existing())
+    st = os.stat(MANIFEST_PATH)
+    stamp = (st.st_mtime_ns, st.st_size)
+    if _cache["stamp"] != stamp:
+        with open(MANIFEST_PATH, "r") as f:
+            _cache["manifest"] = json.load(f)
+        _cache["stamp"] = stamp
+    return _cache["manifest"]
+
+
+def load_manifest():
+    """Manifest index {"versions": {name: entry}, "latest": name}; re-read only when the file changes."""
+    return _read_manifest()
+
+
+def migrate():
+    """Create the manifest from pre-registry model_v*.pth files if there is none yet (run at startup)."""
+    if os.path.exists(MANIFEST_PATH):
+        return
+    with _locked():
+        _read_manifest(migrate=True)
+
+
+def _new_name(manifest):
+    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    name, i = f"model_v{ts}", 1
+    while name in manifest["versions"]:
+        name, i = f"model_v{ts}_{i}", i + 1
+    return name
+
+
+def register_model(state_dict, accuracy=None, extra=None, publish=True):
+    """
+    Save a state dict as a new registry version: serialized once into objects/<sha256>.pth
+    (deduplicated) plus objects/<sha256>.safetensors, linked as <name>.pth, recorded in the manifest and, with publish=True,
+    made the latest. Retention runs afterwards. Returns the manifest entry.
+    """
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    tmp = os.path.join(OBJECTS_DIR, f".incoming.{os.getpid()}.{time.time_ns()}.pth")
+    # через файловий об'єкт: ім'я архіву в zip не залежить від імені файлу, тож однакові ваги дають однакові байти
+    with open(tmp, "wb") as f:
+        torch.save(state_dict, f)
+
+    with _locked():
+        # під локом: GC не видалить щойно знайдений однаковий об'єкт до появи посилання на нього
+        digest, size = _store_object(tmp)
+        # поруч — ті самі ваги у форматі для memory-mapped завантаження в ai_api
+        mapped = os.path.join(OBJECTS_DIR, f"{digest}{SUFFIX}")
+        if not os.path.exists(mapped):
+            save_weights(state_dict, mapped)
+        manifest = dict(_read_manifest(migrate=True))
+        manifest["versions"] = dict(manifest["versions"])
+        name = _new_name(manifest)
+        entry = {"version": name, "hash": digest, "accuracy": accuracy, "size": size,
+                 "created_at": time.time()}
+        if extra:
+            entry.update(extra)
+        _link(f"{digest}.pth", os.path.join(MODELS_DIR, f"{name}.pth"))
+        manifest["versions"][name] = entry
+        if publish:
+            _link(f"{digest}.pth", os.path.join(MODELS_DIR, LATEST_NAME))
+            manifest["latest"] = name
+        _write_manifest(manifest)
+        removed = _apply_retention(manifest)
+    if removed:
+        print(f"[INFO] Registry GC removed {removed}")
+    return entry
+
+
+def set_latest(name):
+    """Atomically repoint model_latest.pth at registry version `name` (e.g. a rollback)."""
+    with _locked():
+        manifest = dict(_read_manifest(migrate=True))
+        entry = manifest["versions"].get(name)
+        if entry is None:
+            raise KeyError(f"Unknown model version: {name}")
+        _link(f"{entry['hash']}.pth", os.path.join(MODELS_DIR, LATEST_NAME))
+        manifest["latest"] = name
+        _write_manifest(manifest)
+    return entry
+
+
+def get_model(name):
+    """Manifest entry of a version, or None (dictionary lookup, no directory scan)."""
+    return load_manifest()["versions"].get(name)
+
 
 def list_models():
-    return sorted([f for f in os.listdir(MODELS_DIR) if f.endswith(".pth")])
+    """Registry entries, newest first."""
+    manifest = load_manifest()
+    entries = sorted(manifest["versions"].values(), key=lambda e: e["created_at"], reverse=True)
+    return [dict(e, latest=e["version"] == manifest["latest"]) for e in entries]
+
+
+def _apply_retention(manifest, keep_last=None, keep_best=None):
+    # Викликається під _locked(). Повертає імена видалених версій.
+    keep_last = REGISTRY_KEEP_LAST if keep_last is None else keep_last
+    keep_best = REGISTRY_KEEP_BEST if keep_best is None else keep_best
+    if keep_last <= 0 and keep_best <= 0:
+        return []
+    entries = list(manifest["versions"].values())
+    keep = {manifest["latest"]}
+    if keep_last > 0:
+        keep.update(e["version"] for e in sorted(entries, key=lambda e: e["created_at"], reverse=True)[:keep_last])
+    if keep_best > 0:
+        scored = [e for e in entries if e.get("accuracy") is not None]
+        keep.update(e["version"] for e in sorted(scored, key=lambda e: e["accuracy"], reverse=True)[:keep_best])
+    removed = [e["version"] for e in entries if e["version"] not in keep]
+    if not removed:
+        return []
+
+    versions = {n: e for n, e in manifest["versions"].items() if n in keep}
+    manifest = dict(manifest, versions=versions)
+    _write_manifest(manifest)
+    # посилання версії та експорти ai_api поруч із нею (<name>.<backend>.ts)
+    prefixes = tuple(f"{name}." for name in removed)
+    for f in os.listdir(MODELS_DIR):
+        if f.startswith(prefixes):
+            try:
+                os.remove(os.path.join(MODELS_DIR, f))
+            except OSError:
+                pass
+    # об'єкт видаляється, лише коли на нього не посилається жодна версія
+    live = {e["hash"] for e in versions.values()}
+    for f in os.listdir(OBJECTS_DIR):
+        if not f.startswith(".") and f.split(".", 1)[0] not in live:
+            try:
+                os.remove(os.path.join(OBJECTS_DIR, f))
+            except OSError:
+                pass
+    return removed
+
+
+def gc(keep_last=None, keep_best=None):
+    """Apply the retention policy now; returns the removed version names."""
+    with _locked():
+        return _apply_retention(_read_manifest(migrate=True), keep_last, keep_best)
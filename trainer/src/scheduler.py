@@ -0,0 +1,327 @@
+# trainer/src/scheduler.py
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from checkpoint import new_run_id, checkpoint_path
+
+TRAIN_JOB_DIR = os.getenv("TRAIN_JOB_DIR", "/trainer_logs/jobs")
+# Скільки запусків можуть тренуватися одночасно (кожен — окремі процеси)
+TRAIN_MAX_CONCURRENT = int(os.getenv("TRAIN_MAX_CONCURRENT", "1"))
+# Оцінка пам'яті на один процес тренування; новий запуск стартує, лише якщо стільки є вільної
+TRAIN_JOB_MEMORY_MB = int(os.getenv("TRAIN_JOB_MEMORY_MB", "2048"))
+TRAIN_MAX_SWEEP_RUNS = int(os.getenv("TRAIN_MAX_SWEEP_RUNS", "100"))
+# Скільки завершених задач зберігати в історії
+TRAIN_JOB_HISTORY = int(os.getenv("TRAIN_JOB_HISTORY", "200"))
+
+FINAL_STATUSES = ("done", "failed", "cancelled")
+
+
+class RunAlreadyActive(Exception):
+    """A queued or running job already trains this run_id."""
+
+    def __init__(self, job):
+        super().__init__(f"Run {job['params']['run_id']} is already {job['status']} as job {job['id']}")
+        self.job = job
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo (Linux), None if unknown."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def expand_sweep(sweep, base=None):
+    """
+    Run specs of a sweep over /train params (usually epochs / batch_size / lr):
+      {"grid": {"lr": [1e-3, 1e-4], "batch_size": [32, 64]}}            -> every combination
+      {"random": {"lr": {"min": 1e-4, "max": 1e-2, "log": true},
+                  "batch_size": [32, 64]}, "trials": 8, "seed": 0}      -> `trials` samples
+    Every spec starts from `base`.
+    """
+    base = dict(base or {})
+    if "grid" in sweep:
+        grid = sweep["grid"]
+        keys = sorted(grid)
+        specs = [dict(base, **dict(zip(keys, combo))) for combo in itertools.product(*(grid[k] for k in keys))]
+    elif "random" in sweep:
+        space = sweep["random"]
+        rng = random.Random(sweep.get("seed", 0))
+        specs = []
+        for _ in range(int(sweep.get("trials", 1))):
+            spec = dict(base)
+            for key in sorted(space):
+                spec[key] = _sample(rng, space[key])
+            specs.append(spec)
+    else:
+        raise ValueError("sweep must contain 'grid' or 'random'")
+    if not specs:
+        raise ValueError("sweep is empty")
+    if len(specs) > TRAIN_MAX_SWEEP_RUNS:
+        raise ValueError(f"sweep has {len(specs)} runs, max is {TRAIN_MAX_SWEEP_RUNS}")
+    return specs
+
+
+def _sample(rng, dim):
+    if isinstance(dim, list):
+        return rng.choice(dim)
+    if isinstance(dim, dict):
+        lo, hi = dim["min"], dim["max"]
+        if dim.get("log"):
+            value = math.exp(rng.uniform(math.log(lo), math.log(hi)))
+        else:
+            value = rng.uniform(lo, hi)
+        return int(round(value)) if isinstance(lo, int) and isinstance(hi, int) else value
+    return dim
+
+
+class TrainScheduler:
+    """
+    Persistent queue of training runs. Each job is a params dict for train_one_run; jobs are
+    started in submission order, at most `max_concurrent` at a time and only while the CPU
+    (one core per process) and free memory allow another one. Job records are mirrored to
+    JSON files in `store_dir`; after a restart queued jobs run again and interrupted ones
+    resume from their checkpoint.
+
+    `run(params, on_update, cancel, threads)` executes one job, reports progress through
+    `on_update(**fields)`, stops when the `cancel` event is set and returns the run metadata.
+    """
+
+    def __init__(self, run, max_concurrent=TRAIN_MAX_CONCURRENT, store_dir=TRAIN_JOB_DIR,
+                 job_memory_mb=TRAIN_JOB_MEMORY_MB, history=TRAIN_JOB_HISTORY):
+        self.run = run
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.store_dir = store_dir
+        self.job_memory_mb = job_memory_mb
+        self.history = history
+        self._jobs = {}
+        self._order = []
+        self._running = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    # --- lifecycle ---
+
+    def start(self):
+        """Load persisted jobs and start the dispatcher thread (only in the API process)."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._restore()
+            self._thread = threading.Thread(target=self._dispatch, name="train-scheduler", daemon=True)
+            self._thread.start()
+
+    def _restore(self):
+        if not self.store_dir:
+            return
+        os.makedirs(self.store_dir, exist_ok=True)
+        jobs = []
+        for name in os.listdir(self.store_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.store_dir, name), "r") as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        for job in sorted(jobs, key=lambda j: j["created_at"]):
+            if job["status"] == "running":
+                # контейнер перезапустився посеред тренування: продовжуємо з чекпоінта
+                path = checkpoint_path(job["params"]["run_id"])
+                if os.path.exists(path):
+                    job["params"]["resume_from"] = path
+                job.update(status="queued", started_at=None, eta_sec=None, steps_per_sec=None)
+                job["restarts"] = job.get("restarts", 0) + 1
+                self._persist(job)
+            self._jobs[job["id"]] = job
+            self._order.append(job["id"])
+
+    # --- public API ---
+
+    def submit(self, params_list, sweep_id=None, exclusive=False):
+        """
+        Queue runs (validated params dicts); returns their job records. With `exclusive`, raises
+        RunAlreadyActive if a queued or running job has the same run_id as one of the runs.
+        """
+        records = []
+        with self._cond:
+            if exclusive:
+                for params in params_list:
+                    active = self._active_job(params.get("run_id"))
+                    if active is not None:
+                        raise RunAlreadyActive(dict(active))
+            for params in params_list:
+                job_id = new_run_id()
+                params = dict(params)
+                # run_id = id задачі: чекпоінти запуску знаходяться за ним після перезапуску
+                params.setdefault("run_id", job_id)
+                job = {
+                    "id": job_id,
+                    "status": "queued",
+                    "params": params,
+                    "sweep_id": sweep_id,
+                    "created_at": time.time(),
+                    "started_at": None,
+                    "finished_at": None,
+                    "progress": 0.0,
+                    "step": 0,
+                    "total_steps": None,
+                    "steps_per_sec": None,
+                    "eta_sec": None,
+                    "result": None,
+                    "error": None,
+                }
+                self._jobs[job_id] = job
+                self._order.append(job_id)
+                self._persist(job)
+                records.append(dict(job))
+            self._cond.notify_all()
+        return records
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns its record, or None if unknown."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == "queued":
+                job.update(status="cancelled", finished_at=time.time())
+                self._persist(job)
+            elif job["status"] == "running":
+                self._running[job_id].set()
+            return dict(job)
+
+    def _active_job(self, run_id):
+        if run_id is None:
+            return None
+        return next((job for job in self._jobs.values()
+                     if job["status"] in ("queued", "running") and job["params"].get("run_id") == run_id), None)
+
+    def get(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list(self, status=None):
+        with self._cond:
+            return [dict(self._jobs[j]) for j in self._order
+                    if status is None or self._jobs[j]["status"] == status]
+
+    def stats(self):
+        with self._cond:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": list(self._running),
+                "jobs": counts,
+                "available_memory_mb": available_memory_mb(),
+            }
+
+    # --- scheduling ---
+
+    def _procs(self, job):
+        return int(job["params"].get("world_size", 1))
+
+    def _can_start(self, job):
+        if not self._running:
+            return True
+        if len(self._running) >= self.max_concurrent:
+            return False
+        busy = sum(self._procs(self._jobs[j]) for j in self._running)
+        if busy + self._procs(job) > (os.cpu_count() or 1):
+            return False
+        free = available_memory_mb()
+        return free is None or free >= self.job_memory_mb * self._procs(job)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                nxt = next((self._jobs[j] for j in self._order if self._jobs[j]["status"] == "queued"), None)
+                if nxt is None or not self._can_start(nxt):
+                    # пам'ять звільняється й без подій — перевіряємо періодично
+                    self._cond.wait(timeout=5.0)
+                    continue
+                cancel = threading.Event()
+                self._running[nxt["id"]] = cancel
+                nxt.update(status="running", started_at=time.time())
+                self._persist(nxt)
+                # потоки torch ділимо між задачами, що можуть іти одночасно
+                threads = max(1, (os.cpu_count() or 1) // self.max_concurrent)
+            threading.Thread(target=self._execute, args=(nxt, cancel, threads),
+                             name=f"train-job-{nxt['id']}", daemon=True).start()
+
+    def _execute(self, job, cancel, threads):
+        rate = {"t0": None, "step0": 0}
+
+        def on_update(**fields):
+            now = time.time()
+            with self._cond:
+                job.update({k: fields[k] for k in ("progress", "epoch", "loss", "accuracy",
+                                                   "step", "total_steps") if k in fields})
+                if "step" in fields:
+                    # швидкість міряємо з першого звіту: без старту процесів і завантаження даних
+                    if rate["t0"] is None:
+                        rate["t0"], rate["step0"] = now, fields["step"]
+                    elif fields["step"] > rate["step0"]:
+                        sps = (fields["step"] - rate["step0"]) / (now - rate["t0"])
+                        job["steps_per_sec"] = round(sps, 3)
+                        if job.get("total_steps"):
+                            job["eta_sec"] = round((job["total_steps"] - fields["step"]) / sps, 1)
+
+        try:
+            result = self.run(job["params"], on_update, cancel, threads)
+            status, error = "done", None
+        except Exception as e:
+            result, error = None, str(e)
+            status = "cancelled" if cancel.is_set() else "failed"
+
+        with self._cond:
+            job.update(status=status, error=error, finished_at=time.time(), eta_sec=None)
+            if result is not None:
+                job["result"] = {k: result.get(k) for k in ("model_name", "accuracy", "loss",
+                                                            "train_time_sec", "throughput_img_per_sec")}
+                job["progress"] = 100.0
+            self._running.pop(job["id"], None)
+            self._persist(job)
+            self._prune()
+            self._cond.notify_all()
+
+    # --- persistence ---
+
+    def _path(self, job_id):
+        return os.path.join(self.store_dir, f"{job_id}.json")
+
+    def _persist(self, job):
+        if not self.store_dir:
+            return
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._path(job["id"])
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(job, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _prune(self):
+        finished = [j for j in self._order if self._jobs[j]["status"] in FINAL_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            self._jobs.pop(job_id, None)
+            self._order.remove(job_id)
+            if self.store_dir:
+                try:
+                    os.remove(self._path(job_id))
+                except OSError:
+                    pass
@@ -8,30 +8,55 @@ state = {
     "status": "idle",    # idle / training / done / failed / cancelled
     "progress": 0.0,     # 0..100
     "epoch": 0,
+    "step": 0,
+    "total_steps": None,
     "accuracy": None,
     "loss": None,
     "started_at": None,
     "finished_at": None,
-    "last_error": None
+    "last_error": None,
+    "ranks": None        # прогрес кожного DDP-процесу (world_size > 1)
 }
 
+# У DDP-процесах set_state() ще й пересилає оновлення батьківському процесу
+_forward = None
+# Виклики після кожного оновлення (напр. будить продюсера SSE-подій)
+_listeners = []
+
+def set_forwarder(fn):
+    global _forward
+    _forward = fn
+
+def add_listener(fn):
+    _listeners.append(fn)
+
 def set_state(**kwargs):
+    # copy-on-write: словник стану ніколи не змінюється на місці, лише замінюється,
+    # тож get_state() читає без локу; лок лише впорядковує записувачів
+    global state
     with _lock:
-        state.update(kwargs)
+        new_state = dict(state)
+        new_state.update(kwargs)
+        state = new_state
+    if _forward is not None:
+        _forward(kwargs)
+    for fn in _listeners:
+        fn(kwargs)
 
 def get_state():
-    with _lock:
-        return dict(state)
+    return dict(state)
 
 def reset_state():
-    with _lock:
-        state.update({
-            "status": "idle",
-            "progress": 0.0,
-            "epoch": 0,
-            "accuracy": None,
-            "loss": None,
-            "started_at": None,
-            "finished_at": None,
-            "last_error": None
-        })
+    set_state(**{
+        "status": "idle",
+        "progress": 0.0,
+        "epoch": 0,
+        "step": 0,
+        "total_steps": None,
+        "accuracy": None,
+        "loss": None,
+        "started_at": None,
+        "finished_at": None,
+        "last_error": None,
+        "ranks": None
+    })
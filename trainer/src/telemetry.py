@@ -0,0 +1,171 @@
+# trainer/src/telemetry.py
+import os
+import tempfile
+import time
+import uuid
+import numpy as np
+import torch
+
+# Кільцевий буфер метрик кроків у memory-mapped файлі: пише процес тренування, читає API
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+TELEMETRY_CAPACITY = int(os.getenv("TELEMETRY_CAPACITY", "65536"))
+
+FIELDS = ("step", "epoch", "time", "loss", "lr", "images_per_sec", "step_ms")
+_COL = {name: i for i, name in enumerate(FIELDS)}
+
+
+class StepRing:
+    """
+    Preallocated ring buffer of per-step metrics ([capacity, len(FIELDS)] float64) in a shared
+    memory-mapped file. Row 0 is the header: [head, capacity]; head counts rows ever written.
+
+    There is a single writer (the training process). write() fills the slots first and only
+    then publishes the new head with one aligned 8-byte store, so readers never take a lock:
+    snapshot() copies the rows, re-reads head and drops the rows the writer may have started
+    to overwrite meanwhile.
+    """
+
+    def __init__(self, path, capacity=None, create=False):
+        self.path = path
+        if create:
+            self._buf = np.memmap(path, dtype=np.float64, mode="w+", shape=(capacity + 1, len(FIELDS)))
+            self._buf[0, 1] = capacity
+        else:
+            self._buf = np.memmap(path, dtype=np.float64, mode="r+")
+            self._buf = self._buf.reshape(-1, len(FIELDS))
+        self.capacity = int(self._buf[0, 1])
+        self._rows = self._buf[1:]
+
+    @classmethod
+    def create(cls, capacity=TELEMETRY_CAPACITY, directory=TELEMETRY_DIR):
+        path = os.path.join(directory, f"trainer_telemetry_{uuid.uuid4().hex}.bin")
+        return cls(path, capacity, create=True)
+
+    @property
+    def head(self):
+        return int(self._buf[0, 0])
+
+    def write(self, block):
+        """Append rows ([n, len(FIELDS)]); only the training process calls this."""
+        n = len(block)
+        if n == 0:
+            return
+        head = self.head
+        block = block[-self.capacity:]
+        start = (head + n - len(block)) % self.capacity
+        first = min(len(block), self.capacity - start)
+        self._rows[start:start + first] = block[:first]
+        self._rows[:len(block) - first] = block[first:]
+        self._buf[0, 0] = head + n
+
+    def snapshot(self, last=None, margin=1024):
+        """
+        Up to `last` most recent rows as {field: array}, oldest first. `margin` rows at the old
+        end are never returned: the writer may be filling them for its next block.
+        """
+        margin = min(margin, self.capacity // 2)
+        h1 = self.head
+        n = min(h1, self.capacity - margin)
+        if last is not None:
+            n = min(n, last)
+        idx = np.arange(h1 - n, h1) % self.capacity
+        rows = self._rows[idx]
+        h2 = self.head
+        # рядки, які письменник встиг перезаписати під час копіювання, відкидаємо
+        stale = max(0, (h2 + margin) - self.capacity - (h1 - n))
+        rows = rows[min(stale, len(rows)):]
+        return {name: rows[:, i] for name, i in _COL.items()}
+
+    def close(self):
+        self._buf = self._rows = None
+
+    def unlink(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class StepRecorder:
+    """
+    Batches per-step metrics of the training loop into StepRing writes. record() is cheap and
+    sync-free: the loss stays on the device in a preallocated tensor; flush() moves the whole
+    block to the host with one copy (call it where the loop already syncs, e.g. reporting).
+    Blocks are capped at MAX_BLOCK rows so that a write never reaches the rows readers copy.
+    """
+
+    MAX_BLOCK = 1024
+
+    def __init__(self, ring, block, device):
+        self.ring = ring
+        self.block = min(max(1, int(block)), self.MAX_BLOCK)
+        self._loss = torch.zeros(self.block, device=device)
+        self._rows = np.zeros((self.block, len(FIELDS)), dtype=np.float64)
+        self._n = 0
+        self._last = None
+
+    def record(self, step, epoch, loss, lr, images):
+        now = time.perf_counter()
+        step_s = (now - self._last) if self._last is not None else None
+        self._last = now
+        if self._n == self.block:
+            self.flush()
+        i = self._n
+        self._loss[i] = loss.detach()
+        row = self._rows[i]
+        row[0], row[1], row[2], row[4] = step, epoch, time.time(), lr
+        row[5] = images / step_s if step_s else np.nan
+        row[6] = step_s * 1000.0 if step_s else np.nan
+        self._n += 1
+
+    def flush(self):
+        n = self._n
+        if n == 0:
+            return
+        self._rows[:n, 3] = self._loss[:n].float().cpu().numpy()
+        self.ring.write(self._rows[:n])
+        self._n = 0
+
+    def pause(self):
+        """Forget the previous step time (e.g. across validation), so the gap is not counted."""
+        self._last = None
+
+
+def _rolling_mean(x, window):
+    """Trailing moving average ignoring NaNs; same length as x."""
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0))
+    ccount = np.cumsum(valid)
+    lo = np.arange(len(x)) - window
+    sums = csum - np.where(lo >= 0, csum[np.maximum(lo, 0)], 0.0)
+    counts = ccount - np.where(lo >= 0, ccount[np.maximum(lo, 0)], 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _clean(values):
+    return [None if np.isnan(v) else round(float(v), 6) for v in values]
+
+
+def summarize(ring, points=200, window=50, last=None):
+    """
+    Time series (downsampled to at most `points`, each with its `window`-step moving average)
+    and latest moving averages of loss / lr / throughput / step time from a StepRing.
+    """
+    snap = ring.snapshot(last=last)
+    n = len(snap["step"])
+    if n == 0:
+        return {"steps_recorded": ring.head, "series": {}, "moving_avg": {}}
+    window = max(1, int(window))
+    stride = max(1, -(-n // max(1, int(points))))
+    pick = np.arange(n - 1, -1, -stride)[::-1]
+    series = {"step": [int(s) for s in snap["step"][pick]], "time": _clean(snap["time"][pick])}
+    moving = {}
+    for name in ("loss", "lr", "images_per_sec", "step_ms"):
+        ma = _rolling_mean(snap[name], window)
+        series[name] = _clean(snap[name][pick])
+        series[f"{name}_ma"] = _clean(ma[pick])
+        moving[name] = _clean(ma[-1:])[0]
+    return {"steps_recorded": ring.head, "window": window, "stride": stride,
+            "series": series, "moving_avg": moving}
@@ -2,120 +2,345 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torchvision import datasets, transforms, models
-from torch.utils.data import DataLoader, random_split
+from torchvision import models
 import time
 import os
 import json
-from registry import save_model_state, set_latest
+import requests
+from contextlib import nullcontext
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from registry import register_model, MODELS_DIR
 from state import set_state, get_state
+from data import make_loaders, make_device_loaders, normalize_batch, DeviceAugment, set_loader_epoch
+from checkpoint import AsyncCheckpointer, load_checkpoint, new_run_id, rng_state, set_rng_state
+from telemetry import StepRing, StepRecorder
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print(f"[INFO] Використовується пристрій: {DEVICE}")
 
-METADATA_PATH = "/models/training_metadata.json"
+METADATA_PATH = os.path.join(MODELS_DIR, "training_metadata.json")
 
-def build_model(num_classes=10):
-    weights = models.ResNet18_Weights.DEFAULT
+AMP_MODES = ("off", "auto", "bf16", "fp16")
+
+def build_model(num_classes=10, pretrained=True):
+    weights = models.ResNet18_Weights.DEFAULT if pretrained else None
     model = models.resnet18(weights=weights)
     # replace final layer
     in_features = model.fc.in_features
     model.fc = nn.Linear(in_features, num_classes)
     return model.to(DEVICE)
 
-def train_one_run(epochs=1, batch_size=64, lr=1e-3):
+def resolve_amp(amp, device=DEVICE):
+    """
+    Autocast dtype for an `amp` mode, or None for plain fp32. 'auto' picks bf16 on CPU and on
+    GPUs that support it, fp16 otherwise. fp16 is CUDA-only (CPU autocast works in bf16).
+    """
+    if amp == "off":
+        return None
+    if amp == "auto":
+        if device.type == "cuda" and not torch.cuda.is_bf16_supported():
+            return torch.float16
+        return torch.bfloat16
+    if amp == "fp16":
+        if device.type != "cuda":
+            raise ValueError("amp='fp16' needs CUDA, use 'bf16' on CPU")
+        return torch.float16
+    if amp == "bf16":
+        return torch.bfloat16
+    raise ValueError(f"Unknown amp mode: {amp}")
+
+class StageTimer:
+    """
+    Accumulates time per training stage (load / transfer / augment / step). On CUDA the stage
+    boundaries are CUDA events, so timing does not add a device sync per batch.
+    """
+
+    def __init__(self, device):
+        self.cuda = device.type == "cuda"
+        self._marks = []
+        self._last = None
+        self.batches = 0
+
+    def _now(self):
+        if self.cuda:
+            ev = torch.cuda.Event(enable_timing=True)
+            ev.record()
+            return ev
+        return time.perf_counter()
+
+    def start(self):
+        self._last = self._now()
+
+    def mark(self, stage):
+        now = self._now()
+        self._marks.append((stage, self._last, now))
+        self._last = now
+
+    def summary(self):
+        """Average ms per batch for each stage since the last summary()."""
+        if self.cuda:
+            torch.cuda.synchronize()
+        totals = {}
+        for stage, a, b in self._marks:
+            ms = a.elapsed_time(b) if self.cuda else (b - a) * 1000.0
+            totals[stage] = totals.get(stage, 0.0) + ms
+        batches = max(1, self.batches)
+        self._marks, self.batches = [], 0
+        return {stage: round(ms / batches, 3) for stage, ms in totals.items()}
+
+def train_one_run(epochs=1, batch_size=64, lr=1e-3, num_workers=None, persistent_workers=True,
+                  prefetch_factor=2, cache_dataset=False, seed=42, data_mode="cpu",
+                  random_crop=False, random_flip=False, amp="off", channels_last=False,
+                  compile_model=False, grad_accum_steps=1, report_every=20, world_size=1, rank=0,
+                  checkpoint_every=500, run_id=None, resume_from=None, telemetry=None, synthetic=0):
+    """
+    One training run. With world_size > 1 this is one rank of a DDP job: the process group
+    must already be initialized (see distributed.run_distributed); only rank 0 saves the model
+    and metadata and returns them, other ranks return None.
+
+    Rank 0 checkpoints model, optimizer, scaler, RNG and loader position every
+    `checkpoint_every` batches (0: only at epoch ends) and after every epoch.
+    `resume_from` continues a run from such a checkpoint, mid-epoch if needed.
+    `telemetry` is the path of a StepRing that rank 0 fills with per-step metrics.
+    `synthetic` > 0 trains on that many seeded random images instead of CIFAR-10, starting from
+    random weights (no downloads) — for benchmarks and smoke runs.
+    """
+    # параметри запуску (без rank/resume_from/telemetry) зберігаються поруч із чекпоінтом для /train/resume
+    run_params = {k: v for k, v in locals().items() if k not in ("rank", "resume_from", "telemetry")}
+    run_id = run_params["run_id"] = run_id or new_run_id()
+    distributed = world_size > 1
+    is_main = rank == 0
     set_state(status="training", progress=0.0, started_at=time.time(), last_error=None)
     start_time = time.time()
+    checkpointer = None
     try:
-        # transforms for CIFAR10
-        transform = transforms.Compose([
-            transforms.Resize(224),
-            transforms.ToTensor(),
-            transforms.Normalize((0.4914, 0.4822, 0.4465),
-                                 (0.2023, 0.1994, 0.2010))
-        ])
-
-        # download dataset
-        dataset = datasets.CIFAR10(root="/data", train=True, download=True, transform=transform)
-        val_size = int(0.1 * len(dataset))
-        train_size = len(dataset) - val_size
-        train_ds, val_ds = random_split(dataset, [train_size, val_size])
-
-        train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True, num_workers=0, pin_memory=True)
-        val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, num_workers=0, pin_memory=True)
-
-        model = build_model(num_classes=10)
+        if data_mode == "device":
+            # сирі 32x32 uint8 батчі; resize/нормалізація/аугментації — тензорними операціями на DEVICE
+            train_loader, val_loader = make_device_loaders(batch_size, seed=seed, rank=rank,
+                                                           world_size=world_size, synthetic=synthetic)
+            augment = DeviceAugment(random_crop=random_crop, flip=random_flip)
+            prepare = lambda x, train: augment(x, DEVICE, train=train)
+        elif data_mode == "cpu":
+            # CIFAR10: паралельне завантаження у воркерах, опційно з кешу uint8 у /data
+            train_loader, val_loader = make_loaders(batch_size, num_workers=num_workers,
+                                                    persistent_workers=persistent_workers,
+                                                    prefetch_factor=prefetch_factor,
+                                                    cache_dataset=cache_dataset, seed=seed,
+                                                    rank=rank, world_size=world_size,
+                                                    synthetic=synthetic)
+            prepare = lambda x, train: normalize_batch(x, DEVICE)
+        else:
+            raise ValueError(f"Unknown data_mode: {data_mode}")
+        timer = StageTimer(DEVICE)
+        stage_ms = {}
+
+        model = build_model(num_classes=10, pretrained=not synthetic)
+        memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        model = model.to(memory_format=memory_format)
+        ckpt = load_checkpoint(resume_from) if resume_from else None
+        if ckpt is not None:
+            # до обгортки DDP: вона розсилає ваги rank 0 усім рангам
+            model.load_state_dict(ckpt["model"])
+        # DDP усереднює градієнти між рангами (all-reduce під час backward)
+        ddp = DistributedDataParallel(model) if distributed else None
+        # compiled wrapper only for forward; state_dict зберігаємо з оригінальної моделі
+        net = ddp if distributed else model
+        net = torch.compile(net) if compile_model else net
+        # валідація без DDP-обгортки: шарди val різної довжини, колективів там немає
+        eval_net = model if distributed else net
         criterion = nn.CrossEntropyLoss()
         optimizer = optim.Adam(model.parameters(), lr=lr)
 
-        total_steps = epochs * len(train_loader)
+        amp_dtype = resolve_amp(amp, DEVICE)
+        # GradScaler потрібен лише для fp16; з enabled=False scale()/step() — звичайний backward/step
+        scaler = torch.amp.GradScaler("cuda", enabled=amp_dtype == torch.float16)
+        autocast = lambda: torch.autocast(DEVICE.type, dtype=amp_dtype, enabled=amp_dtype is not None)
+        grad_accum_steps = max(1, int(grad_accum_steps))
+        report_every = max(1, int(report_every))
+
+        n_batches = len(train_loader)
+        total_steps = epochs * n_batches
         step = 0
+        images_seen, train_seconds = 0, 0.0
+        epoch_throughput = []
+        accuracy, val_loss = None, None
+        start_epoch, start_batch, resumed_loss = 1, 0, 0.0
+        if ckpt is not None:
+            optimizer.load_state_dict(ckpt["optimizer"])
+            scaler.load_state_dict(ckpt["scaler"])
+            set_rng_state(ckpt["rng"])
+            start_epoch, start_batch, step = ckpt["epoch"], ckpt["batch"], ckpt["step"]
+            resumed_loss = ckpt["running_loss"]
+            images_seen, train_seconds = ckpt["images_seen"], ckpt["train_seconds"]
+            epoch_throughput, accuracy, val_loss = ckpt["epoch_throughput"], ckpt["accuracy"], ckpt["val_loss"]
+            del ckpt
+            print(f"[INFO] Resuming run {run_id} at epoch {start_epoch}, batch {start_batch}")
+        checkpointer = AsyncCheckpointer(run_id, run_params) if is_main else None
+        # метрики кожного кроку — у кільцевий буфер, блоками по report_every (без синхронізацій)
+        recorder = StepRecorder(StepRing(telemetry), report_every, DEVICE) if telemetry and is_main else None
+        last_checkpoint_step = step
+
+        def checkpoint(epoch, batch, running_loss):
+            # позиція (epoch, batch) — з якого місця продовжити; стан копіюється на CPU тут,
+            # запис на диск — у фоновому потоці
+            checkpointer.save({
+                "model": model.state_dict(), "optimizer": optimizer.state_dict(),
+                "scaler": scaler.state_dict(), "rng": rng_state(),
+                "epoch": epoch, "batch": batch, "step": step, "running_loss": running_loss,
+                "images_seen": images_seen + epoch_images, "train_seconds": train_seconds,
+                "epoch_throughput": list(epoch_throughput), "accuracy": accuracy, "val_loss": val_loss,
+            })
 
-        for epoch in range(1, epochs + 1):
+        for epoch in range(start_epoch, epochs + 1):
             model.train()
-            running_loss = 0.0
-            for batch_idx, (inputs, targets) in enumerate(train_loader, 1):
+            skip = start_batch if epoch == start_epoch else 0
+            set_loader_epoch(train_loader, epoch, skip)
+            # loss накопичується на пристрої; .item() (синхронізація) лише раз на report_every кроків
+            running_loss = torch.full((), resumed_loss if skip else 0.0, device=DEVICE)
+            epoch_images = 0
+            epoch_started = time.perf_counter()
+            optimizer.zero_grad(set_to_none=True)
+            timer.start()
+            for batch_idx, (inputs, targets) in enumerate(train_loader, skip + 1):
+                timer.mark("load")
                 inputs = inputs.to(DEVICE, non_blocking=True)
                 targets = targets.to(DEVICE, non_blocking=True)
+                timer.mark("transfer")
+                inputs = prepare(inputs, True).contiguous(memory_format=memory_format)
+                timer.mark("augment")
 
-                optimizer.zero_grad()
-                outputs = model(inputs)
-                loss = criterion(outputs, targets)
-                loss.backward()
-                optimizer.step()
+                do_step = batch_idx % grad_accum_steps == 0 or batch_idx == n_batches
+                # між кроками оптимізатора градієнти накопичуються локально, без all-reduce
+                sync_ctx = ddp.no_sync() if distributed and not do_step else nullcontext()
+                with sync_ctx:
+                    with autocast():
+                        outputs = net(inputs)
+                        loss = criterion(outputs, targets)
+                    scaler.scale(loss / grad_accum_steps).backward()
+                if do_step:
+                    scaler.step(optimizer)
+                    scaler.update()
+                    optimizer.zero_grad(set_to_none=True)
 
-                running_loss += loss.item()
+                running_loss += loss.detach()
+                epoch_images += targets.size(0)
                 step += 1
-                # update progress percent
-                progress = min(100.0, (step / total_steps) * 100.0)
-                set_state(progress=round(progress, 2), epoch=epoch, loss=round(running_loss / batch_idx, 4))
+                if recorder is not None:
+                    recorder.record(step, epoch, loss, optimizer.param_groups[0]["lr"],
+                                    targets.size(0) * world_size)
+                # лише на межі кроку оптимізатора: накопичених градієнтів у чекпоінті немає
+                if (checkpointer is not None and checkpoint_every and do_step
+                        and batch_idx < n_batches and step - last_checkpoint_step >= checkpoint_every):
+                    checkpoint(epoch, batch_idx, running_loss.item())
+                    last_checkpoint_step = step
+                if step % report_every == 0 or batch_idx == n_batches:
+                    if recorder is not None:
+                        recorder.flush()
+                    # update progress percent
+                    progress = min(100.0, (step / total_steps) * 100.0)
+                    set_state(progress=round(progress, 2), epoch=epoch, step=step, total_steps=total_steps,
+                              loss=round(running_loss.item() / batch_idx, 4))
+                timer.mark("step")
+                timer.batches += 1
+                timer.start()
+
+            if recorder is not None:
+                recorder.flush()
+                recorder.pause()
+            stage_ms = timer.summary()
+            epoch_seconds = time.perf_counter() - epoch_started
+            images_seen += epoch_images
+            train_seconds += epoch_seconds
+            epoch_throughput.append(round(epoch_images / max(epoch_seconds, 1e-9), 2))
+            if is_main:
+                print(f"[EPOCH {epoch}] stage ms/batch: {stage_ms}, {epoch_throughput[-1]} img/s")
 
             # validation pass
-            model.eval()
-            correct, total = 0, 0
-            val_loss = 0.0
-            with torch.no_grad():
+            eval_net.eval()
+            total = 0
+            correct_t = torch.zeros((), dtype=torch.int64, device=DEVICE)
+            val_loss_t = torch.zeros((), device=DEVICE)
+            with torch.no_grad(), autocast():
                 for inputs, targets in val_loader:
-                    inputs = inputs.to(DEVICE, non_blocking=True)
+                    inputs = prepare(inputs, False).contiguous(memory_format=memory_format)
                     targets = targets.to(DEVICE, non_blocking=True)
 
-                    outputs = model(inputs)
-                    val_loss += criterion(outputs, targets).item()
+                    outputs = eval_net(inputs)
+                    val_loss_t += criterion(outputs, targets).float()
                     _, predicted = outputs.max(1)
                     total += targets.size(0)
-                    correct += predicted.eq(targets).sum().item()
-            accuracy = correct / total
+                    correct_t += predicted.eq(targets).sum()
+            val_batches = len(val_loader)
+            if distributed:
+                # сума по всіх рангах: loss, кількість правильних, прикладів і батчів
+                totals = torch.stack([val_loss_t.cpu().double(), correct_t.cpu().double(),
+                                      torch.tensor(float(total), dtype=torch.float64),
+                                      torch.tensor(float(val_batches), dtype=torch.float64)])
+                dist.all_reduce(totals)
+                val_loss, correct, total, val_batches = totals.tolist()
+                accuracy = correct / max(total, 1)
+            else:
+                val_loss = val_loss_t.item()
+                accuracy = correct_t.item() / total
             # update state with epoch accuracy
-            set_state(accuracy=round(accuracy, 4), loss=round(val_loss / len(val_loader), 4), epoch=epoch)
-            print(f"[EPOCH {epoch}] loss={val_loss:.4f}, acc={accuracy:.4f}")
-
-        # Save model
-        save_path, name = save_model_state(None)  # get path
-        # actually save state_dict
-        torch.save(model.state_dict(), save_path)
-        set_latest(save_path)
-
-        try:
-            import request
-            ai_api_url = "http://ai_api:8080/reload"
-            for _ in range(3):
-                try:
-                    resp = request.post(ai_api_url, timeout = 5)
-                    if resp.ok:
-                        print("[INFO] Reload triggered on ai_api")
-                        break
-                except Exception as e:
-                    print(f"[WARN] Reload attempt failed: {e}")
-        except Exception:
-            pass
+            set_state(accuracy=round(accuracy, 4), loss=round(val_loss / max(val_batches, 1), 4), epoch=epoch)
+            if is_main:
+                print(f"[EPOCH {epoch}] loss={val_loss:.4f}, acc={accuracy:.4f}")
+                epoch_images = 0
+                checkpoint(epoch + 1, 0, 0.0)
+
+        if distributed:
+            seen = torch.tensor([float(images_seen)], dtype=torch.float64)
+            dist.all_reduce(seen)
+            images_seen = int(seen.item())
+        if not is_main:
+            # модель і метадані зберігає лише rank 0
+            set_state(status="done", progress=100.0, finished_at=time.time())
+            return None
+
+        # Save model: у реєстр (objects/<sha256>.pth + manifest) і атомарно як model_latest.pth
+        entry = register_model(model.state_dict(), accuracy=round(accuracy, 4), extra={"run_id": run_id})
+        name = f"{entry['version']}.pth"
+        # модель у реєстрі — чекпоінт запуску більше не потрібен
+        checkpoints = checkpointer.stats()
+        checkpointer.close(finished=True)
+
+        # /reload потрапляє в один воркер ai_api, інші підхоплюють model_latest через MODEL_WATCH_INTERVAL
+        ai_api_url = "http://ai_api:8080/reload"
+        for _ in range(3):
+            try:
+                resp = requests.post(ai_api_url, timeout=5)
+                if resp.ok:
+                    print("[INFO] Reload triggered on ai_api")
+                    break
+            except requests.RequestException as e:
+                print(f"[WARN] Reload attempt failed: {e}")
 
         total_time = round(time.time() - start_time, 2)
         metadata = {
             "model_name": name,
+            "model_hash": entry["hash"],
             "accuracy": round(accuracy, 4),
             "loss": round(val_loss, 4),
             "epochs": epochs,
             "device": str(DEVICE),
+            "data": {"mode": data_mode, "num_workers": train_loader.num_workers,
+                     "cache_dataset": cache_dataset, "prefetch_factor": prefetch_factor,
+                     "persistent_workers": persistent_workers, "seed": seed,
+                     "random_crop": random_crop, "random_flip": random_flip},
+            "stage_ms_per_batch": stage_ms,
+            "fast": {"amp": amp, "amp_dtype": str(amp_dtype).replace("torch.", "") if amp_dtype else None,
+                     "channels_last": channels_last, "compile": compile_model,
+                     "grad_accum_steps": grad_accum_steps,
+                     "effective_batch_size": batch_size * grad_accum_steps * world_size,
+                     "report_every": report_every},
+            "run_id": run_id,
+            "checkpoints": checkpoints,
+            "distributed": {"world_size": world_size,
+                            "backend": dist.get_backend() if distributed else None},
+            "throughput_img_per_sec": round(images_seen / max(train_seconds, 1e-9), 2),
+            "epoch_img_per_sec": epoch_throughput,
             "train_time_sec": total_time,
             "finished_at": time.strftime("%Y-%m-%d %H:%M:%S")
         }
@@ -133,5 +358,8 @@ def train_one_run(epochs=1, batch_size=64, lr=1e-3):
     except Exception as e:
         import traceback
         traceback.print_exc()
+        if checkpointer is not None:
+            # дописати останній чекпоінт: з нього продовжить /train/resume
+            checkpointer.close()
         set_state(status="failed", last_error=str(e))
         raise
@@ -0,0 +1,43 @@
+"""
+Model weights in the safetensors layout, written next to every registry object:
+
+    [8 bytes: header length N, little-endian u64][N bytes: JSON header][raw tensor data]
+
+ai_api memory-maps these files instead of unpickling the .pth (see app/src/weights.py).
+"""
+import json
+import os
+import struct
+import torch
+
+SUFFIX = ".safetensors"
+
+_NAMES = {
+    torch.float64: "F64", torch.float32: "F32", torch.float16: "F16", torch.bfloat16: "BF16",
+    torch.int64: "I64", torch.int32: "I32", torch.int16: "I16", torch.int8: "I8",
+    torch.uint8: "U8", torch.bool: "BOOL",
+}
+
+
+def save_weights(state_dict, path):
+    """Write a state dict atomically (tmp + rename); tensors may live on any device."""
+    # більші елементи першими: кожен тензор лишається вирівняним за розміром свого елемента
+    items = sorted(((k, t.detach().cpu().contiguous()) for k, t in state_dict.items()),
+                   key=lambda kv: -kv[1].element_size())
+    header, offset = {}, 0
+    for name, t in items:
+        nbytes = t.numel() * t.element_size()
+        header[name] = {"dtype": _NAMES[t.dtype], "shape": list(t.shape),
+                        "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+    raw = json.dumps(header, separators=(",", ":")).encode()
+    raw += b" " * (-len(raw) % 8)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<Q", len(raw)))
+        f.write(raw)
+        for _, t in items:
+            if t.numel():
+                f.write(t.reshape(-1).view(torch.uint8).numpy().data)
+    os.replace(tmp, path)
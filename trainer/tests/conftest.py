@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# registry/checkpoint беруть каталоги з MODELS_DIR під час імпорту: тести не чіпають /models
+os.environ.setdefault("MODELS_DIR", tempfile.mkdtemp(prefix="trainer-tests-"))
+
+# модулі тренера імпортуються напряму (як у контейнері: python src/api.py)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
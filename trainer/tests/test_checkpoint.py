@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from checkpoint import AsyncCheckpointer, checkpoint_path, discard, info_path, load_latest  # noqa: E402
+
+
+def write_checkpoint(directory, run_id, step):
+    ckpt = AsyncCheckpointer(run_id, {"epochs": 2, "run_id": run_id}, directory=str(directory))
+    ckpt.save({"epoch": 0, "batch": step, "step": step, "model": {"w": torch.zeros(2)}})
+    ckpt.close()
+
+
+def test_every_run_stays_resumable_by_run_id(tmp_path):
+    write_checkpoint(tmp_path, "run_a", 5)
+    write_checkpoint(tmp_path, "run_b", 7)
+
+    a = load_latest("run_a", directory=str(tmp_path))
+    assert a["run_id"] == "run_a" and a["step"] == 5
+    assert a["path"] == checkpoint_path("run_a", str(tmp_path))
+    assert a["params"]["epochs"] == 2
+    # без run_id — запуск, що писав чекпоінт останнім
+    assert load_latest(directory=str(tmp_path))["run_id"] == "run_b"
+    assert load_latest("missing", directory=str(tmp_path)) is None
+
+
+def test_discard_removes_only_that_run(tmp_path):
+    write_checkpoint(tmp_path, "run_a", 5)
+    write_checkpoint(tmp_path, "run_b", 7)
+
+    discard("run_b", directory=str(tmp_path))
+    assert not os.path.exists(checkpoint_path("run_b", str(tmp_path)))
+    assert not os.path.exists(info_path("run_b", str(tmp_path)))
+    assert load_latest("run_b", directory=str(tmp_path)) is None
+    # latest.json вказував на run_b — за замовчуванням тепер найновіший із решти
+    assert load_latest(directory=str(tmp_path))["run_id"] == "run_a"
+
+    discard("run_a", directory=str(tmp_path))
+    assert load_latest(directory=str(tmp_path)) is None
+
+
+def test_info_without_checkpoint_file_is_ignored(tmp_path):
+    write_checkpoint(tmp_path, "run_a", 5)
+    os.remove(checkpoint_path("run_a", str(tmp_path)))
+
+    assert load_latest("run_a", directory=str(tmp_path)) is None
+    assert load_latest(directory=str(tmp_path)) is None
+
+
+def test_finished_run_discards_its_checkpoint(tmp_path):
+    ckpt = AsyncCheckpointer("run_a", {"run_id": "run_a"}, directory=str(tmp_path))
+    ckpt.save({"epoch": 1, "batch": 0, "step": 10})
+    ckpt.close(finished=True)
+
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import registry  # noqa: E402
+
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(registry, "OBJECTS_DIR", str(tmp_path / "objects"))
+    monkeypatch.setattr(registry, "MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(registry, "LOCK_PATH", str(tmp_path / ".registry.lock"))
+    monkeypatch.setattr(registry, "_cache", {"stamp": None, "manifest": None})
+    monkeypatch.setattr(registry, "REGISTRY_KEEP_LAST", 0)
+    monkeypatch.setattr(registry, "REGISTRY_KEEP_BEST", 0)
+    return tmp_path
+
+
+def weights(value):
+    return {"w": torch.full((4,), float(value))}
+
+
+def test_identical_weights_are_stored_once(models_dir):
+    a = registry.register_model(weights(1), accuracy=0.5)
+    b = registry.register_model(weights(1), accuracy=0.6)
+
+    assert a["hash"] == b["hash"] and a["version"] != b["version"]
+    objects = sorted(os.listdir(models_dir / "objects"))
+    assert objects == [f"{a['hash']}.pth", f"{a['hash']}.safetensors"]
+    assert os.path.realpath(models_dir / registry.LATEST_NAME) == \
+        os.path.realpath(models_dir / "objects" / f"{a['hash']}.pth")
+    assert registry.load_manifest()["latest"] == b["version"]
+
+
+def test_retention_keeps_latest_recent_and_best(models_dir):
+    entries = [registry.register_model(weights(i), accuracy=acc)
+               for i, acc in enumerate((0.9, 0.1, 0.2, 0.3))]
+    best, latest = entries[0], entries[-1]
+
+    removed = registry.gc(keep_last=1, keep_best=1)
+
+    assert sorted(removed) == sorted(e["version"] for e in entries[1:3])
+    assert {e["version"] for e in registry.list_models()} == {best["version"], latest["version"]}
+    live = {best["hash"], latest["hash"]}
+    assert {f.split(".", 1)[0] for f in os.listdir(models_dir / "objects")} == live
+    assert not os.path.exists(models_dir / f"{entries[1]['version']}.pth")
+
+
+def test_reads_do_not_migrate_legacy_files(models_dir):
+    torch.save(weights(3), models_dir / "model_v20240101_000000.pth")
+
+    assert registry.list_models() == []
+    assert not os.path.exists(models_dir / "manifest.json")
+
+    registry.migrate()
+    assert [e["version"] for e in registry.list_models()] == ["model_v20240101_000000"]
+    assert os.path.islink(models_dir / "model_v20240101_000000.pth")
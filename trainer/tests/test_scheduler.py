@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+
+from checkpoint import checkpoint_path  # noqa: E402
+from scheduler import RunAlreadyActive, TrainScheduler, expand_sweep  # noqa: E402
+
+
+def job_record(job_id, status, created_at, **params):
+    return {"id": job_id, "status": status, "params": dict(params, run_id=job_id), "sweep_id": None,
+            "created_at": created_at, "started_at": created_at if status != "queued" else None,
+            "finished_at": None, "progress": 0.0, "step": 0, "total_steps": None,
+            "steps_per_sec": None, "eta_sec": None, "result": None, "error": None}
+
+
+def persist(store_dir, job):
+    with open(os.path.join(store_dir, f"{job['id']}.json"), "w") as f:
+        json.dump(job, f)
+
+
+class Runner:
+    def __init__(self):
+        self.params = []
+        self.done = threading.Event()
+
+    def __call__(self, params, on_update, cancel, threads):
+        self.params.append(dict(params))
+        on_update(step=1, total_steps=1, progress=100.0)
+        if len(self.params) == 2:
+            self.done.set()
+        return {"model_name": f"model_{params['run_id']}.pth", "accuracy": 0.5}
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_restore_resumes_interrupted_and_requeues_queued_jobs(tmp_path):
+    store = str(tmp_path / "jobs")
+    os.makedirs(store)
+    persist(store, job_record("j_done", "done", 1.0))
+    persist(store, job_record("j_running", "running", 2.0, epochs=3))
+    persist(store, job_record("j_queued", "queued", 3.0, epochs=1))
+    ckpt = checkpoint_path("j_running")
+    os.makedirs(os.path.dirname(ckpt), exist_ok=True)
+    open(ckpt, "wb").close()
+
+    run = Runner()
+    scheduler = TrainScheduler(run, max_concurrent=1, store_dir=store)
+    try:
+        scheduler.start()
+        assert run.done.wait(5)
+        assert wait_for(lambda: scheduler.get("j_queued")["status"] == "done")
+    finally:
+        os.remove(ckpt)
+
+    # перерваний запуск іде першим (за created_at) і продовжується з чекпоінта
+    assert [p["run_id"] for p in run.params] == ["j_running", "j_queued"]
+    assert run.params[0]["resume_from"] == ckpt
+    assert "resume_from" not in run.params[1]
+    restored = scheduler.get("j_running")
+    assert restored["restarts"] == 1 and restored["status"] == "done"
+    assert scheduler.get("j_done")["status"] == "done"
+    with open(os.path.join(store, "j_running.json")) as f:
+        assert json.load(f)["result"]["model_name"] == "model_j_running.pth"
+
+
+def test_interrupted_job_without_checkpoint_restarts_from_scratch(tmp_path):
+    store = str(tmp_path)
+    persist(store, job_record("j_lost", "running", 1.0))
+    scheduler = TrainScheduler(Runner(), store_dir=store)
+    scheduler._restore()
+
+    job = scheduler.get("j_lost")
+    assert job["status"] == "queued" and job["restarts"] == 1
+    assert "resume_from" not in job["params"]
+
+
+def test_exclusive_submit_rejects_an_active_run(tmp_path):
+    scheduler = TrainScheduler(Runner(), store_dir=str(tmp_path))
+    job = scheduler.submit([{"epochs": 1, "run_id": "r1"}])[0]
+
+    with pytest.raises(RunAlreadyActive) as e:
+        scheduler.submit([{"epochs": 1, "run_id": "r1", "resume_from": "x"}], exclusive=True)
+    assert e.value.job["id"] == job["id"]
+
+    scheduler.cancel(job["id"])
+    assert scheduler.submit([{"epochs": 1, "run_id": "r1"}], exclusive=True)[0]["status"] == "queued"
+
+
+def test_expand_sweep_grid_and_random():
+    grid = expand_sweep({"grid": {"lr": [1e-3, 1e-4], "batch_size": [32, 64]}}, {"epochs": 2})
+    assert len(grid) == 4 and all(spec["epochs"] == 2 for spec in grid)
+    assert {(s["lr"], s["batch_size"]) for s in grid} == {(1e-3, 32), (1e-3, 64), (1e-4, 32), (1e-4, 64)}
+
+    trials = expand_sweep({"random": {"lr": {"min": 1e-4, "max": 1e-2, "log": True}}, "trials": 5, "seed": 1})
+    assert len(trials) == 5 and all(1e-4 <= s["lr"] <= 1e-2 for s in trials)
+    with pytest.raises(ValueError):
+        expand_sweep({"grid": {"lr": []}})